@@ -0,0 +1,38 @@
+"""
+Benchmark ORM and bulk insert path of Client.add_events.
+
+Parses the catalog once, then inserts the same events into two fresh
+databases so only the insert cost is compared.
+"""
+import argparse
+import os
+
+import seisnn
+
+ap = argparse.ArgumentParser()
+ap.add_argument('-c', '--catalog', required=True, help='catalog', type=str)
+ap.add_argument('-t', '--tag', default='manual', help='pick tag', type=str)
+ap.add_argument('-r', '--repeat', default=1,
+                help='repeat the catalog to enlarge the input', type=int)
+ap.add_argument('-s', '--commit_size', default=10000,
+                help='rows per transaction in bulk mode', type=int)
+args = ap.parse_args()
+
+config = seisnn.utils.Config()
+events = seisnn.io.read_event_list(args.catalog) * args.repeat
+
+for name, bulk in [('orm', False), ('bulk', True)]:
+    database = f'benchmark_add_events_{name}.db'
+    db_path = os.path.join(config.sql_database, database)
+    if os.path.exists(db_path):
+        os.remove(db_path)
+
+    db = seisnn.sql.Client(database)
+    report = db.insert_events(events, args.tag,
+                              bulk=bulk,
+                              commit_size=args.commit_size)
+
+    rate = (report['events'] + report['picks']) / report['insert_time']
+    print(f'{name:>4}: {report["insert_time"]:8.3f} s, {rate:10.0f} rows/s')
+
+    os.remove(db_path)
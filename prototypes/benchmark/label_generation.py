@@ -0,0 +1,130 @@
+"""
+Benchmark label generation of a station-day.
+
+Compares the former per-instance labeller, one query and one kernel per
+phase followed by a float64 convolution, with the vectorized labeller on
+a pick index, window by window and as one stack. Labels are checked
+against the former result.
+"""
+import argparse
+import time
+
+import numpy as np
+import obspy
+import scipy.signal
+
+import seisnn
+
+ap = argparse.ArgumentParser()
+ap.add_argument('-d', '--database', required=True, help='sql database',
+                type=str)
+ap.add_argument('-t', '--tag', default='manual', help='pick tag', type=str)
+ap.add_argument('-n', '--windows', default=2880,
+                help='windows, 2880 is a day of 30 s windows', type=int)
+ap.add_argument('-p', '--phase', default='P,S,N', help='label phases',
+                type=str)
+ap.add_argument('-s', '--shape', default='triang', help='label shape',
+                type=str)
+args = ap.parse_args()
+
+
+def legacy_label(metadata, phase, database, tag, shape, half_width=20):
+    db = seisnn.sql.get_client(database)
+    data = np.zeros([metadata.npts, len(phase)])
+
+    ph_index = {}
+    for i, ph in enumerate(phase):
+        ph_index[ph] = i
+        picks = db.get_picks(from_time=metadata.starttime.datetime,
+                             to_time=metadata.endtime.datetime,
+                             station=metadata.station,
+                             phase=ph, tag=tag)
+        for pick in picks:
+            pick_time = obspy.UTCDateTime(pick.time) - metadata.starttime
+            data[int(pick_time / metadata.delta), i] = 1
+
+    if 'EQ' in phase:
+        data[:, ph_index['EQ']] = \
+            data[:, ph_index['P']] - data[:, ph_index['S']]
+        data[:, ph_index['EQ']] = np.cumsum(data[:, ph_index['EQ']])
+        if np.any(data[:, ph_index['EQ']] < 0):
+            data[:, ph_index['EQ']] += 1
+
+    for i, ph in enumerate(phase):
+        if not ph == 'EQ':
+            wavelet = scipy.signal.windows.get_window(shape, 2 * half_width)
+            data[:, i] = scipy.signal.convolve(data[:, i], wavelet[1:],
+                                               mode='same')
+
+    if 'N' in phase:
+        data[:, ph_index['N']] = 1
+        data[:, ph_index['N']] -= data[:, ph_index['P']]
+        data[:, ph_index['N']] -= data[:, ph_index['S']]
+
+    return data
+
+
+if __name__ == '__main__':
+    phase = tuple(args.phase.split(','))
+    db = seisnn.sql.get_client(args.database)
+    picks = db.get_picks(tag=args.tag)
+    station = max(set(pick.station for pick in picks),
+                  key=[pick.station for pick in picks].count)
+    pick_times = sorted(obspy.UTCDateTime(pick.time) for pick in picks
+                        if pick.station == station)
+
+    # Consecutive 30 s windows from the first pick of the busiest station.
+    metadata_list = []
+    for i in range(args.windows):
+        metadata = seisnn.core.Metadata()
+        metadata.station = station
+        metadata.starttime = pick_times[0] - 10 + 30 * i
+        metadata.npts = 3008
+        metadata.delta = 0.01
+        metadata.endtime = metadata.starttime \
+            + (metadata.npts - 1) * metadata.delta
+        metadata_list.append(metadata)
+
+    start = time.perf_counter()
+    legacy = [legacy_label(metadata, phase, args.database, args.tag,
+                           args.shape) for metadata in metadata_list]
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    pick_index = seisnn.sql.PickIndex.from_database(
+        args.database,
+        from_time=metadata_list[0].starttime.datetime,
+        to_time=metadata_list[-1].endtime.datetime,
+        station=station, tag=args.tag)
+    index_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    single = []
+    for metadata in metadata_list:
+        label = seisnn.core.Label(metadata, phase)
+        label.generate_label(args.database, args.tag, args.shape,
+                             pick_index=pick_index)
+        single.append(label.data)
+    single_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    labels = [seisnn.core.Label(metadata, phase)
+              for metadata in metadata_list]
+    seisnn.core.Label.generate_labels(labels, args.database, args.tag,
+                                      args.shape, pick_index=pick_index)
+    stack_time = time.perf_counter() - start
+
+    error = max(np.abs(old - new).max()
+                for old, new in zip(legacy + legacy,
+                                    single + [label.data
+                                              for label in labels]))
+    n_picks = len(pick_index.get_samples(metadata_list, phase)[0])
+    print(f'{args.windows} windows of {station}, {n_picks} picks, '
+          f'max difference {error:.2e}')
+    print(f'legacy:        {legacy_time:8.3f} s, '
+          f'{legacy_time / args.windows * 1e3:8.3f} ms/window')
+    print(f'pick index:    {index_time:8.3f} s')
+    print(f'index, single: {single_time:8.3f} s, '
+          f'{single_time / args.windows * 1e3:8.3f} ms/window')
+    print(f'index, stack:  {stack_time:8.3f} s, '
+          f'{stack_time / args.windows * 1e3:8.3f} ms/window')
@@ -0,0 +1,45 @@
+"""
+Benchmark a metadata-only pass over TFRecord instances.
+
+Compares instances parsed through the tf.data pipeline with lazy
+instances from raw records, which decode trace, label and predict only
+when accessed. Stations and start times of both passes are checked to
+be the same.
+"""
+import argparse
+import time
+
+import seisnn
+
+ap = argparse.ArgumentParser()
+ap.add_argument('-i', '--input', required=True, help='TFRecord directory',
+                type=str)
+ap.add_argument('-n', '--files', default=10, help='TFRecord files',
+                type=int)
+args = ap.parse_args()
+
+if __name__ == '__main__':
+    tfr_list = seisnn.utils.get_dir_list(args.input,
+                                         suffix='.tfrecord')[:args.files]
+
+    start = time.perf_counter()
+    eager = [(instance.metadata.station, instance.metadata.starttime)
+             for instance in (seisnn.core.Instance(example)
+                              for example in
+                              seisnn.io.read_dataset(tfr_list))]
+    eager_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    lazy = [(instance.metadata.station, instance.metadata.starttime)
+            for instance in (seisnn.core.Instance(record)
+                             for file_path in tfr_list
+                             for _, _, record in
+                             seisnn.io.iter_tfrecord(file_path))]
+    lazy_time = time.perf_counter() - start
+
+    print(f'{len(lazy)} instances from {len(tfr_list)} files, '
+          f'same metadata: {eager == lazy}')
+    print(f'eager: {eager_time:8.3f} s, '
+          f'{eager_time / len(eager) * 1e3:8.3f} ms/instance')
+    print(f'lazy:  {lazy_time:8.3f} s, '
+          f'{lazy_time / len(lazy) * 1e3:8.3f} ms/instance')
@@ -0,0 +1,119 @@
+"""
+Benchmark SQLite connection profiles under parallel converter workers.
+
+A pool of reader processes queries picks the way Label.generate_label
+does for every waveform window, while one writer process keeps adding
+picks. The same database is copied for each profile so only the
+connection settings are compared.
+"""
+import argparse
+import itertools
+import multiprocessing
+import os
+import shutil
+import time
+
+import numpy as np
+from obspy import UTCDateTime
+
+import seisnn
+
+ap = argparse.ArgumentParser()
+ap.add_argument('-d', '--database', required=True, help='source database',
+                type=str)
+ap.add_argument('-t', '--tag', default='manual', help='pick tag', type=str)
+ap.add_argument('-w', '--workers', default=4, help='reader processes',
+                type=int)
+ap.add_argument('-n', '--windows', default=2000,
+                help='pick windows per reader', type=int)
+ap.add_argument('-l', '--length', default=30, help='window seconds',
+                type=int)
+args = ap.parse_args()
+
+PROFILES = [
+    ('legacy', seisnn.sql.SQLiteProfile(journal_mode='delete',
+                                        synchronous=None,
+                                        mmap_size=None,
+                                        cache_size=None,
+                                        busy_timeout=None), False),
+    ('wal', seisnn.sql.SQLiteProfile(), False),
+    ('wal-ro', seisnn.sql.SQLiteProfile(), True),
+]
+
+
+def read_windows(database, profile, readonly, windows):
+    db = seisnn.sql.Client(database, profile=profile, readonly=readonly)
+    errors = 0
+    start = time.time()
+    for station, from_time, to_time in windows:
+        for phase in ['P', 'S']:
+            try:
+                db.get_picks(from_time=from_time, to_time=to_time,
+                             station=station, phase=phase, tag=args.tag)
+            except Exception:
+                errors += 1
+    return time.time() - start, errors
+
+
+def write_picks(database, profile, picks, stop):
+    db = seisnn.sql.Client(database, profile=profile)
+    written = 0
+    for rows in itertools.cycle(seisnn.utils.chunks(picks, 100)):
+        if stop.is_set():
+            break
+        written += db.add_picks({'time': pick.time,
+                                 'station': pick.station,
+                                 'phase': pick.phase,
+                                 'tag': 'benchmark'} for pick in rows)
+        time.sleep(0.01)
+    return written
+
+
+if __name__ == '__main__':
+    config = seisnn.utils.Config()
+    source = seisnn.sql.Client(args.database)
+    picks = source.get_picks(tag=args.tag)
+    rng = np.random.default_rng(0)
+
+    windows = []
+    for index in rng.integers(0, len(picks), args.windows * args.workers):
+        pick = picks[index]
+        offset = UTCDateTime(pick.time) \
+            - rng.uniform(0, args.length)
+        windows.append((pick.station,
+                        offset.datetime,
+                        (offset + args.length).datetime))
+    windows = [windows[i::args.workers] for i in range(args.workers)]
+
+    ctx = multiprocessing.get_context('spawn')
+    for name, profile, readonly in PROFILES:
+        database = f'benchmark_parallel_{name}.db'
+        db_path = os.path.join(config.sql_database, database)
+        shutil.copy(os.path.join(config.sql_database, args.database),
+                    db_path)
+        # Switch the file to the profile journal mode before readers start.
+        seisnn.sql.Client(database, profile=profile).engine.dispose()
+
+        manager = ctx.Manager()
+        stop = manager.Event()
+        with ctx.Pool(args.workers + 1) as pool:
+            writer = pool.apply_async(write_picks,
+                                      (database, profile, picks, stop))
+            results = pool.starmap(read_windows,
+                                   [(database, profile, readonly, w)
+                                    for w in windows])
+            stop.set()
+            written = writer.get()
+        manager.shutdown()
+
+        # Reader time is measured inside the workers, without start-up.
+        elapsed = max(seconds for seconds, _ in results)
+        queries = 2 * sum(len(w) for w in windows)
+        errors = sum(error for _, error in results)
+        print(f'{name:>6}: {elapsed:8.3f} s, '
+              f'{queries / elapsed:8.0f} queries/s, {errors} errors, '
+              f'{written} picks written')
+
+        for suffix in ['', '-wal', '-shm']:
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
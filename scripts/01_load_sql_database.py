@@ -13,7 +13,9 @@ inspector.inventory_summery()
 # path_list = '/home/andy/A_file/*'
 # events = seisnn.io.read_afile_directory(path_list)
 
-db.add_events(catalog="HL2019", tag="manual")
+db.add_events(catalog="HL2019", tag="manual", bulk=True, incremental=True)
+db.ensure_indexes()
+db.analyze()
 inspector.event_summery()
 inspector.pick_summery()
 
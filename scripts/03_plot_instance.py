@@ -4,6 +4,7 @@ database = 'Hualien.db'
 db = seisnn.sql.Client(database=database)
 
 waveforms = db.get_waveform()
-for waveform in waveforms:
-    instance = seisnn.core.Instance(waveform)
-    instance.plot()
+for batch in seisnn.utils.batch(waveforms, 100):
+    for record in seisnn.io.read_waveform_records(batch):
+        instance = seisnn.core.Instance(record)
+        instance.plot()
@@ -8,8 +8,9 @@ db = seisnn.sql.Client(database)
 tfr_list = seisnn.utils.get_dir_list(config.tfrecord, suffix='.tfrecord')
 dataset = seisnn.io.read_dataset(tfr_list)
 
-for item in dataset:
-    instance = seisnn.core.Instance(item)
-    instance.predict.get_picks()
-    instance.predict.write_picks_to_database('predict', database)
-db.remove_duplicates('pick', ['time', 'phase', 'station', 'tag'])
+with seisnn.sql.PickWriter(db, dedup=True) as writer:
+    for batch in dataset.batch(500):
+        instances = seisnn.core.InstanceBatch(batch)
+        picks = instances.get_picks('predict')
+        instances.write_picks_to_database(picks, 'predict', writer)
+writer.report()
@@ -15,21 +15,20 @@ def split_event(db, from_time, to_time, station_limit=2):
     for pick in picks_query:
         if pick.station not in station:
             station.append(pick.station)
-            channel = db.get_waveform(
-                station=pick.station,
-                from_time=from_time,
-                to_time=to_time
-            )
-            channel = channel[0].channel.split(', ')
 
-            network = db.get_inventories(station=pick.station)
-            network = network[0].network
-            location = ''
+    waveforms = db.get_waveforms_overlapping(
+        [(sta, from_time, to_time) for sta in station])
+    for sta, channel in zip(station, waveforms):
+        channel = channel[0].channel.split(', ')
 
-            for chan in channel:
-                ARC.append(
-                    f'ARC {pick.station:<5} {chan:<3} {network:<2} {location:<2} {event_time.year:<4} {event_time.month:0>2}'
-                    f'{event_time.day:0>2} {event_time.time.hour:0>2}{event_time.time.minute:0>2} {event_time.time.second:0>2} {int(UTCDateTime(to_time) - UTCDateTime(from_time)):<5}')
+        network = db.get_inventories(station=sta)
+        network = network[0].network
+        location = ''
+
+        for chan in channel:
+            ARC.append(
+                f'ARC {sta:<5} {chan:<3} {network:<2} {location:<2} {event_time.year:<4} {event_time.month:0>2}'
+                f'{event_time.day:0>2} {event_time.time.hour:0>2}{event_time.time.minute:0>2} {event_time.time.second:0>2} {int(UTCDateTime(to_time) - UTCDateTime(from_time)):<5}')
     if len(station) >= station_limit:
         return picks_query, ARC
     else:
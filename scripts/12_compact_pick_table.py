@@ -0,0 +1,9 @@
+import seisnn
+
+database = 'Hualien.db'
+db = seisnn.sql.Client(database)
+
+db.migrate_pick_schema(compact=True)
+
+inspector = seisnn.sql.DatabaseInspector(db)
+inspector.pick_summery()
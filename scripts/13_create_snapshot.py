@@ -0,0 +1,7 @@
+import seisnn
+
+database = 'Hualien.db'
+db = seisnn.sql.Client(database)
+
+# Training and evaluation workers open the snapshot read-only.
+db.create_snapshot()
@@ -8,6 +8,7 @@ from obspy import UTCDateTime
 import seisnn.core
 import seisnn.example_proto
 import seisnn.io
+import seisnn.sql
 import seisnn.utils
 
 
@@ -21,32 +22,47 @@ class TFRecordConverter:
     def __init__(self,
                  phase=('P', 'S', 'N'),
                  trace_length=30,
-                 shape='triang'):
+                 shape='triang',
+                 sampling_rate=100,
+                 component='ZNE'):
         self.phase = phase
         self.trace_length = trace_length
         self.shape = shape
+        self.sampling_rate = sampling_rate
+        self.component = component
 
-    def convert_training_from_picks(self, pick_list, tag, database):
+    def convert_training_from_picks(self, pick_list, tag, database,
+                                    ordered=False, chunk_size=100):
         """
         Convert training TFRecords from database picks.
 
-        :param pick_list: List of picks from Pick SQL query.
+        Picks are grouped by station-day and sent to the process pool
+        chunk by chunk, ordered input is read as a stream.
+
+        :param pick_list: Picks from Pick SQL query, list or iterator from
+            Client.iter_picks.
         :param str tag: Pick tag in SQL database.
         :param str database: SQL database name.
+        :param bool ordered: Picks are already ordered by station and
+            time, e.g. Client.iter_picks(order_by=['station', 'time']).
+        :param int chunk_size: Station-days per process pool.
         """
-        pick_list = sorted(pick_list,
-                           key=lambda pick: [pick.station, pick.time])
+        if not ordered:
+            pick_list = sorted(pick_list,
+                               key=lambda pick: [pick.station, pick.time])
         pick_groupby = itertools.groupby(
             pick_list,
             key=lambda pick: [pick.station, UTCDateTime(pick.time).julday])
-        group_picks = [[item for item in data] for (key, data) in pick_groupby]
+        group_picks = ([item for item in data]
+                       for (key, data) in pick_groupby)
 
-        seisnn.utils.parallel(group_picks,
-                              func=self.write_tfrecord,
-                              sub_dir='train',
-                              tag=tag,
-                              database=database,
-                              batch_size=1)
+        for groups in seisnn.utils.chunks(group_picks, chunk_size):
+            seisnn.utils.parallel(groups,
+                                  func=self.write_tfrecord,
+                                  sub_dir='train',
+                                  tag=tag,
+                                  database=database,
+                                  batch_size=1)
 
     def write_tfrecord(self, picks, sub_dir, tag, database):
         instance_list = self.get_instance_list(picks, tag, database)
@@ -73,6 +89,7 @@ class TFRecordConverter:
         :param str database: SQL database root.
         :return:
         """
+        pick_index = self.get_pick_index(picks, tag, database)
         metadata = self.get_time_window(anchor_time=UTCDateTime(0),
                                         station='',
                                         )
@@ -80,10 +97,12 @@ class TFRecordConverter:
         for pick in picks:
             if metadata.starttime < pick.time < metadata.endtime:
                 continue
-            elif metadata.endtime < pick.time < metadata.endtime + 30:
-                metadata = self.get_time_window(anchor_time=metadata.starttime + 30,
-                                                station=pick.station,
-                                                )
+            elif metadata.endtime < pick.time < \
+                    metadata.endtime + self.trace_length:
+                metadata = self.get_time_window(
+                    anchor_time=metadata.starttime + self.trace_length,
+                    station=pick.station,
+                )
             else:
                 metadata = self.get_time_window(anchor_time=pick.time,
                                                 station=pick.station,
@@ -92,18 +111,45 @@ class TFRecordConverter:
 
             for _, stream in streams.items():
                 stream = self.signal_preprocessing(stream)
-                instance = seisnn.core.Instance(stream)
+                instance = seisnn.core.Instance().from_stream(
+                    stream,
+                    trace_length=self.trace_length,
+                    sampling_rate=self.sampling_rate,
+                    component=self.component)
 
                 instance.label = seisnn.core.Label(instance.metadata,
                                                    self.phase)
-                instance.label.generate_label(database, tag, self.shape)
 
                 instance.predict = seisnn.core.Label(instance.metadata,
                                                      self.phase)
 
                 instance_list.append(instance)
+
+        seisnn.core.Label.generate_labels(
+            [instance.label for instance in instance_list],
+            database, tag, self.shape, pick_index=pick_index)
         return instance_list
 
+    def get_pick_index(self, picks, tag, database):
+        """
+        Returns pick index around the picks, loaded in one query.
+
+        :param picks: List of picks, usually one station-day.
+        :param str tag: Pick tag in SQL database.
+        :param str database: SQL database name.
+        :rtype: seisnn.sql.PickIndex
+        """
+        stations = sorted(set(pick.station for pick in picks))
+        pick_times = [UTCDateTime(pick.time) for pick in picks]
+        # Windows start before the first pick and may step past the last.
+        margin = 2 * self.trace_length + 30
+        return seisnn.sql.PickIndex.from_database(
+            database,
+            from_time=(min(pick_times) - margin).datetime,
+            to_time=(max(pick_times) + margin).datetime,
+            station=stations,
+            tag=tag)
+
     def get_time_window(self, anchor_time, station, shift=0):
         """
         Returns metadata from anchor time.
@@ -137,8 +183,10 @@ class TFRecordConverter:
         stream.detrend('demean')
         stream.detrend('linear')
         stream.normalize()
-        stream.resample(100)
-        stream = self.trim_trace(stream)
+        stream.resample(self.sampling_rate)
+        stream = self.trim_trace(
+            stream, seisnn.core.get_trace_npts(self.trace_length,
+                                               self.sampling_rate))
         return stream
 
     @staticmethod
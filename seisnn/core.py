@@ -1,16 +1,19 @@
 """
 Core
 """
+import functools
 import os
 
 import numpy as np
 import scipy.signal
 import obspy
+import tensorflow as tf
 
 import seisnn.example_proto
 import seisnn.io
 import seisnn.plot
 import seisnn.sql
+import seisnn.utils
 
 
 class Metadata:
@@ -32,6 +35,9 @@ class Metadata:
         elif isinstance(input_data, seisnn.example_proto.Feature):
             self.from_feature(input_data)
 
+        elif isinstance(input_data, dict):
+            self.from_header(input_data)
+
     def from_trace(self, trace):
         self.id = trace.id
         self.station = trace.stats.station
@@ -52,6 +58,21 @@ class Metadata:
         self.delta = feature.delta
         return self
 
+    def from_header(self, header):
+        """
+        Initialized from header dict, see example_proto.parse_header.
+
+        :param dict header: Header dict.
+        """
+        self.id = header['id']
+        self.station = header['station']
+
+        self.starttime = obspy.UTCDateTime(header['starttime'])
+        self.endtime = obspy.UTCDateTime(header['endtime'])
+        self.npts = header['npts']
+        self.delta = np.float32(header['delta'])
+        return self
+
 
 class Trace:
     """
@@ -61,39 +82,90 @@ class Trace:
     channel = None
     data = None
 
-    def __init__(self, input_data):
+    def __init__(self, input_data, **kwargs):
         if isinstance(input_data, obspy.Stream):
-            self.from_stream(input_data)
+            self.from_stream(input_data, **kwargs)
 
         elif isinstance(input_data, seisnn.example_proto.Feature):
             self.from_feature(input_data)
 
-    def from_stream(self, stream):
+    def from_stream(self, stream, trace_length=30, sampling_rate=100,
+                    component='ZNE'):
         """
         Gets waveform from Obspy stream.
 
+        Traces in other sampling rate are resampled, data is aligned to
+        the start of the first trace and zero padded.
+
         :param stream: Obspy stream object.
+        :param float trace_length: Window length in seconds.
+        :param float sampling_rate: Target sampling rate in Hz.
+        :param component: Component order of the data columns.
         :return: Waveform object.
         """
-        channel = []
-        data = np.zeros([3008, 3])
-        for i, comp in enumerate(['Z', 'N', 'E']):
-            try:
-                st = stream.select(component=comp)
-                data[:, i] = st.traces[0].data
-                channel.append(st.traces[0].stats.channel)
+        trace, = self.from_stream_windows(
+            stream, [stream.traces[0].stats.starttime],
+            trace_length=trace_length, sampling_rate=sampling_rate,
+            component=component)
 
-            except IndexError:
-                pass
+        self.data = trace.data
+        self.channel = trace.channel
+        self.metadata = trace.metadata
 
-            except Exception as error:
-                print(f'{type(error).__name__}: {error}')
+        return self
 
-        self.data = data
-        self.channel = channel
-        self.metadata = Metadata(stream.traces[0])
+    @staticmethod
+    def from_stream_windows(stream, starttimes, trace_length=30,
+                            sampling_rate=100, component='ZNE'):
+        """
+        Returns traces of many windows cut from one long stream.
+
+        Components are selected once and every window is sliced from the
+        same arrays, data of all windows is one float32 buffer.
+
+        :param stream: Obspy stream object, e.g. a day of one station.
+        :param starttimes: Window start times.
+        :param float trace_length: Window length in seconds.
+        :param float sampling_rate: Target sampling rate in Hz.
+        :param component: Component order of the data columns.
+        :rtype: list
+        :return: List of Trace, data in [npts, component].
+        """
+        npts = get_trace_npts(trace_length, sampling_rate)
+        starttimes = [obspy.UTCDateTime(time) for time in starttimes]
+        timestamps = np.array([time.timestamp for time in starttimes])
+        data = np.zeros([len(starttimes), npts, len(component)],
+                        dtype=np.float32)
 
-        return self
+        channel = []
+        for i, comp in enumerate(component):
+            st = stream.select(component=comp)
+            if not st:
+                continue
+
+            channel.append(st.traces[0].stats.channel)
+            for tr in st:
+                _fill_windows(data[:, :, i], tr, timestamps, sampling_rate)
+
+        first = stream.traces[0]
+        traces = []
+        for window, starttime in zip(data, starttimes):
+            metadata = Metadata()
+            metadata.id = first.id
+            metadata.station = first.stats.station
+
+            metadata.starttime = starttime
+            metadata.endtime = starttime + (npts - 1) / sampling_rate
+            metadata.npts = npts
+            metadata.delta = 1 / sampling_rate
+
+            trace = Trace(None)
+            trace.metadata = metadata
+            trace.channel = list(channel)
+            trace.data = window
+            traces.append(trace)
+
+        return traces
 
     def from_feature(self, feature):
         self.metadata = Metadata(feature)
@@ -102,6 +174,36 @@ class Trace:
         return self
 
 
+def get_trace_npts(trace_length=30, sampling_rate=100):
+    """
+    Returns data points of a window, padded for the U-Net pooling.
+
+    :param float trace_length: Window length in seconds.
+    :param float sampling_rate: Sampling rate in Hz.
+    :rtype: int
+    :return: Data points, 3008 for 30 s in 100 Hz.
+    """
+    npts = int(round(trace_length * sampling_rate)) + 1
+    _, rpad = seisnn.utils.unet_padding_size(range(npts))
+    return npts + rpad
+
+
+def _fill_windows(data, trace, timestamps, sampling_rate):
+    # Copy trace samples into [window, npts], samples at nearest index.
+    if trace.stats.sampling_rate != sampling_rate:
+        trace = trace.copy().resample(sampling_rate)
+    samples = np.ma.filled(trace.data, 0)
+
+    npts = data.shape[1]
+    begins = np.round((timestamps - trace.stats.starttime.timestamp)
+                      * sampling_rate).astype(np.int64)
+    for window, begin in zip(data, begins.tolist()):
+        low = max(begin, 0)
+        high = min(begin + npts, len(samples))
+        if low < high:
+            window[low - begin:high - begin] = samples[low:high]
+
+
 class Label:
     """
     Main class for label data.
@@ -114,7 +216,8 @@ class Label:
         self.tag = tag
         self.data = np.zeros([metadata.npts, len(phase)])
 
-    def generate_label(self, database, tag, shape, half_width=20):
+    def generate_label(self, database, tag, shape, half_width=20,
+                       pick_index=None):
         """
         Add generated label to stream.
 
@@ -122,14 +225,41 @@ class Label:
         :param str tag: Pick tag in SQL database.
         :param str shape: Label shape, see scipy.signal.windows.get_window().
         :param int half_width: Label half width in data point.
+        :param seisnn.sql.PickIndex pick_index: (Optional.) Pick times in
+            memory, the database is only queried if the window is not
+            covered.
         :rtype: np.array
         :return: Label.
         """
-        db = seisnn.sql.Client(database)
+        from_time = self.metadata.starttime.datetime
+        to_time = self.metadata.endtime.datetime
+        if pick_index is not None and (
+                pick_index.tag != tag or not pick_index.covers(
+                    self.metadata.station, from_time, to_time)):
+            pick_index = None
+
+        if pick_index is not None:
+            picks = pick_index.get_samples([self.metadata], self.phase)
+        else:
+            picks = self.get_pick_samples(database, tag)
+
+        self.data = make_label_stack(*picks, 1, self.metadata.npts,
+                                     self.phase, shape, half_width)[0]
+        return self
+
+    def get_pick_samples(self, database, tag):
+        """
+        Returns picks inside the window from SQL database.
 
-        ph_index = {}
+        :param str database: SQL database.
+        :param str tag: Pick tag in SQL database.
+        :rtype: tuple
+        :return: Window, phase and sample index arrays.
+        """
+        db = seisnn.sql.get_client(database)
+        phase_index = []
+        sample_index = []
         for i, phase in enumerate(self.phase):
-            ph_index[phase] = i
             picks = db.get_picks(from_time=self.metadata.starttime.datetime,
                                  to_time=self.metadata.endtime.datetime,
                                  station=self.metadata.station,
@@ -138,34 +268,68 @@ class Label:
             for pick in picks:
                 pick_time = obspy.UTCDateTime(
                     pick.time) - self.metadata.starttime
-                pick_time_index = int(pick_time / self.metadata.delta)
-                self.data[pick_time_index, i] = 1
+                phase_index.append(i)
+                sample_index.append(int(pick_time / self.metadata.delta))
 
-        if 'EQ' in self.phase:
-            # Make EQ window start by P and end by S.
-            self.data[:, ph_index['EQ']] = \
-                self.data[:, ph_index['P']] - self.data[:, ph_index['S']]
+        window_index = np.zeros(len(sample_index), dtype=np.int64)
+        return window_index, np.array(phase_index, dtype=np.int64), \
+            np.array(sample_index, dtype=np.int64)
 
-            self.data[:, ph_index['EQ']] = \
-                np.cumsum(self.data[:, ph_index['EQ']])
-
-            if np.any(self.data[:, ph_index['EQ']] < 0):
-                self.data[:, ph_index['EQ']] += 1
+    @staticmethod
+    def generate_labels(labels, database, tag, shape, half_width=20,
+                        pick_index=None):
+        """
+        Generates a stack of labels at once.
 
-        for i, phase in enumerate(self.phase):
-            if not phase == 'EQ':
-                wavelet = scipy.signal.windows.get_window(
-                    shape, 2 * half_width)
-                self.data[:, i] = scipy.signal.convolve(
-                    self.data[:, i], wavelet[1:], mode='same')
-
-        if 'N' in self.phase:
-            # Make Noise window by 1 - P - S
-            self.data[:, ph_index['N']] = 1
-            self.data[:, ph_index['N']] -= self.data[:, ph_index['P']]
-            self.data[:, ph_index['N']] -= self.data[:, ph_index['S']]
+        Labels with the same length and phases are filled from one
+        array, windows not covered by the pick index are labelled one by
+        one with generate_label.
 
-        return self
+        :param list labels: List of Label.
+        :param str database: SQL database.
+        :param str tag: Pick tag in SQL database.
+        :param str shape: Label shape, see scipy.signal.windows.get_window().
+        :param int half_width: Label half width in data point.
+        :param seisnn.sql.PickIndex pick_index: (Optional.) Pick times in
+            memory, loaded around the labels if None.
+        :rtype: list
+        :return: Labels.
+        """
+        if not labels:
+            return labels
+
+        if pick_index is None:
+            pick_index = seisnn.sql.PickIndex.from_database(
+                database,
+                from_time=min(label.metadata.starttime
+                              for label in labels).datetime,
+                to_time=max(label.metadata.endtime
+                            for label in labels).datetime,
+                station=sorted(set(label.metadata.station
+                                   for label in labels)),
+                tag=tag)
+
+        groups = {}
+        for label in labels:
+            if pick_index.tag != tag or not pick_index.covers(
+                    label.metadata.station,
+                    label.metadata.starttime.datetime,
+                    label.metadata.endtime.datetime):
+                label.generate_label(database, tag, shape, half_width)
+                continue
+
+            key = (label.metadata.npts, tuple(label.phase))
+            groups.setdefault(key, []).append(label)
+
+        for (npts, phase), group in groups.items():
+            picks = pick_index.get_samples(
+                [label.metadata for label in group], phase)
+            stack = make_label_stack(*picks, len(group), npts,
+                                     phase, shape, half_width)
+            for label, data in zip(group, stack):
+                label.data = data
+
+        return labels
 
     def get_picks(self, height=0.5, distance=100):
         """
@@ -174,38 +338,212 @@ class Label:
         :param float height: Height threshold, from 0 to 1, default is 0.5.
         :param int distance: Distance threshold in data point.
         """
-        picks = []
-        for i, phase in enumerate(self.phase[0:2]):
-            peaks, _ = scipy.signal.find_peaks(
-                self.data[-1, :, i],
-                height=height,
-                distance=distance)
-
-            for peak in peaks:
-                if peak:
-                    pick_time = obspy.UTCDateTime(self.metadata.starttime) \
-                                + peak * self.metadata.delta
+        picks = find_picks(self.data[-1:, :, 0:2], self.phase[0:2],
+                           height=height, distance=distance)
 
-                    picks.append(Pick(time=pick_time,
-                                      station=self.metadata.station,
-                                      phase=self.phase[i])
-                                 )
-
-        self.picks = picks
+        starttime = obspy.UTCDateTime(self.metadata.starttime)
+        delta = self.metadata.delta
+        self.picks = [Pick(time=starttime + pick['sample'] * delta,
+                           station=self.metadata.station,
+                           phase=str(pick['phase']))
+                      for pick in picks]
 
     def write_picks_to_database(self, tag, database):
         """
         Write picks into the database.
 
         :param str tag: Output pick tag name.
-        :param database: SQL database name.
+        :param database: SQL database name, or a sql.PickWriter to
+            buffer picks of many labels.
         """
-        db = seisnn.sql.Client(database)
-        for pick in self.picks:
-            db.add_pick(time=pick.time.datetime,
-                        station=pick.station,
-                        phase=pick.phase,
-                        tag=tag)
+        if isinstance(database, seisnn.sql.PickWriter):
+            database.add_picks(self.picks, tag=tag)
+            return
+
+        with seisnn.sql.PickWriter(database) as writer:
+            writer.add_picks(self.picks, tag=tag)
+
+
+@functools.lru_cache(maxsize=32)
+def get_label_kernel(shape, half_width):
+    """
+    Returns the label wavelet, cached per shape and half width.
+
+    :param str shape: Label shape, see scipy.signal.windows.get_window().
+    :param int half_width: Label half width in data point.
+    :rtype: np.array
+    :return: Read-only float32 kernel.
+    """
+    wavelet = scipy.signal.windows.get_window(shape, 2 * half_width)
+    kernel = wavelet[1:].astype(np.float32)
+    kernel.flags.writeable = False
+    return kernel
+
+
+def make_label_stack(window_index, phase_index, sample_index,
+                     n_window, npts, phase, shape, half_width=20):
+    """
+    Returns labels of a stack of windows from pick sample indexes.
+
+    Picks are scattered into one float32 buffer and the wavelet is added
+    around each pick, the same as convolving the pick impulses. EQ is
+    the window from P to S, N is 1 - P - S.
+
+    :param window_index: Window index of each pick.
+    :param phase_index: Phase column of each pick.
+    :param sample_index: Sample index of each pick in its window.
+    :param int n_window: Number of windows.
+    :param int npts: Data points of each window.
+    :param phase: Phase names in label column order.
+    :param str shape: Label shape, see scipy.signal.windows.get_window().
+    :param int half_width: Label half width in data point.
+    :rtype: np.array
+    :return: Labels in [window, npts, phase].
+    """
+    data = np.zeros([n_window, npts, len(phase)], dtype=np.float32)
+    inside = (sample_index >= 0) & (sample_index < npts)
+    data[window_index[inside], sample_index[inside], phase_index[inside]] = 1
+
+    ph_index = {name: i for i, name in enumerate(phase)}
+    if 'EQ' in ph_index:
+        # Make EQ window start by P and end by S.
+        eq = np.cumsum(data[:, :, ph_index['P']] - data[:, :, ph_index['S']],
+                       axis=1)
+        eq[np.any(eq < 0, axis=1)] += 1
+        data[:, :, ph_index['EQ']] = eq
+
+    columns = [i for i, name in enumerate(phase) if name != 'EQ']
+    impulse = data[:, :, columns]
+    data[:, :, columns] = 0
+    window, sample, column = np.nonzero(impulse)
+
+    kernel = get_label_kernel(shape, half_width)
+    target = sample[:, np.newaxis] - (kernel.size - 1) // 2 \
+        + np.arange(kernel.size)
+    window, target, column, value = np.broadcast_arrays(
+        window[:, np.newaxis], target,
+        np.array(columns)[column][:, np.newaxis], kernel[np.newaxis, :])
+    inside = (target >= 0) & (target < npts)
+    np.add.at(data, (window[inside], target[inside], column[inside]),
+              value[inside])
+
+    if 'N' in ph_index:
+        # Make Noise window by 1 - P - S
+        data[:, :, ph_index['N']] = 1
+        data[:, :, ph_index['N']] -= data[:, :, ph_index['P']]
+        data[:, :, ph_index['N']] -= data[:, :, ph_index['S']]
+
+    return data
+
+
+PICK_DTYPE = np.dtype([
+    ('instance', np.int64),
+    ('phase', 'U8'),
+    ('sample', np.int64),
+    ('time', np.int64),
+    ('value', np.float32),
+])
+
+
+def find_picks(data, phase, starttime=None, delta=0.01,
+               height=0.5, distance=100):
+    """
+    Returns peaks of a stack of labels or predictions as pick records.
+
+    Same peaks as scipy.signal.find_peaks with height and distance on
+    every trace, found on the whole stack at once: local maxima above
+    height, flat tops picked at the middle, then lower peaks within
+    distance of a higher one are removed.
+
+    :param data: Labels or predictions in [batch, npts, phase].
+    :param phase: Phase names of the columns.
+    :param starttime: Window starttime in epoch microseconds, array in
+        [batch] or a number, default is 0.
+    :param delta: Sampling interval in seconds, array in [batch] or a
+        number.
+    :param float height: Height threshold, from 0 to 1, default is 0.5.
+    :param int distance: Distance threshold in data point.
+    :rtype: np.ndarray
+    :return: PICK_DTYPE records sorted by instance, phase and sample,
+        time in epoch microseconds.
+    """
+    data = np.asarray(data)
+    batch, npts, n_phase = data.shape
+    # One contiguous row per instance and phase, found peaks are sorted.
+    rows = np.ascontiguousarray(np.moveaxis(data, 2, 1)) \
+        .reshape(batch * n_phase, npts)
+
+    inner = rows[:, 1:-1]
+    is_peak = inner >= height
+    is_peak &= inner > rows[:, :-2]
+    is_peak &= inner >= rows[:, 2:]
+    index = np.flatnonzero(is_peak)
+    row, sample = np.divmod(index, npts - 2)
+    sample += 1
+    value = rows[row, sample]
+
+    # Flat tops, walk ahead to the first different sample.
+    ahead = sample + 1
+    flat = np.flatnonzero(rows[row, ahead] == value)
+    while flat.size:
+        ahead[flat] += 1
+        flat = flat[ahead[flat] < npts]
+        flat = flat[rows[row[flat], ahead[flat]] == value[flat]]
+    ahead_value = rows[row, np.minimum(ahead, npts - 1)]
+    peak = (ahead < npts) & (ahead_value < value)
+    row, value = row[peak], value[peak]
+    sample = (sample[peak] + ahead[peak] - 1) // 2
+
+    if distance > 1 and sample.size:
+        keep = _select_by_distance(row, sample, value, distance)
+        row, sample, value = row[keep], sample[keep], value[keep]
+    instance, column = np.divmod(row, n_phase)
+
+    starttime = np.broadcast_to(
+        np.asarray(0 if starttime is None else starttime, dtype=np.int64),
+        [batch])
+    delta = np.broadcast_to(np.asarray(delta, dtype=np.float64), [batch])
+
+    picks = np.empty(len(sample), dtype=PICK_DTYPE)
+    picks['instance'] = instance
+    picks['phase'] = np.asarray(phase)[column]
+    picks['sample'] = sample
+    picks['time'] = starttime[instance] \
+        + np.round(sample * delta[instance] * 1e6).astype(np.int64)
+    picks['value'] = value
+    return picks
+
+
+def _select_by_distance(row, sample, value, distance):
+    # Greedy from the highest peak like find_peaks, done in rounds: a
+    # peak higher than all undecided neighbors is kept and removes them.
+    n = len(sample)
+    priority = np.empty(n, dtype=np.int64)
+    priority[np.lexsort([sample, value])] = np.arange(n)
+
+    neighbors = []
+    for offset in range(1, n):
+        near = (row[offset:] == row[:-offset]) \
+            & (sample[offset:] - sample[:-offset] < distance)
+        if not near.any():
+            break
+        neighbors.append((offset, near))
+
+    state = np.zeros(n, dtype=np.int8)
+    while not state.all():
+        best = state == 0
+        for offset, near in neighbors:
+            pair = near & (state[offset:] == 0) & (state[:-offset] == 0)
+            right = priority[offset:] > priority[:-offset]
+            best[:-offset][pair & right] = False
+            best[offset:][pair & ~right] = False
+
+        state[best] = 1
+        for offset, near in neighbors:
+            state[:-offset][near & best[offset:] & (state[:-offset] == 0)] = -1
+            state[offset:][near & best[:-offset] & (state[offset:] == 0)] = -1
+
+    return state == 1
 
 
 class Pick:
@@ -227,12 +565,19 @@ class Pick:
 class Instance:
     """
     Main class for data transfer.
+
+    Initialized from a serialized record or a waveform row, only the
+    metadata is decoded, trace, label and predict are decoded on first
+    access.
     """
     metadata = None
 
-    trace = None
-    label = None
-    predict = None
+    _trace = None
+    _label = None
+    _predict = None
+
+    _header = None
+    _example = None
 
     def __init__(self, input_data=None):
         if input_data is None:
@@ -243,10 +588,11 @@ class Instance:
                 self.from_stream(input_data)
 
             elif isinstance(input_data, seisnn.sql.Waveform):
-                dataset = seisnn.io.read_dataset(input_data.tfrecord)
-                for item in dataset.skip(input_data.data_index).take(1):
-                    input_data = item
-                self.from_example(input_data)
+                record, = seisnn.io.read_waveform_records([input_data])
+                self.from_record(record)
+
+            elif isinstance(input_data, bytes):
+                self.from_record(input_data)
 
             else:
                 self.from_example(input_data)
@@ -258,19 +604,79 @@ class Instance:
             print(f'{type(error).__name__}: {error}')
 
     def __repr__(self):
+        if self._label is None and self._header is not None:
+            phase = self._header['phase']
+        else:
+            phase = self.label.phase
+
         return f"Instance(" \
                f"ID={self.metadata.id}, " \
                f"Start Time={self.metadata.starttime}, " \
-               f"Phase={self.label.phase})"
+               f"Phase={phase})"
+
+    @property
+    def trace(self):
+        if self._trace is None and self._example is not None:
+            self._trace = Trace(None)
+            self._trace.metadata = self.metadata
+            self._trace.channel = self._header['channel']
+            self._trace.data = self._decode('trace')
+        return self._trace
+
+    @trace.setter
+    def trace(self, value):
+        self._trace = value
+
+    @property
+    def label(self):
+        if self._label is None and self._example is not None:
+            self._label = Label(self.metadata, self._header['phase'],
+                                tag='label')
+            self._label.data = self._decode('label')
+        return self._label
+
+    @label.setter
+    def label(self, value):
+        self._label = value
+
+    @property
+    def predict(self):
+        if self._predict is None and self._example is not None:
+            self._predict = Label(self.metadata, self._header['phase'],
+                                  tag='predict')
+            self._predict.data = self._decode('predict')
+        return self._predict
+
+    @predict.setter
+    def predict(self, value):
+        self._predict = value
+
+    def from_record(self, record):
+        """
+        Initialized from serialized example, arrays are decoded on access.
+
+        :param bytes record: Serialized sequence example.
+        """
+        self._example = tf.train.SequenceExample.FromString(record)
+        self._header = seisnn.example_proto.parse_header(self._example)
+        self._trace = self._label = self._predict = None
+        self.metadata = Metadata(self._header)
+        return self
+
+    def _decode(self, key):
+        return seisnn.example_proto.decode_array(self._example, key,
+                                                 self.metadata.npts)
 
-    def from_stream(self, stream):
+    def from_stream(self, stream, **kwargs):
         """
         Initialized from stream.
 
         :param stream:
+        :param kwargs: Window settings pass into Trace.from_stream.
         :return:
         """
-        self.trace = Trace(stream)
+        self._example = None
+        self.trace = Trace(stream, **kwargs)
         self.metadata = self.trace.metadata
 
         return self
@@ -281,6 +687,7 @@ class Instance:
 
         :param Feature feature: Feature dict.
         """
+        self._example = None
         self.trace = Trace(feature)
         self.metadata = self.trace.metadata
 
@@ -375,5 +782,288 @@ class Instance:
 
         return tfr_dir
 
+
+class Categorical:
+    """
+    String array stored as integer codes into a list of categories.
+    """
+    __slots__ = ['categories', 'codes']
+
+    def __init__(self, values=None):
+        self.categories = []
+        self.codes = np.zeros(0, dtype=np.int32)
+        if values is not None:
+            self.from_values(values)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, index):
+        codes = self.codes[index]
+        if np.ndim(codes) == 0:
+            return self.categories[codes]
+        return np.asarray(self.categories)[codes]
+
+    def from_values(self, values):
+        """
+        Encodes an array of str or bytes.
+
+        :param values: Array of str or bytes, any shape.
+        """
+        values = np.asarray(values)
+        if values.dtype.kind == 'S':
+            values = np.char.decode(values, 'utf-8')
+        categories, codes = np.unique(values, return_inverse=True)
+        self.categories = categories.tolist()
+        self.codes = codes.astype(np.int32).reshape(values.shape)
+        return self
+
+    def to_array(self):
+        """
+        Returns decoded str array.
+
+        :rtype: np.ndarray
+        """
+        return np.asarray(self.categories)[self.codes]
+
+
+class InstanceBatch:
+    """
+    Batch of instances stored as one array per field.
+
+    Trace, label and predict are float32 in [batch, npts, channel],
+    starttime and endtime are in epoch microseconds, id, station and channel are
+    Categorical. All instances share npts and phase.
+    """
+    id = None
+    station = None
+    channel = None
+    phase = None
+
+    starttime = None
+    endtime = None
+    npts = None
+    delta = None
+
+    trace = None
+    label = None
+    predict = None
+
+    def __init__(self, input_data=None):
+        self._tensors = {}
+        if isinstance(input_data, dict):
+            self.from_batch(input_data)
+
+    def __len__(self):
+        return len(self.starttime)
+
+    def __getitem__(self, index):
+        return Instance().from_feature(self.get_feature(index))
+
+    def __repr__(self):
+        return f"InstanceBatch(" \
+               f"Size={len(self)}, " \
+               f"Stations={self.station.categories}, " \
+               f"Phase={self.phase})"
+
+    def from_batch(self, batch):
+        """
+        Initialized from a batch of parsed examples.
+
+        Arrays are views of the batch tensors, read-only until replaced.
+
+        :param dict batch: Batched output of
+            example_proto.sequence_example_parser.
+        """
+        self.id = Categorical(_to_bytes(batch['id']))
+        self.station = Categorical(_to_bytes(batch['station']))
+        self.channel = Categorical(_pad_ragged(batch['channel']))
+
+        phase = Categorical(_pad_ragged(batch['phase']))
+        if np.any(phase.codes != phase.codes[0]):
+            raise ValueError('Instances in the batch have different phase')
+        self.phase = phase[0].tolist()
+
+        self.starttime = _parse_time(batch['starttime'])
+        self.endtime = _parse_time(batch['endtime'])
+        self.npts = int(np.asarray(batch['npts'])[0])
+        self.delta = np.asarray(batch['delta'], dtype=np.float32)
+
+        self._tensors = {}
+        for key in ['trace', 'label', 'predict']:
+            array = np.asarray(batch[key], dtype=np.float32)
+            array = array.reshape(len(self), self.npts, -1)
+            setattr(self, key, array)
+            if isinstance(batch[key], tf.Tensor):
+                self._tensors[key] = (array, batch[key])
+        return self
+
+    def to_batch(self):
+        """
+        Returns batch in the layout of parsed examples.
+
+        Unchanged arrays give back their source tensors, new arrays are
+        shared with TensorFlow through DLPack when numpy supports it.
+
+        :rtype: dict
+        :return: Dict of tensors.
+        """
+        batch = {
+            'id': tf.constant(self.id.to_array().astype(bytes)),
+            'station': tf.constant(self.station.to_array().astype(bytes)),
+            'starttime': tf.constant(_format_time(self.starttime)),
+            'endtime': tf.constant(_format_time(self.endtime)),
+
+            'npts': tf.fill([len(self)], tf.constant(self.npts, tf.int64)),
+            'delta': tf.constant(self.delta),
+
+            'channel': _to_ragged(self.channel.to_array()),
+            'phase': _to_ragged([self.phase] * len(self)),
+        }
+        for key in ['trace', 'label', 'predict']:
+            array = getattr(self, key)
+            source = self._tensors.get(key)
+            if source is not None and source[0] is array:
+                batch[key] = source[1]
+            else:
+                batch[key] = _to_tensor(
+                    array.reshape(len(self), 1, self.npts, -1))
+        return batch
+
+    def get_feature(self, index):
+        """
+        Returns Feature object of one instance.
+
+        :param int index: Instance index.
+        :rtype: Feature
+        :return: Feature object, arrays are views in [1, npts, channel].
+        """
+        feature = seisnn.example_proto.Feature()
+
+        feature.id = self.id[index]
+        feature.station = self.station[index]
+        feature.starttime = _format_time(self.starttime[index]).decode()
+        feature.endtime = _format_time(self.endtime[index]).decode()
+
+        feature.npts = self.npts
+        feature.delta = self.delta[index]
+
+        feature.trace = self.trace[index:index + 1]
+        feature.channel = [channel for channel
+                           in self.channel[index].tolist() if channel]
+
+        feature.phase = list(self.phase)
+        feature.label = self.label[index:index + 1]
+        feature.predict = self.predict[index:index + 1]
+
+        return feature
+
+    def get_picks(self, key='predict', height=0.5, distance=100):
+        """
+        Returns picks of label or predict, see find_picks.
+
+        :param str key: 'label' or 'predict'.
+        :param float height: Height threshold, from 0 to 1, default is 0.5.
+        :param int distance: Distance threshold in data point.
+        :rtype: np.ndarray
+        :return: PICK_DTYPE records, time in epoch microseconds.
+        """
+        return find_picks(getattr(self, key)[:, :, 0:2], self.phase[0:2],
+                          starttime=self.starttime, delta=self.delta,
+                          height=height, distance=distance)
+
+    def write_picks_to_database(self, picks, tag, database):
+        """
+        Write picks into the database.
+
+        :param np.ndarray picks: PICK_DTYPE records from get_picks.
+        :param str tag: Output pick tag name.
+        :param database: SQL database name, or a sql.PickWriter.
+        """
+        stations = self.station.to_array()
+        if isinstance(database, seisnn.sql.PickWriter):
+            database.add_pick_array(picks, stations, tag)
+            return
+
+        with seisnn.sql.PickWriter(database) as writer:
+            writer.add_pick_array(picks, stations, tag)
+
+    def to_example(self, index):
+        """
+        Returns example protocol of one instance.
+
+        :param int index: Instance index.
+        :return: Example protocol.
+        """
+        feature = self.get_feature(index)
+        return seisnn.example_proto.feature_to_example(feature)
+
+    def to_tfrecord(self, file_path):
+        """
+        Write all instances into one TFRecord.
+
+        :param str file_path: Output path.
+        """
+        seisnn.io.write_tfrecord(
+            (self.to_example(index) for index in range(len(self))),
+            file_path)
+
+    def plot(self, index=0, **kwargs):
+        """
+        Plot one instance.
+
+        :param int index: Instance index.
+        :param kwargs: Keywords pass into plot.
+        """
+        seisnn.plot.plot_dataset(self[index], **kwargs)
+
+    def get_tfrecord_name(self, index):
+        starttime = obspy.UTCDateTime(self.starttime[index] / 1e6)
+        return f'{self.id[index][:-1]}.{starttime.year}.' \
+               f'{starttime.julday}.tfrecord'
+
+
+def _pad_ragged(tensor):
+    # [batch, item, 1] ragged strings to [batch, item] bytes, padded by b''.
+    if isinstance(tensor, tf.RaggedTensor):
+        tensor = tensor.to_tensor(default_value=b'')
+    array = _to_bytes(tensor)
+    return array.reshape(array.shape[0], -1)
+
+
+def _to_bytes(tensor):
+    # String tensors convert to object arrays.
+    return np.asarray(tensor).astype(bytes)
+
+
+def _to_ragged(values):
+    # [batch, item] str, b'' padding dropped, to [batch, item, 1] ragged.
+    values = [[[item.encode('utf-8')] for item in row if item]
+              for row in values]
+    return tf.ragged.constant(values, dtype=tf.string, ragged_rank=2)
+
+
+def _parse_time(tensor):
+    return np.char.rstrip(_to_bytes(tensor), b'Z') \
+        .astype('datetime64[us]').astype(np.int64)
+
+
+def _format_time(epoch_us):
+    # Same string as UTCDateTime.isoformat() in Instance.to_feature.
+    epoch_us = np.asarray(epoch_us, dtype=np.int64)
+    times = [obspy.UTCDateTime(ns=int(value) * 1000).isoformat()
+             for value in epoch_us.ravel()]
+    return np.array(times, dtype=bytes).reshape(epoch_us.shape)[()]
+
+
+def _to_tensor(array):
+    # DLPack shares the buffer, read-only arrays can not be exported.
+    array = np.ascontiguousarray(array, dtype=np.float32)
+    try:
+        return tf.experimental.dlpack.from_dlpack(array.__dlpack__())
+    except (AttributeError, BufferError):
+        return tf.convert_to_tensor(array)
+
+
 if __name__ == "__main__":
     pass
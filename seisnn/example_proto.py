@@ -73,11 +73,11 @@ def feature_to_example(feature):
         'delta': _float_feature(feature.delta),
 
         'trace': _bytes_feature(
-            feature.trace.astype(dtype=np.float32).tostring()),
+            feature.trace.astype(dtype=np.float32).tobytes()),
         'label': _bytes_feature(
-            feature.label.astype(dtype=np.float32).tostring()),
+            feature.label.astype(dtype=np.float32).tobytes()),
         'predict': _bytes_feature(
-            feature.predict.astype(dtype=np.float32).tostring()),
+            feature.predict.astype(dtype=np.float32).tobytes()),
     }
     context = tf.train.Features(feature=context_data)
 
@@ -151,6 +151,60 @@ def sequence_example_parser(record):
     return parsed_example
 
 
+def parse_header(record):
+    """
+    Returns header fields from a serialized sequence example.
+
+    Trace, label and predict stay undecoded bytes, only metadata is
+    converted.
+
+    :param record: Serialized sequence example, or a parsed
+        tf.train.SequenceExample.
+    :rtype: dict
+    :return: Header dict.
+    """
+    example = record
+    if not isinstance(example, tf.train.SequenceExample):
+        example = tf.train.SequenceExample.FromString(record)
+    context = example.context.feature
+
+    header = {}
+    for key in ['id', 'station', 'starttime', 'endtime']:
+        value = context[key].bytes_list.value if key in context else []
+        header[key] = value[0].decode('utf-8') if value else ''
+
+    npts = context['npts'].int64_list.value if 'npts' in context else []
+    delta = context['delta'].float_list.value if 'delta' in context else []
+    header['npts'] = npts[0] if npts else 0
+    header['delta'] = delta[0] if delta else 0.0
+
+    for key in ['channel', 'phase']:
+        feature_list = example.feature_lists.feature_list[key].feature
+        header[key] = [item.bytes_list.value[0].decode('utf-8')
+                       for item in feature_list]
+
+    return header
+
+
+def decode_array(example, key, npts):
+    """
+    Returns trace, label or predict of a parsed sequence example.
+
+    :param example: tf.train.SequenceExample.
+    :param str key: 'trace', 'label' or 'predict'.
+    :param int npts: Data points.
+    :rtype: np.ndarray
+    :return: Read-only float32 array in [1, npts, channel], a view of
+        the example bytes.
+    """
+    context = example.context.feature
+    value = context[key].bytes_list.value if key in context else []
+    data = np.frombuffer(value[0] if value else b'', dtype=np.float32)
+    if not data.size:
+        return data.reshape(1, npts, 0)
+    return data.reshape(1, npts, -1)
+
+
 def eval_eager_tensor(parsed_example):
     """
     Returns feature dict from parsed example.
@@ -6,6 +6,7 @@ import collections
 import multiprocessing as mp
 import itertools
 import os
+import struct
 import warnings
 
 from lxml import etree
@@ -35,6 +36,180 @@ def read_dataset(file_list):
     return dataset
 
 
+def iter_tfrecord(file_path):
+    """
+    Yields raw records from TFRecord file without TensorFlow.
+
+    Each record is framed as uint64 length, uint32 length CRC, data and
+    uint32 data CRC, CRCs are not verified.
+
+    :param str file_path: TFRecord file path.
+    :return: (byte offset of the record, data length, data bytes).
+    """
+    with open(file_path, 'rb') as file:
+        offset = 0
+        while True:
+            frame = file.read(12)
+            if not frame:
+                return
+            if len(frame) < 12:
+                raise IOError(f'Truncated record at {offset} in {file_path}')
+
+            length, = struct.unpack('<Q', frame[:8])
+            record = file.read(length)
+            if len(record) < length:
+                raise IOError(f'Truncated record at {offset} in {file_path}')
+            file.seek(4, os.SEEK_CUR)
+
+            yield offset, length, record
+            offset += length + 16
+
+
+def get_record_offsets(file_path):
+    """
+    Returns byte offset and data length of every record in TFRecord file.
+
+    Only the frame headers are read, data is skipped by seeking.
+
+    :param str file_path: TFRecord file path.
+    :rtype: list
+    :return: List of (offset, length).
+    """
+    offsets = []
+    with open(file_path, 'rb') as file:
+        offset = 0
+        while True:
+            frame = file.read(12)
+            if len(frame) < 12:
+                return offsets
+
+            length, = struct.unpack('<Q', frame[:8])
+            offsets.append((offset, length))
+            offset += length + 16
+            file.seek(offset)
+
+
+def read_record(file, offset, length=None):
+    """
+    Returns a single raw record at the byte offset.
+
+    :param file: TFRecord file path or an opened binary file.
+    :param int offset: Byte offset of the record frame.
+    :param int length: Data length, read from the frame if None.
+    :rtype: bytes
+    :return: Serialized example.
+    """
+    if isinstance(file, str):
+        with open(file, 'rb') as opened:
+            return read_record(opened, offset, length)
+
+    file.seek(offset)
+    frame = file.read(12)
+    if len(frame) < 12:
+        raise IOError(f'No record at {offset} in {file.name}')
+    if length is None:
+        length, = struct.unpack('<Q', frame[:8])
+
+    record = file.read(length)
+    if len(record) < length:
+        raise IOError(f'Truncated record at {offset} in {file.name}')
+    return record
+
+
+def read_records(locations):
+    """
+    Returns raw records of many locations, grouped by file.
+
+    Every file is opened once and read in offset order, records are
+    returned in input order.
+
+    :param list locations: List of (file path, offset, length).
+    :rtype: list
+    :return: List of serialized example.
+    """
+    groups = collections.defaultdict(list)
+    for index, (file_path, offset, length) in enumerate(locations):
+        groups[file_path].append((offset, length, index))
+
+    records = [None] * len(locations)
+    for file_path, items in groups.items():
+        with open(file_path, 'rb') as file:
+            for offset, length, index in sorted(items):
+                records[index] = read_record(file, offset, length)
+
+    return records
+
+
+def read_waveform_records(waveforms):
+    """
+    Returns raw records of waveform table rows.
+
+    Rows without stored offsets are located by data_index from the frame
+    headers of their file.
+
+    :param list waveforms: List of sql.Waveform.
+    :rtype: list
+    :return: List of serialized example, in input order.
+    """
+    offsets = {}
+    locations = []
+    for waveform in waveforms:
+        if waveform.offset is not None:
+            locations.append((waveform.tfrecord,
+                              waveform.offset,
+                              waveform.length))
+            continue
+
+        if waveform.tfrecord not in offsets:
+            offsets[waveform.tfrecord] = get_record_offsets(
+                waveform.tfrecord)
+        offset, length = offsets[waveform.tfrecord][waveform.data_index]
+        locations.append((waveform.tfrecord, offset, length))
+
+    return read_records(locations)
+
+
+def read_waveforms(waveforms):
+    """
+    Returns parsed examples of waveform table rows.
+
+    :param list waveforms: List of sql.Waveform.
+    :rtype: list
+    :return: List of parsed example, in input order.
+    """
+    return [seisnn.example_proto.sequence_example_parser(record)
+            for record in read_waveform_records(waveforms)]
+
+
+def read_tfrecord_header(file_path):
+    """
+    Returns header of every example in a TFRecord file.
+
+    Only context metadata is parsed, see example_proto.parse_header.
+
+    :param str file_path: TFRecord file path.
+    :rtype: dict
+    :return: Dict of path, size, mtime and list of header dict with
+        data_index, offset and length.
+    """
+    stat = os.stat(file_path)
+    headers = []
+    for index, (offset, length, record) in enumerate(
+            iter_tfrecord(file_path)):
+        header = seisnn.example_proto.parse_header(record)
+        header['data_index'] = index
+        header['offset'] = offset
+        header['length'] = length
+        headers.append(header)
+
+    return {
+        'path': file_path,
+        'size': stat.st_size,
+        'mtime': stat.st_mtime,
+        'headers': headers,
+    }
+
+
 def write_tfrecord(example_list, save_file):
     """
     Writes TFRecord from example protocol.
@@ -55,10 +230,7 @@ def read_event_list(sfile_dir):
     :rtype: list
     :return: list of event.
     """
-    config = seisnn.utils.Config()
-    sfile_dir = os.path.join(config.catalog, sfile_dir)
-
-    sfile_list = seisnn.utils.get_dir_list(sfile_dir, ".S*")
+    sfile_list = get_sfile_list(sfile_dir)
     print(f'Reading events from {sfile_dir}')
 
     event_list = seisnn.utils.parallel(sfile_list, func=get_event)
@@ -69,6 +241,45 @@ def read_event_list(sfile_dir):
     return events
 
 
+def get_sfile_list(sfile_dir):
+    """
+    Returns sfile list from sfile directory.
+
+    :param str sfile_dir: Directory contains SEISAN sfile.
+    :rtype: list
+    :return: List of sfile path.
+    """
+    config = seisnn.utils.Config()
+    sfile_dir = os.path.join(config.catalog, sfile_dir)
+    return seisnn.utils.get_dir_list(sfile_dir, ".S*")
+
+
+def read_sfile_list(sfile_list):
+    """
+    Returns events of each sfile.
+
+    :param list sfile_list: List of sfile path.
+    :rtype: list
+    :return: List of (sfile path, list of event).
+    """
+    if not sfile_list:
+        return []
+
+    result = seisnn.utils.parallel(sfile_list, func=get_sfile_events)
+    return list(itertools.chain.from_iterable(result))
+
+
+def get_sfile_events(file):
+    """
+    Returns sfile path with its events.
+
+    :param str file: Sfile file path.
+    :rtype: tuple
+    :return: (sfile path, list of event).
+    """
+    return file, get_event(file) or []
+
+
 def get_event(file, debug=False):
     """
     Returns obspy.event list from sfile.
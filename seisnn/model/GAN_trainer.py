@@ -29,7 +29,7 @@ class BaseTrainer:
     def get_dataset_length(database=None, tfr_list=None):
         count = None
         try:
-            db = seisnn.sql.Client(database)
+            db = seisnn.sql.get_snapshot(database)
             tfr_list = seisnn.utils.flatten_list(tfr_list)
             counts = db.get_tfrecord(path=tfr_list, column='count')
             count = sum(seisnn.utils.flatten_list(counts))
@@ -8,12 +8,13 @@ import tensorflow as tf
 from obspy.core.utcdatetime import UTCDateTime
 from datetime import datetime
 
-from seisnn.core import Instance
 from seisnn.model.attention import TransformerBlockE, TransformerBlockD, \
     MultiHeadSelfAttention, ResBlock
 from seisnn.plot import plot_error_distribution
+import seisnn.core
 import seisnn.example_proto
 import seisnn.io
+import seisnn.qc
 import seisnn.sql
 import seisnn.utils
 
@@ -23,7 +24,7 @@ class BaseEvaluator:
     def get_dataset_length(self):
         count = None
         try:
-            db = seisnn.sql.Client(self.database)
+            db = seisnn.sql.get_snapshot(self.database)
             count = len(db.get_waveform())
         except Exception as error:
             print(f'{type(error).__name__}: {error}')
@@ -82,24 +83,20 @@ class GeneratorEvaluator(BaseEvaluator):
             })
 
         dataset = seisnn.io.read_dataset(tfr_list)
+        config = seisnn.utils.Config()
+        sub_dir = os.path.join(config.eval, self.model_name)
         n = 0
         for val in dataset.prefetch(100).batch(batch_size):
             progbar = tf.keras.utils.Progbar(len(val['label']))
             val['predict'] = self.model.predict(val['trace'])
-            iterator = seisnn.example_proto.batch_iterator(val)
-            for i in range(len(val['predict'])):
-                config = seisnn.utils.Config()
-                instance = Instance(next(iterator))
-
-                sub_dir = getattr(config, 'eval')
-                sub_dir = os.path.join(sub_dir, self.model_name)
-
-                file_name = instance.get_tfrecord_name()
+            instances = seisnn.core.InstanceBatch(val)
+            for i in range(len(instances)):
+                file_name = instances.get_tfrecord_name(i)
                 net, sta, loc, chan, year, julday, suffix = file_name.split('.')
                 tfr_dir = os.path.join(sub_dir, year, net, sta)
                 seisnn.utils.make_dirs(tfr_dir)
                 save_file = os.path.join(tfr_dir, f'{n:0>6}.' + file_name)
-                instance.to_tfrecord(save_file)
+                seisnn.io.write_tfrecord([instances.to_example(i)], save_file)
                 progbar.add(1)
                 n = n + 1
 
@@ -115,35 +112,29 @@ class GeneratorEvaluator(BaseEvaluator):
         num_S_label = 0
         dataset = seisnn.io.read_dataset(tfr_list)
         for val in dataset.prefetch(100).batch(batch_size):
-            iterator = seisnn.example_proto.batch_iterator(val)
             progbar = tf.keras.utils.Progbar(len(val['predict']))
-            for i in range(len(val['predict'])):
-                instance = Instance(next(iterator))
-                instance.label.get_picks(height=height)
-                instance.predict.get_picks(height=height)
-
-                for pick in instance.label.picks:
-                    if pick.phase == 'P':
-                        for p_pick in instance.predict.picks:
-                            if p_pick.phase == pick.phase:
-                                if pick.time - delta <= p_pick.time <= pick.time + delta:
-                                    P_true_positive = P_true_positive + 1
-                                    P_error_array.append(p_pick.time - pick.time)
-
-                        num_P_label += 1
-                    if pick.phase == 'S':
-                        for p_pick in instance.predict.picks:
-                            if p_pick.phase == pick.phase:
-                                if pick.time - delta <= p_pick.time <= pick.time + delta:
-                                    S_true_positive = S_true_positive + 1
-                                    S_error_array.append(p_pick.time - pick.time)
-                        num_S_label += 1
-                for pick in instance.predict.picks:
-                    if pick.phase == 'P':
-                        num_P_predict += 1
-                    if pick.phase == 'S':
-                        num_S_predict += 1
-                progbar.add(1)
+            instances = seisnn.core.InstanceBatch(val)
+            picks = {}
+            for key in ['label', 'predict']:
+                picks[key] = instances.get_picks(key, height=height)
+
+            for phase_name in ['P', 'S']:
+                label = picks['label'][picks['label']['phase'] == phase_name]
+                predict = picks['predict'][
+                    picks['predict']['phase'] == phase_name]
+                true_positive, error = seisnn.qc.match_picks(
+                    label, predict, delta)
+                if phase_name == 'P':
+                    P_true_positive += true_positive
+                    P_error_array.extend(error)
+                    num_P_label += len(label)
+                    num_P_predict += len(predict)
+                else:
+                    S_true_positive += true_positive
+                    S_error_array.extend(error)
+                    num_S_label += len(label)
+                    num_S_predict += len(predict)
+            progbar.add(len(val['predict']))
         print(f'num_P_predict = {num_P_predict}, num_S_predict = {num_S_predict}')
         print(f'num_P_label = {num_P_label}, num_S_label = {num_S_label}')
         for phase in ['P', 'S']:
@@ -21,6 +21,55 @@ def precision_recall_f1_score(true_positive, pred_count, val_count):
     return precision, recall, f1
 
 
+def match_picks(true_picks, pred_picks, tolerance):
+    """
+    Matches predicted picks to true picks of the same instance and phase.
+
+    Every predicted pick within tolerance of a true pick is counted as a
+    true positive.
+
+    :param numpy.array true_picks: Picks in core.PICK_DTYPE.
+    :param numpy.array pred_picks: Picks in core.PICK_DTYPE.
+    :param float tolerance: Time tolerance in seconds.
+    :rtype: tuple
+    :return: (true positive count, predict minus true time in seconds)
+    """
+    tolerance = int(round(tolerance * 1e6))
+    true_positive = 0
+    errors = []
+    for phase in np.unique(true_picks['phase']):
+        true = true_picks[true_picks['phase'] == phase]
+        pred = pred_picks[pred_picks['phase'] == phase]
+        if not len(pred):
+            continue
+
+        # Sortable key of instance and time from the instance start.
+        n_instance = max(true['instance'].max(), pred['instance'].max()) + 1
+        base = np.full(n_instance, np.iinfo(np.int64).max)
+        np.minimum.at(base, true['instance'], true['time'])
+        np.minimum.at(base, pred['instance'], pred['time'])
+        true_time = true['time'] - base[true['instance']]
+        pred_time = pred['time'] - base[pred['instance']]
+        span = max(true_time.max(), pred_time.max()) + 2 * tolerance + 1
+        true_key = true['instance'] * span + true_time + tolerance
+        pred_key = pred['instance'] * span + pred_time + tolerance
+
+        order = np.argsort(pred_key, kind='stable')
+        pred_key = pred_key[order]
+        first = np.searchsorted(pred_key, true_key - tolerance, 'left')
+        last = np.searchsorted(pred_key, true_key + tolerance, 'right')
+        counts = last - first
+        true_positive += int(counts.sum())
+
+        position = np.repeat(first - np.cumsum(counts) + counts, counts) \
+            + np.arange(counts.sum())
+        errors.append((pred_key[position] - np.repeat(true_key, counts))
+                      / 1e6)
+
+    errors = np.concatenate(errors) if errors else np.empty(0)
+    return true_positive, errors
+
+
 def signal_to_noise_ratio(signal, noise):
     """
     Calculates power ratio from signal and noise.
@@ -4,9 +4,21 @@ SQL Database
 
 import os
 import operator
+import collections
 import contextlib
-
+import datetime
+import json
+import math
+import re
+import sqlite3
+import sys
+import time
+
+import numpy as np
+import pandas as pd
 import sqlalchemy
+import sqlalchemy.event
+import sqlalchemy.exc
 import sqlalchemy.orm
 import sqlalchemy.ext.declarative
 from obspy import UTCDateTime
@@ -19,6 +31,322 @@ import seisnn.utils
 
 Base = sqlalchemy.ext.declarative.declarative_base()
 
+# Characters treated as wildcard by get_matched_list, posix and SQL style.
+WILDCARD_CHARACTERS = '*?%_'
+
+# SQLite R*Tree virtual tables, 32-bit float boxes rounded outward, so
+# results need an exact filter on the source table afterward.
+EVENT_RTREE = sqlalchemy.table(
+    'event_rtree',
+    *[sqlalchemy.column(name) for name in [
+        'id',
+        'min_latitude', 'max_latitude',
+        'min_longitude', 'max_longitude',
+        'min_depth', 'max_depth',
+        'min_time', 'max_time',
+    ]])
+
+INVENTORY_RTREE = sqlalchemy.table(
+    'inventory_rtree',
+    *[sqlalchemy.column(name) for name in [
+        'id',
+        'min_latitude', 'max_latitude',
+        'min_longitude', 'max_longitude',
+    ]])
+
+WAVEFORM_RTREE = sqlalchemy.table(
+    'waveform_rtree',
+    *[sqlalchemy.column(name) for name in [
+        'id', 'min_time', 'max_time', 'station',
+    ]])
+
+TFRECORD_RTREE = sqlalchemy.table(
+    'tfrecord_rtree',
+    *[sqlalchemy.column(name) for name in [
+        'id', 'min_time', 'max_time', 'station',
+    ]])
+
+# Temporary table of time windows for get_waveforms_overlapping.
+WAVEFORM_WINDOW = sqlalchemy.Table(
+    'waveform_window', sqlalchemy.MetaData(),
+    sqlalchemy.Column('window_index', sqlalchemy.Integer, nullable=False),
+    sqlalchemy.Column('station', sqlalchemy.String),
+    sqlalchemy.Column('min_time', sqlalchemy.Float, nullable=False),
+    sqlalchemy.Column('max_time', sqlalchemy.Float, nullable=False),
+    sqlalchemy.Column('from_time', sqlalchemy.DateTime, nullable=False),
+    sqlalchemy.Column('to_time', sqlalchemy.DateTime, nullable=False),
+    prefixes=['TEMPORARY'])
+
+# Window overlap joins, CROSS JOIN keeps the window table as outer loop.
+WAVEFORM_OVERLAP_RTREE_SQL = """
+    SELECT query.window_index, waveform.id
+    FROM temp.waveform_window AS query
+    CROSS JOIN waveform_rtree AS rtree
+    CROSS JOIN waveform
+    WHERE rtree.max_time >= query.min_time
+        AND rtree.min_time <= query.max_time
+        AND (query.station IS NULL OR rtree.station = query.station)
+        AND waveform.id = rtree.id
+        AND waveform.endtime >= query.from_time
+        AND waveform.starttime <= query.to_time
+"""
+
+WAVEFORM_OVERLAP_SQL = """
+    SELECT query.window_index, waveform.id
+    FROM temp.waveform_window AS query
+    CROSS JOIN waveform
+    WHERE query.station IS NOT NULL
+        AND waveform.station = query.station
+        AND waveform.starttime <= query.to_time
+        AND waveform.endtime >= query.from_time
+    UNION ALL
+    SELECT query.window_index, waveform.id
+    FROM temp.waveform_window AS query
+    CROSS JOIN waveform
+    WHERE query.station IS NULL
+        AND waveform.starttime <= query.to_time
+        AND waveform.endtime >= query.from_time
+"""
+
+# Epoch seconds of a DateTime column in SQLite.
+EPOCH_SQL = "((julianday({}) - 2440587.5) * 86400.0)"
+
+RTREE_INDEX_DDL = {
+    'event_rtree': [
+        """CREATE VIRTUAL TABLE event_rtree USING rtree(
+            id,
+            min_latitude, max_latitude,
+            min_longitude, max_longitude,
+            min_depth, max_depth,
+            min_time, max_time)""",
+        f"""CREATE TRIGGER event_rtree_insert AFTER INSERT ON event BEGIN
+            INSERT OR REPLACE INTO event_rtree VALUES (
+                new.id,
+                new.latitude, new.latitude,
+                new.longitude, new.longitude,
+                new.depth, new.depth,
+                {EPOCH_SQL.format('new.time')},
+                {EPOCH_SQL.format('new.time')});
+        END""",
+        f"""CREATE TRIGGER event_rtree_update AFTER UPDATE ON event BEGIN
+            DELETE FROM event_rtree WHERE id = old.id;
+            INSERT INTO event_rtree VALUES (
+                new.id,
+                new.latitude, new.latitude,
+                new.longitude, new.longitude,
+                new.depth, new.depth,
+                {EPOCH_SQL.format('new.time')},
+                {EPOCH_SQL.format('new.time')});
+        END""",
+        """CREATE TRIGGER event_rtree_delete AFTER DELETE ON event BEGIN
+            DELETE FROM event_rtree WHERE id = old.id;
+        END""",
+        f"""INSERT INTO event_rtree
+            SELECT id,
+                latitude, latitude,
+                longitude, longitude,
+                depth, depth,
+                {EPOCH_SQL.format('time')}, {EPOCH_SQL.format('time')}
+            FROM event""",
+    ],
+    'inventory_rtree': [
+        """CREATE VIRTUAL TABLE inventory_rtree USING rtree(
+            id,
+            min_latitude, max_latitude,
+            min_longitude, max_longitude)""",
+        """CREATE TRIGGER inventory_rtree_insert AFTER INSERT ON inventory
+        BEGIN
+            INSERT OR REPLACE INTO inventory_rtree VALUES (
+                new.rowid,
+                new.latitude, new.latitude,
+                new.longitude, new.longitude);
+        END""",
+        """CREATE TRIGGER inventory_rtree_update AFTER UPDATE ON inventory
+        BEGIN
+            DELETE FROM inventory_rtree WHERE id = old.rowid;
+            INSERT INTO inventory_rtree VALUES (
+                new.rowid,
+                new.latitude, new.latitude,
+                new.longitude, new.longitude);
+        END""",
+        """CREATE TRIGGER inventory_rtree_delete AFTER DELETE ON inventory
+        BEGIN
+            DELETE FROM inventory_rtree WHERE id = old.rowid;
+        END""",
+        """INSERT INTO inventory_rtree
+            SELECT rowid, latitude, latitude, longitude, longitude
+            FROM inventory""",
+    ],
+    'waveform_rtree': [
+        """CREATE VIRTUAL TABLE waveform_rtree USING rtree(
+            id, min_time, max_time, +station)""",
+        f"""CREATE TRIGGER waveform_rtree_insert AFTER INSERT ON waveform
+        BEGIN
+            INSERT OR REPLACE INTO waveform_rtree VALUES (
+                new.id,
+                {EPOCH_SQL.format('new.starttime')},
+                {EPOCH_SQL.format('new.endtime')},
+                new.station);
+        END""",
+        f"""CREATE TRIGGER waveform_rtree_update AFTER UPDATE ON waveform
+        BEGIN
+            DELETE FROM waveform_rtree WHERE id = old.id;
+            INSERT INTO waveform_rtree VALUES (
+                new.id,
+                {EPOCH_SQL.format('new.starttime')},
+                {EPOCH_SQL.format('new.endtime')},
+                new.station);
+        END""",
+        """CREATE TRIGGER waveform_rtree_delete AFTER DELETE ON waveform
+        BEGIN
+            DELETE FROM waveform_rtree WHERE id = old.id;
+        END""",
+        f"""INSERT INTO waveform_rtree
+            SELECT id,
+                {EPOCH_SQL.format('starttime')},
+                {EPOCH_SQL.format('endtime')},
+                station
+            FROM waveform""",
+    ],
+    'tfrecord_rtree': [
+        """CREATE VIRTUAL TABLE tfrecord_rtree USING rtree(
+            id, min_time, max_time, +station)""",
+        f"""CREATE TRIGGER tfrecord_rtree_insert AFTER INSERT ON tfrecord
+        BEGIN
+            INSERT OR REPLACE INTO tfrecord_rtree VALUES (
+                new.id,
+                {EPOCH_SQL.format('new.date')},
+                {EPOCH_SQL.format('new.date')} + 86400,
+                new.station);
+        END""",
+        f"""CREATE TRIGGER tfrecord_rtree_update AFTER UPDATE ON tfrecord
+        BEGIN
+            DELETE FROM tfrecord_rtree WHERE id = old.id;
+            INSERT INTO tfrecord_rtree VALUES (
+                new.id,
+                {EPOCH_SQL.format('new.date')},
+                {EPOCH_SQL.format('new.date')} + 86400,
+                new.station);
+        END""",
+        """CREATE TRIGGER tfrecord_rtree_delete AFTER DELETE ON tfrecord
+        BEGIN
+            DELETE FROM tfrecord_rtree WHERE id = old.id;
+        END""",
+        f"""INSERT INTO tfrecord_rtree
+            SELECT id,
+                {EPOCH_SQL.format('date')},
+                {EPOCH_SQL.format('date')} + 86400,
+                station
+            FROM tfrecord""",
+    ],
+}
+
+# Compact pick schema: int64 epoch microseconds and small-int codes into
+# pick_code. The pick view keeps the original columns for reading, plus
+# the raw time_us and *_code columns used by _filter_picks.
+PICK_CODE_FIELDS = ['station', 'phase', 'tag']
+
+PICK_CODE = sqlalchemy.table(
+    'pick_code',
+    sqlalchemy.column('id'),
+    sqlalchemy.column('field'),
+    sqlalchemy.column('value'),
+)
+
+PICK_COMPACT = sqlalchemy.table(
+    'pick_compact',
+    sqlalchemy.column('id'),
+    sqlalchemy.column('time'),
+    sqlalchemy.column('station_code'),
+    sqlalchemy.column('phase_code'),
+    sqlalchemy.column('tag_code'),
+    sqlalchemy.column('snr'),
+    sqlalchemy.column('sfile_id'),
+)
+
+EPOCH_US_SQL = "(CAST(strftime('%s', {0}) AS INTEGER) * 1000000 " \
+               "+ CAST(substr({0}, 21, 6) AS INTEGER))"
+
+PICK_CODE_SQL = "(SELECT id FROM pick_code " \
+                "WHERE field = '{0}' AND value = NEW.{0})"
+
+COMPACT_PICK_DDL = [
+    """CREATE TABLE IF NOT EXISTS pick_code (
+        id INTEGER PRIMARY KEY,
+        field VARCHAR NOT NULL,
+        value VARCHAR NOT NULL,
+        UNIQUE (field, value))""",
+    """CREATE TABLE IF NOT EXISTS pick_compact (
+        id INTEGER PRIMARY KEY,
+        time BIGINT NOT NULL,
+        station_code INTEGER NOT NULL REFERENCES pick_code (id),
+        phase_code INTEGER NOT NULL REFERENCES pick_code (id),
+        tag_code INTEGER NOT NULL REFERENCES pick_code (id),
+        snr FLOAT,
+        sfile_id INTEGER REFERENCES sfile (id))""",
+    """CREATE UNIQUE INDEX IF NOT EXISTS uq_pick_compact
+        ON pick_compact (station_code, phase_code, tag_code, time)""",
+    """CREATE INDEX IF NOT EXISTS ix_pick_compact_tag_time
+        ON pick_compact (tag_code, time)""",
+    """CREATE INDEX IF NOT EXISTS ix_pick_compact_sfile
+        ON pick_compact (sfile_id)""",
+]
+
+COMPACT_PICK_VIEW_DDL = [
+    """CREATE VIEW pick AS
+        SELECT c.id AS id,
+            strftime('%Y-%m-%d %H:%M:%S', c.time / 1000000, 'unixepoch')
+                || printf('.%06d', c.time % 1000000) AS time,
+            station.value AS station,
+            phase.value AS phase,
+            tag.value AS tag,
+            c.snr AS snr,
+            c.sfile_id AS sfile_id,
+            c.time AS time_us,
+            c.station_code AS station_code,
+            c.phase_code AS phase_code,
+            c.tag_code AS tag_code
+        FROM pick_compact AS c
+        JOIN pick_code AS station ON station.id = c.station_code
+        JOIN pick_code AS phase ON phase.id = c.phase_code
+        JOIN pick_code AS tag ON tag.id = c.tag_code""",
+    # Fallback for writes which do not go through Client._insert_rows.
+    f"""CREATE TRIGGER pick_insert INSTEAD OF INSERT ON pick BEGIN
+        INSERT OR IGNORE INTO pick_code (field, value)
+            VALUES ('station', NEW.station), ('phase', NEW.phase),
+                ('tag', NEW.tag);
+        INSERT OR IGNORE INTO pick_compact
+            (id, time, station_code, phase_code, tag_code, snr, sfile_id)
+            VALUES (NEW.id, {EPOCH_US_SQL.format('NEW.time')},
+                {PICK_CODE_SQL.format('station')},
+                {PICK_CODE_SQL.format('phase')},
+                {PICK_CODE_SQL.format('tag')},
+                NEW.snr, NEW.sfile_id);
+    END""",
+    """CREATE TRIGGER pick_delete INSTEAD OF DELETE ON pick BEGIN
+        DELETE FROM pick_compact WHERE id = OLD.id;
+    END""",
+    f"""CREATE TRIGGER pick_update INSTEAD OF UPDATE ON pick BEGIN
+        INSERT OR IGNORE INTO pick_code (field, value)
+            VALUES ('station', NEW.station), ('phase', NEW.phase),
+                ('tag', NEW.tag);
+        UPDATE pick_compact SET
+            time = {EPOCH_US_SQL.format('NEW.time')},
+            station_code = {PICK_CODE_SQL.format('station')},
+            phase_code = {PICK_CODE_SQL.format('phase')},
+            tag_code = {PICK_CODE_SQL.format('tag')},
+            snr = NEW.snr,
+            sfile_id = NEW.sfile_id
+        WHERE id = OLD.id;
+    END""",
+]
+
+# Optional unique indexes, {table: (index name, columns)}.
+UNIQUE_CONSTRAINTS = {
+    'event': ('uq_event', ['time', 'latitude', 'longitude', 'depth']),
+    'pick': ('uq_pick', ['time', 'station', 'phase', 'tag']),
+}
+
 
 class Inventory(Base):
     """
@@ -60,6 +388,10 @@ class Event(Base):
     Event table for sql database.
     """
     __tablename__ = 'event'
+    __table_args__ = (
+        sqlalchemy.Index('ix_event_time', 'time'),
+        sqlalchemy.Index('ix_event_sfile', 'sfile_id'),
+    )
     id = sqlalchemy.Column(sqlalchemy.BigInteger()
                            .with_variant(sqlalchemy.Integer, "sqlite"),
                            primary_key=True)
@@ -67,6 +399,8 @@ class Event(Base):
     latitude = sqlalchemy.Column(sqlalchemy.Float, nullable=False)
     longitude = sqlalchemy.Column(sqlalchemy.Float, nullable=False)
     depth = sqlalchemy.Column(sqlalchemy.Float, nullable=False)
+    sfile_id = sqlalchemy.Column(sqlalchemy.Integer,
+                                 sqlalchemy.ForeignKey('sfile.id'))
 
     def __init__(self, event):
         self.time = event.origins[0].time.datetime
@@ -96,6 +430,12 @@ class Pick(Base):
     Pick table for sql database.
     """
     __tablename__ = 'pick'
+    __table_args__ = (
+        sqlalchemy.Index('ix_pick_station_phase_tag_time',
+                         'station', 'phase', 'tag', 'time'),
+        sqlalchemy.Index('ix_pick_tag_time', 'tag', 'time'),
+        sqlalchemy.Index('ix_pick_sfile', 'sfile_id'),
+    )
     id = sqlalchemy.Column(sqlalchemy.BigInteger()
                            .with_variant(sqlalchemy.Integer, "sqlite"),
                            primary_key=True)
@@ -106,6 +446,8 @@ class Pick(Base):
     phase = sqlalchemy.Column(sqlalchemy.String, nullable=False)
     tag = sqlalchemy.Column(sqlalchemy.String, nullable=False)
     snr = sqlalchemy.Column(sqlalchemy.Float)
+    sfile_id = sqlalchemy.Column(sqlalchemy.Integer,
+                                 sqlalchemy.ForeignKey('sfile.id'))
 
     def __init__(self, time, station, phase, tag):
         self.time = time
@@ -131,11 +473,58 @@ class Pick(Base):
         session.add(self)
 
 
+class SFile(Base):
+    """
+    S-file ingest ledger for sql database.
+    """
+    __tablename__ = 'sfile'
+    id = sqlalchemy.Column(sqlalchemy.BigInteger()
+                           .with_variant(sqlalchemy.Integer, "sqlite"),
+                           primary_key=True)
+    path = sqlalchemy.Column(sqlalchemy.String, nullable=False, unique=True)
+    size = sqlalchemy.Column(sqlalchemy.Integer, nullable=False)
+    mtime = sqlalchemy.Column(sqlalchemy.Float, nullable=False)
+    md5 = sqlalchemy.Column(sqlalchemy.String, nullable=False)
+    tag = sqlalchemy.Column(sqlalchemy.String)
+    events = sqlalchemy.Column(sqlalchemy.Integer)
+    picks = sqlalchemy.Column(sqlalchemy.Integer)
+
+    def __init__(self, path, size, mtime, md5, tag=None):
+        self.path = path
+        self.size = size
+        self.mtime = mtime
+        self.md5 = md5
+        self.tag = tag
+
+    def __repr__(self):
+        return f"SFile(" \
+               f"Path={self.path}, " \
+               f"Size={self.size}, " \
+               f"MD5={self.md5}, " \
+               f"Events={self.events}, " \
+               f"Picks={self.picks})"
+
+    def add_db(self, session):
+        """
+        Add data into session.
+
+        :type session: sqlalchemy.orm.session.Session
+        :param session: SQL session.
+        """
+        session.add(self)
+
+
 class Waveform(Base):
     """
     Waveform table for sql database.
     """
     __tablename__ = 'waveform'
+    __table_args__ = (
+        sqlalchemy.Index('ix_waveform_station_starttime',
+                         'station', 'starttime'),
+        sqlalchemy.Index('ix_waveform_starttime', 'starttime'),
+        sqlalchemy.Index('ix_waveform_tfrecord', 'tfrecord', 'data_index'),
+    )
     id = sqlalchemy.Column(sqlalchemy.BigInteger()
                            .with_variant(sqlalchemy.Integer, "sqlite"),
                            primary_key=True)
@@ -149,6 +538,8 @@ class Waveform(Base):
                                  sqlalchemy.ForeignKey('tfrecord.path'),
                                  nullable=False)
     data_index = sqlalchemy.Column(sqlalchemy.Integer)
+    offset = sqlalchemy.Column(sqlalchemy.BigInteger)
+    length = sqlalchemy.Column(sqlalchemy.Integer)
 
     def __init__(self, instance, tfrecord, data_index):
         self.starttime = UTCDateTime(instance.metadata.starttime).datetime
@@ -182,6 +573,10 @@ class TFRecord(Base):
     TFRecord table for sql database.
     """
     __tablename__ = 'tfrecord'
+    __table_args__ = (
+        sqlalchemy.Index('ix_tfrecord_station_date', 'station', 'date'),
+        sqlalchemy.Index('ix_tfrecord_path', 'path'),
+    )
     id = sqlalchemy.Column(sqlalchemy.BigInteger()
                            .with_variant(sqlalchemy.Integer, "sqlite"),
                            primary_key=True)
@@ -197,6 +592,8 @@ class TFRecord(Base):
     count = sqlalchemy.Column(sqlalchemy.Integer, nullable=False)
     path = sqlalchemy.Column(sqlalchemy.String, nullable=False)
     tag = sqlalchemy.Column(sqlalchemy.String)
+    size = sqlalchemy.Column(sqlalchemy.Integer)
+    mtime = sqlalchemy.Column(sqlalchemy.Float)
 
     def __init__(self, path, count):
         self.name = os.path.basename(path)
@@ -227,24 +624,683 @@ class TFRecord(Base):
         session.add(self)
 
 
+def get_event_rows(events, sfile_id=None):
+    """
+    Yields event table rows from obspy events.
+
+    :param list events: List of obspy.core.event.Event.
+    :param int sfile_id: Source S-file id in the ledger.
+    :rtype: dict
+    """
+    for event in events:
+        origin = event.origins[0]
+        yield {
+            'time': origin.time.datetime,
+            'latitude': origin.latitude,
+            'longitude': origin.longitude,
+            'depth': origin.depth,
+            'sfile_id': sfile_id,
+        }
+
+
+def get_pick_rows(events, tag, sfile_id=None):
+    """
+    Yields pick table rows from obspy events.
+
+    :param list events: List of obspy.core.event.Event.
+    :param str tag: Pick tag.
+    :param int sfile_id: Source S-file id in the ledger.
+    :rtype: dict
+    """
+    for event in events:
+        for pick in event.picks:
+            yield {
+                'time': pick.time.datetime,
+                'station': pick.waveform_id.station_code,
+                'phase': pick.phase_hint,
+                'tag': tag,
+                'sfile_id': sfile_id,
+            }
+
+
+def get_tfrecord_row(tfrecord):
+    """
+    Returns tfrecord table row from io.read_tfrecord_header output.
+
+    :param dict tfrecord: TFRecord header dict.
+    :rtype: dict
+    """
+    row = TFRecord(tfrecord['path'], len(tfrecord['headers']))
+    return {
+        'name': row.name,
+        'network': row.network,
+        'station': row.station,
+        'date': row.date,
+        'count': row.count,
+        'path': row.path,
+        'size': tfrecord['size'],
+        'mtime': tfrecord['mtime'],
+    }
+
+
+def get_waveform_rows(tfrecord):
+    """
+    Yields waveform table rows from io.read_tfrecord_header output.
+
+    :param dict tfrecord: TFRecord header dict.
+    :rtype: dict
+    """
+    for header in tfrecord['headers']:
+        yield {
+            'starttime': UTCDateTime(header['starttime']).datetime,
+            'endtime': UTCDateTime(header['endtime']).datetime,
+            'station': header['station'],
+            'channel': ', '.join(header['channel']),
+            'tfrecord': tfrecord['path'],
+            'data_index': header['data_index'],
+            'offset': header['offset'],
+            'length': header['length'],
+        }
+
+
+def to_epoch_us(value):
+    """
+    Returns epoch time in integer microseconds.
+
+    :param value: datetime.datetime, UTCDateTime or time string.
+    :rtype: int
+    """
+    if not isinstance(value, datetime.datetime):
+        value = UTCDateTime(value).datetime
+    return (value - datetime.datetime(1970, 1, 1)) \
+        // datetime.timedelta(microseconds=1)
+
+
+def from_epoch_us(value):
+    """
+    Returns datetime from epoch time in integer microseconds.
+
+    :param int value: Epoch microseconds.
+    :rtype: datetime.datetime
+    """
+    return datetime.datetime(1970, 1, 1) \
+        + datetime.timedelta(microseconds=int(value))
+
+
+_RTREE_MODULE = {
+    'available': None,
+}
+
+
+def has_rtree_module():
+    """
+    Returns True if SQLite is built with the R*Tree module.
+
+    Probed once per process on an in-memory database, a missing module is
+    reported once.
+
+    :rtype: bool
+    """
+    if _RTREE_MODULE['available'] is None:
+        connection = sqlite3.connect(':memory:')
+        try:
+            connection.execute('CREATE VIRTUAL TABLE rtree_probe '
+                               'USING rtree(id, min_value, max_value)')
+            _RTREE_MODULE['available'] = True
+        except sqlite3.OperationalError as error:
+            print(f'R*Tree index disabled, {error}')
+            _RTREE_MODULE['available'] = False
+        finally:
+            connection.close()
+
+    return _RTREE_MODULE['available']
+
+
+def get_bounding_box(latitude, longitude, radius):
+    """
+    Returns the bounding box around a point.
+
+    :param float latitude: Center latitude.
+    :param float longitude: Center longitude.
+    :param float radius: Radius in km.
+    :rtype: dict
+    :return: Dict of west, east, south, north.
+    """
+    delta_latitude = radius / 111.195
+    cos_latitude = math.cos(math.radians(latitude))
+    if cos_latitude < 1e-6:
+        delta_longitude = 180
+    else:
+        delta_longitude = min(delta_latitude / cos_latitude, 180)
+
+    return {
+        'west': longitude - delta_longitude,
+        'east': longitude + delta_longitude,
+        'south': latitude - delta_latitude,
+        'north': latitude + delta_latitude,
+    }
+
+
+def filter_by_distance(rows, latitude, longitude, radius):
+    """
+    Returns rows within the great circle radius, sorted by distance.
+
+    :param list rows: Rows with latitude and longitude attributes.
+    :param float latitude: Center latitude.
+    :param float longitude: Center longitude.
+    :param float radius: Radius in km.
+    :rtype: list
+    """
+    if not rows:
+        return []
+
+    lat = np.radians([row.latitude for row in rows])
+    lon = np.radians([row.longitude for row in rows])
+    center_lat = np.radians(latitude)
+    center_lon = np.radians(longitude)
+
+    a = np.sin((lat - center_lat) / 2) ** 2 \
+        + np.cos(lat) * np.cos(center_lat) \
+        * np.sin((lon - center_lon) / 2) ** 2
+    distance = 2 * 6371.0 * np.arcsin(np.sqrt(a))
+
+    order = np.argsort(distance, kind='stable')
+    return [rows[i] for i in order if distance[i] <= radius]
+
+
+def get_numpy_dtype(columns):
+    """
+    Returns NumPy structured dtype for table columns.
+
+    DateTime columns become datetime64[us], Date columns datetime64[D],
+    strings stay Python objects.
+
+    :param list columns: List of sqlalchemy.Column.
+    :rtype: numpy.dtype
+    """
+    type_dict = {
+        datetime.datetime: 'datetime64[us]',
+        datetime.date: 'datetime64[D]',
+        int: 'int64',
+        float: 'float64',
+    }
+    return np.dtype([(column.name,
+                      type_dict.get(column.type.python_type, 'O'))
+                     for column in columns])
+
+
+def rows_to_record_array(rows, columns):
+    """
+    Returns NumPy record array from query rows.
+
+    Missing integers are filled with -1, missing floats with NaN.
+
+    :param list rows: List of row tuples.
+    :param list columns: List of sqlalchemy.Column in row order.
+    :rtype: numpy.recarray
+    """
+    dtype = get_numpy_dtype(columns)
+    array = np.empty(len(rows), dtype=dtype)
+    fill_values = {'i': -1, 'f': np.nan}
+    for i, name in enumerate(dtype.names):
+        fill = fill_values.get(dtype[name].kind)
+        values = [row[i] for row in rows]
+        if fill is not None:
+            values = [fill if value is None else value for value in values]
+        array[name] = values
+
+    return array.view(np.recarray)
+
+
+class SQLiteProfile:
+    """
+    SQLite connection settings, applied as PRAGMA on every connection.
+
+    The default uses write-ahead logging, so readers do not block the
+    writer, and waits on a locked database instead of failing at once.
+    Set an item to None to keep the SQLite default.
+    """
+    __slots__ = [
+        'journal_mode',
+        'synchronous',
+        'mmap_size',
+        'cache_size',
+        'busy_timeout',
+    ]
+
+    def __init__(self,
+                 journal_mode='wal',
+                 synchronous='normal',
+                 mmap_size=256 * 1024 ** 2,
+                 cache_size=-64 * 1024,
+                 busy_timeout=60000):
+        """
+        :param str journal_mode: 'wal', 'delete', 'truncate', ...
+        :param str synchronous: 'off', 'normal', 'full'.
+        :param int mmap_size: Memory-mapped I/O size in bytes.
+        :param int cache_size: Page cache, negative in KiB, positive in
+            pages.
+        :param int busy_timeout: Lock waiting time in milliseconds.
+        """
+        self.journal_mode = journal_mode
+        self.synchronous = synchronous
+        self.mmap_size = mmap_size
+        self.cache_size = cache_size
+        self.busy_timeout = busy_timeout
+
+    def __repr__(self):
+        items = ', '.join(f'{key}={getattr(self, key)}'
+                          for key in self.__slots__)
+        return f'SQLiteProfile({items})'
+
+    def get_pragmas(self, readonly=False):
+        """
+        Returns PRAGMA statements of the profile.
+
+        :param bool readonly: Skip settings that need write access.
+        :rtype: list
+        """
+        pragmas = []
+        for key in self.__slots__:
+            value = getattr(self, key)
+            if value is None:
+                continue
+            if readonly and key in ['journal_mode', 'synchronous']:
+                continue
+            pragmas.append(f'PRAGMA {key} = {value}')
+
+        return pragmas
+
+    def apply(self, engine, readonly=False):
+        """
+        Registers engine events for the profile.
+
+        Sets PRAGMA on connect, and drops pooled connections inherited
+        through fork, a SQLite connection must not be used across
+        processes.
+
+        :param engine: SQLAlchemy engine.
+        :param bool readonly: Skip settings that need write access.
+        """
+        pragmas = self.get_pragmas(readonly)
+
+        def on_connect(dbapi_connection, connection_record):
+            connection_record.info['pid'] = os.getpid()
+            cursor = dbapi_connection.cursor()
+            for pragma in pragmas:
+                cursor.execute(pragma)
+            cursor.close()
+
+        def on_checkout(dbapi_connection, connection_record,
+                        connection_proxy):
+            if connection_record.info.get('pid') == os.getpid():
+                return
+
+            # Forget the parent connection without closing it.
+            for item in [connection_record, connection_proxy]:
+                if hasattr(item, 'dbapi_connection'):
+                    item.dbapi_connection = None
+                else:
+                    item.connection = None
+            raise sqlalchemy.exc.DisconnectionError(
+                'Connection record belongs to another process')
+
+        sqlalchemy.event.listen(engine, 'connect', on_connect)
+        sqlalchemy.event.listen(engine, 'checkout', on_checkout)
+
+
+class _MonitoredCursor(sqlite3.Cursor):
+    """
+    SQLite cursor which reports fetched rows and time to QueryMonitor.
+    """
+    monitor = None
+    record = None
+    parameters = None
+
+    def _add_fetch(self, rows, start):
+        if self.record is not None:
+            self.monitor.add_fetch(self, rows, time.perf_counter() - start)
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        self._add_fetch(0 if row is None else 1, start)
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        start = time.perf_counter()
+        rows = super().fetchmany(*args, **kwargs)
+        self._add_fetch(len(rows), start)
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        self._add_fetch(len(rows), start)
+        return rows
+
+
+class _MonitoredConnection(sqlite3.Connection):
+    """
+    SQLite connection creating _MonitoredCursor.
+    """
+
+    def cursor(self, factory=_MonitoredCursor):
+        return super().cursor(factory)
+
+
+class QueryMonitor:
+    """
+    Opt-in statement statistics of a Client, from engine events.
+
+    Records latency and row count of every statement, grouped by the
+    seisnn functions on the call stack, e.g.
+    ``get_picks > get_matched_list > get_distinct_items``. Statements
+    slower than slow_time are kept with their query plan::
+
+        monitor = QueryMonitor(slow_time=0.05)
+        db = Client('Hualien.db', monitor=monitor)
+        db.get_picks(station='H*', tag='manual')
+        monitor.report()
+        monitor.write_report('query_report.json')
+
+    Time includes fetching the rows, SQLite runs a SELECT while the rows
+    are fetched.
+    """
+    __slots__ = [
+        'slow_time',
+        'max_slow',
+        'explain',
+        'stats',
+        'slow_queries',
+        'errors',
+    ]
+
+    def __init__(self, slow_time=0.1, max_slow=100, explain=True):
+        """
+        :param float slow_time: Slow statement threshold in seconds.
+        :param int max_slow: Slow statements and errors kept in the log.
+        :param bool explain: Captures the query plan of slow statements.
+        """
+        self.slow_time = slow_time
+        self.max_slow = max_slow
+        self.explain = explain
+        self.stats = {}
+        self.slow_queries = collections.deque(maxlen=max_slow)
+        self.errors = collections.deque(maxlen=max_slow)
+
+    @staticmethod
+    def get_connect_args():
+        """
+        Returns sqlite3.connect arguments, counts the fetched rows.
+
+        :rtype: dict
+        """
+        return {'factory': _MonitoredConnection}
+
+    @staticmethod
+    def get_caller():
+        """
+        Returns the public seisnn functions on the call stack, outermost
+        first.
+
+        :rtype: str
+        """
+        package_dir = os.path.dirname(os.path.abspath(__file__))
+        names = []
+        frame = sys._getframe(1)
+        while frame is not None:
+            code = frame.f_code
+            name = code.co_name
+            if code.co_filename.startswith(package_dir) \
+                    and (name == '__init__'
+                         or not name.startswith(('_', '<'))) \
+                    and name != 'session_scope':
+                if not names or names[-1] != name:
+                    names.append(name)
+            frame = frame.f_back
+
+        return ' > '.join(reversed(names)) or 'external'
+
+    def apply(self, engine):
+        """
+        Registers engine events for the monitor.
+
+        :param engine: SQLAlchemy engine.
+        """
+
+        def _before_execute(connection, cursor, statement, parameters,
+                            context, executemany):
+            connection.info.setdefault('query_start', []) \
+                .append(time.perf_counter())
+
+        def _after_execute(connection, cursor, statement, parameters,
+                           context, executemany):
+            elapsed = time.perf_counter() \
+                - connection.info['query_start'].pop()
+            record = {
+                'caller': self.get_caller(),
+                'statement': statement,
+                'parameters': repr(parameters)[:200],
+                'executemany': executemany,
+                'time': elapsed,
+                'rows': max(cursor.rowcount, 0),
+                'plan': None,
+            }
+            stats = self._get_stats(record['caller'])
+            stats['statements'] += 1
+            stats['time'] += elapsed
+            stats['rows'] += record['rows']
+            stats['max_time'] = max(stats['max_time'], elapsed)
+
+            if isinstance(cursor, _MonitoredCursor):
+                cursor.monitor = self
+                cursor.record = record
+                cursor.parameters = parameters
+            self._check_slow(cursor, record, parameters)
+
+        def _handle_error(context):
+            if context.connection is not None:
+                starts = context.connection.info.get('query_start')
+                if starts:
+                    starts.pop()
+            caller = self.get_caller()
+            self._get_stats(caller)['errors'] += 1
+            self.errors.append({
+                'caller': caller,
+                'statement': context.statement,
+                'error': f'{type(context.original_exception).__name__}: '
+                         f'{context.original_exception}',
+            })
+
+        sqlalchemy.event.listen(engine, 'before_cursor_execute',
+                                _before_execute)
+        sqlalchemy.event.listen(engine, 'after_cursor_execute',
+                                _after_execute)
+        sqlalchemy.event.listen(engine, 'handle_error', _handle_error)
+
+    def _get_stats(self, caller):
+        stats = self.stats.get(caller)
+        if stats is None:
+            stats = {
+                'statements': 0,
+                'time': 0.0,
+                'max_time': 0.0,
+                'rows': 0,
+                'errors': 0,
+            }
+            self.stats[caller] = stats
+        return stats
+
+    def add_fetch(self, cursor, rows, elapsed):
+        """
+        Adds fetched rows and time to the statement of a cursor.
+
+        :param _MonitoredCursor cursor: DBAPI cursor of the statement.
+        :param int rows: Fetched rows.
+        :param float elapsed: Fetch time in seconds.
+        """
+        record = cursor.record
+        record['time'] += elapsed
+        record['rows'] += rows
+        stats = self._get_stats(record['caller'])
+        stats['time'] += elapsed
+        stats['rows'] += rows
+        stats['max_time'] = max(stats['max_time'], record['time'])
+        self._check_slow(cursor, record, cursor.parameters)
+
+    def _check_slow(self, cursor, record, parameters):
+        if record['time'] < self.slow_time or record['plan'] is not None:
+            return
+
+        record['plan'] = []
+        self.slow_queries.append(record)
+        if not self.explain or record['executemany'] or \
+                not record['statement'].lstrip().upper() \
+                .startswith(('SELECT', 'WITH')):
+            return
+
+        try:
+            rows = cursor.connection.execute(
+                f"EXPLAIN QUERY PLAN {record['statement']}",
+                parameters).fetchall()
+            record['plan'] = [row[-1] for row in rows]
+        except sqlite3.Error as error:
+            record['plan'] = [f'{type(error).__name__}: {error}']
+
+    def reset(self):
+        """
+        Clears all statistics and logs.
+        """
+        self.stats = {}
+        self.slow_queries.clear()
+        self.errors.clear()
+
+    def to_dict(self):
+        """
+        Returns statistics, slow statements and errors.
+
+        :rtype: dict
+        """
+        callers = sorted(self.stats.items(),
+                         key=lambda item: item[1]['time'], reverse=True)
+        return {
+            'slow_time': self.slow_time,
+            'total': {
+                key: sum(stats[key] for stats in self.stats.values())
+                for key in ['statements', 'time', 'rows', 'errors']
+            },
+            'callers': dict(callers),
+            'slow_queries': list(self.slow_queries),
+            'errors': list(self.errors),
+        }
+
+    def write_report(self, path):
+        """
+        Writes statistics into a JSON file.
+
+        :param str path: Output JSON path.
+        """
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2, default=str)
+
+    def report(self, top=10):
+        """
+        Prints the callers with the most statement time.
+
+        :param int top: Number of callers.
+        """
+        report = self.to_dict()
+        total = report['total']
+        print(f'{total["statements"]} statements, {total["rows"]} rows, '
+              f'{total["errors"]} errors in {total["time"]:.3f} s, '
+              f'{len(report["slow_queries"])} slower than '
+              f'{self.slow_time} s')
+        for caller, stats in list(report['callers'].items())[:top]:
+            print(f'{stats["time"]:8.3f} s {stats["statements"]:8d} '
+                  f'statements {stats["rows"]:10d} rows  {caller}')
+
+
 class Client:
     """
     Client for sql database
     """
 
-    def __init__(self, database, echo=False):
+    def __init__(self, database, echo=False, unique_constraints=False,
+                 profile=None, readonly=False, monitor=None,
+                 immutable=False):
+        """
+        Connect to sql database.
+
+        :param str database: Database file name in config.sql_database.
+        :param bool echo: Log all statements.
+        :param bool unique_constraints: Add unique constraints,
+            see add_unique_constraints.
+        :param SQLiteProfile profile: Connection settings, default is
+            SQLiteProfile().
+        :param bool readonly: Open the database read-only, for worker
+            processes, the schema is not created or changed.
+        :param QueryMonitor monitor: (Optional.) Records statement
+            statistics, True for a new QueryMonitor().
+        :param bool immutable: Open a snapshot read-only without file
+            locks, see create_snapshot. The file must not change while
+            open.
+        """
         config = seisnn.utils.Config()
         self.database = database
-        db_path = os.path.join(config.sql_database, self.database)
+        self.readonly = readonly or immutable
+        self.immutable = immutable
+        self.profile = profile if profile is not None else SQLiteProfile()
+        if monitor is True:
+            monitor = QueryMonitor()
+        self.monitor = monitor
+
+        readonly = self.readonly
+        self.db_path = os.path.join(config.sql_database, self.database)
+        if immutable:
+            url = f'sqlite:///file:{self.db_path}?mode=ro&immutable=1' \
+                  f'&uri=true'
+        elif readonly:
+            url = f'sqlite:///file:{self.db_path}?mode=ro&uri=true'
+        else:
+            url = f'sqlite:///{self.db_path}'
+        connect_args = {}
+        if monitor is not None:
+            connect_args = monitor.get_connect_args()
         self.engine = sqlalchemy.create_engine(
-            f'sqlite:///{db_path}?check_same_thread=False',
-            echo=echo)
-        Base.metadata.create_all(bind=self.engine)
-        self.session = sqlalchemy.orm.sessionmaker(bind=self.engine)
+            f'{url}{"&" if readonly else "?"}check_same_thread=False',
+            echo=echo, connect_args=connect_args)
+        self.profile.apply(self.engine, readonly=readonly)
+        if monitor is not None:
+            monitor.apply(self.engine)
+
+        if not readonly:
+            Base.metadata.create_all(bind=self.engine)
+            self.ensure_columns()
+        self.session = sqlalchemy.orm.sessionmaker(bind=self.engine,
+                                                   expire_on_commit=False)
+        self._distinct_cache = {}
+        self._cache_version = None
+        self._version_connection = None
+        self._pick_codes = None
+        self.compact_picks = self.has_compact_picks()
+        self.rtree_index = self.ensure_rtree_index()
+
+        if unique_constraints and not readonly:
+            self.add_unique_constraints()
 
     def __repr__(self):
         return f'SQL Database({self.database})'
 
+    def close(self):
+        """
+        Closes all connections of the client.
+        """
+        if self._version_connection is not None:
+            self._version_connection.close()
+            self._version_connection = None
+        self.engine.dispose()
+
     @staticmethod
     def get_table_class(table):
         """
@@ -259,6 +1315,7 @@ class Client:
             'pick': Pick,
             'waveform': Waveform,
             'tfrecord': TFRecord,
+            'sfile': SFile,
         }
         try:
             table_class = table_dict.get(table)
@@ -316,6 +1373,7 @@ class Client:
                 counter += 1
 
             print(f'Input {counter} stations')
+        self.invalidate_cache('inventory')
 
     def get_inventories(self, station=None, network=None):
         """
@@ -326,188 +1384,1024 @@ class Client:
         :rtype: sqlalchemy.orm.query.Query
         :return: A Query.
         """
+        with self.session_scope() as session:
+            query = self._filter_inventories(session.query(Inventory),
+                                             station, network)
+            result = query.all()
+
+        return result
+
+    def _filter_inventories(self, query, station=None, network=None):
+        if station is not None:
+            station = self.get_matched_list(
+                station, 'inventory', 'station')
+            query = query.filter(Inventory.station.in_(station))
+        if network is not None:
+            network = self.get_matched_list(
+                network, 'inventory', 'network')
+            query = query.filter(Inventory.network.in_(network))
+
+        return query
+
+    def get_inventories_in_box(self, west=None, east=None,
+                               south=None, north=None):
+        """
+        Returns stations inside a bounding box.
+
+        :param float west: From West.
+        :param float east: To East.
+        :param float south: From South.
+        :param float north: To North.
+        :rtype: list
+        :return: List of Inventory.
+        """
         with self.session_scope() as session:
             query = session.query(Inventory)
-            if station is not None:
-                station = self.get_matched_list(
-                    station, 'inventory', 'station')
-                query = query.filter(Inventory.station.in_(station))
-            if network is not None:
-                network = self.get_matched_list(
-                    network, 'inventory', 'network')
-                query = query.filter(Inventory.network.in_(network))
+            if self.rtree_index:
+                ids = self._query_rtree(session, INVENTORY_RTREE, {
+                    'latitude': (south, north),
+                    'longitude': (west, east),
+                })
+                query = query.filter(
+                    sqlalchemy.literal_column('inventory.rowid').in_(ids))
+
+            if west is not None:
+                query = query.filter(Inventory.longitude >= west)
+            if east is not None:
+                query = query.filter(Inventory.longitude <= east)
+            if south is not None:
+                query = query.filter(Inventory.latitude >= south)
+            if north is not None:
+                query = query.filter(Inventory.latitude <= north)
+            result = query.all()
+
+        return result
 
-        return query.all()
+    def get_inventories_near(self, latitude, longitude, radius):
+        """
+        Returns stations within a radius, sorted by distance.
+
+        :param float latitude: Center latitude.
+        :param float longitude: Center longitude.
+        :param float radius: Radius in km.
+        :rtype: list
+        :return: List of Inventory.
+        """
+        box = get_bounding_box(latitude, longitude, radius)
+        inventories = self.get_inventories_in_box(**box)
+        return filter_by_distance(inventories, latitude, longitude, radius)
 
-    def add_events(self, catalog, tag, remove_duplicates=True):
+    def add_events(self, catalog, tag, remove_duplicates=True,
+                   bulk=False, commit_size=10000, incremental=False):
         """
         Add event data form catalog.
 
         :param str catalog: Catalog name.
         :param str tag: Pick tag.
-        :param bool remove_duplicates: Removes duplicates in event table.
+        :param bool remove_duplicates: Removes duplicates in event table,
+            skipped when both event and pick tables have unique constraints.
+        :param bool bulk: If True, inserts rows with batched executemany
+            instead of ORM objects, default is False.
+        :param int commit_size: Rows per transaction in bulk mode.
+        :param bool incremental: If True, only parses S-files which are
+            new or changed since the last run, see sync_events. Only
+            duplicates of the synced rows are removed.
+        :rtype: dict
+        :return: Row counts and elapsed time in seconds.
         """
+        if incremental:
+            return self.sync_events(catalog, tag, commit_size=commit_size,
+                                    remove_duplicates=remove_duplicates)
 
+        start = time.perf_counter()
         events = seisnn.io.read_event_list(catalog)
-        with self.session_scope() as session:
-            event_count = 0
-            pick_count = 0
-            for event in events:
-                Event(event).add_db(session)
-                event_count += 1
-                for pick in event.picks:
-                    time = pick.time.datetime
-                    station = pick.waveform_id.station_code
-                    phase = pick.phase_hint
-
-                    Pick(time, station, phase, tag).add_db(session)
-                    pick_count += 1
-
-            print(f'Input {event_count} events, {pick_count} picks')
-
-        if remove_duplicates:
+        read_time = time.perf_counter() - start
+
+        report = self.insert_events(events, tag,
+                                    bulk=bulk,
+                                    commit_size=commit_size)
+        report['read_time'] = read_time
+
+        start = time.perf_counter()
+        if remove_duplicates and not self.insert_ignore_duplicates():
             self.remove_duplicates(
                 'event',
                 ['time', 'latitude', 'longitude', 'depth'])
             self.remove_duplicates(
                 'pick',
                 ['time', 'phase', 'station', 'tag'])
+        report['dedup_time'] = time.perf_counter() - start
 
-    def get_events(self,
-                   from_time=None, to_time=None,
-                   west=None, east=None,
-                   south=None, north=None,
-                   from_depth=None, to_depth=None):
+        return report
+
+    def insert_events(self, events, tag, bulk=False, commit_size=10000):
         """
-        Returns query from event table.
+        Insert obspy events and their picks.
 
-        :param str from_time: From time.
-        :param str to_time: To time.
-        :param west: From West.
-        :param east: To East.
-        :param south: From South.
-        :param north: To North.
-        :param from_depth: From depth.
-        :param to_depth: To depth.
-        :rtype: sqlalchemy.orm.query.Query
-        :return: A Query.
+        .. note::
+            With unique constraints or compact picks, rows are always
+            inserted in bulk mode and existing rows are ignored, counts are
+            the new rows only.
+
+        :param list events: List of obspy.core.event.Event.
+        :param str tag: Pick tag.
+        :param bool bulk: If True, inserts rows with batched executemany
+            instead of ORM objects, default is False.
+        :param int commit_size: Rows per transaction in bulk mode.
+        :rtype: dict
+        :return: Row counts and elapsed time in seconds.
         """
-        with self.session_scope() as session:
-            query = session.query(Event)
-            if from_time is not None:
-                query = query.filter(Event.time >= from_time)
-            if to_time is not None:
-                query = query.filter(Event.time <= to_time)
+        start = time.perf_counter()
+        if bulk or self.insert_ignore_duplicates() or self.compact_picks:
+            event_count = self.bulk_insert(
+                'event', get_event_rows(events), commit_size,
+                ignore_duplicates=True)
+            pick_count = self.bulk_insert(
+                'pick', get_pick_rows(events, tag), commit_size,
+                ignore_duplicates=True)
+
+        else:
+            with self.session_scope() as session:
+                event_count = 0
+                pick_count = 0
+                for event in events:
+                    Event(event).add_db(session)
+                    event_count += 1
+                    for pick in event.picks:
+                        pick_time = pick.time.datetime
+                        station = pick.waveform_id.station_code
+                        phase = pick.phase_hint
+
+                        Pick(pick_time, station, phase, tag).add_db(session)
+                        pick_count += 1
+            self.invalidate_cache('event')
+            self.invalidate_cache('pick')
+
+        insert_time = time.perf_counter() - start
+        print(f'Input {event_count} events, {pick_count} picks '
+              f'in {insert_time:.2f} s')
+
+        return {
+            'events': event_count,
+            'picks': pick_count,
+            'insert_time': insert_time,
+        }
 
-            if west is not None:
-                query = query.filter(Event.longitude >= west)
-            if east is not None:
-                query = query.filter(Event.latitude <= east)
+    def sync_events(self, catalog, tag, commit_size=10000,
+                    remove_duplicates=True):
+        """
+        Synchronizes events and picks with an S-file directory.
 
-            if south is not None:
-                query = query.filter(Event.latitude >= south)
-            if north is not None:
-                query = query.filter(Event.latitude <= north)
+        Every ingested S-file is recorded in the sfile ledger with size,
+        mtime and MD5. Files with the same size and mtime are skipped
+        without reading, files with a new MD5 are parsed and their old
+        events and picks are replaced in one transaction per file, rows of
+        deleted files are removed.
 
-            if from_depth is not None:
-                query = query.filter(Event.depth >= from_depth)
-            if to_depth is not None:
-                query = query.filter(Event.depth <= to_depth)
+        .. note::
+            Rows inserted before the ledger existed have no source file,
+            they are kept unless they duplicate rows of a synced file.
 
-        return query.all()
+        :param str catalog: Catalog name.
+        :param str tag: Pick tag.
+        :param int commit_size: Rows per transaction.
+        :param bool remove_duplicates: Removes rows without source file
+            which duplicate rows of a synced file, skipped when both
+            event and pick tables have unique constraints.
+        :rtype: dict
+        :return: File counts, row counts and elapsed time in seconds.
+        """
+        config = seisnn.utils.Config()
+        start = time.perf_counter()
 
-    def add_pick(self, time, station, phase, tag):
         with self.session_scope() as session:
-            Pick(time, station, phase, tag).add_db(session)
+            ledger = {row.path: row for row in session.query(SFile).all()}
+
+        changed = []
+        unchanged = 0
+        touched = []
+        current = set()
+        for file in seisnn.io.get_sfile_list(catalog):
+            path = os.path.relpath(file, config.catalog)
+            current.add(path)
+            stat = os.stat(file)
+            row = ledger.get(path)
+            if row is not None and row.size == stat.st_size \
+                    and row.mtime == stat.st_mtime:
+                unchanged += 1
+                continue
+
+            md5 = seisnn.utils.get_file_hash(file)
+            if row is not None and row.md5 == md5:
+                touched.append({'sfile_id': row.id,
+                                'size': stat.st_size,
+                                'mtime': stat.st_mtime})
+                unchanged += 1
+                continue
+
+            changed.append((file, path, stat, md5))
+
+        prefix = os.path.normpath(catalog) + os.sep
+        removed = [row for path, row in ledger.items()
+                   if path.startswith(prefix) and path not in current]
+        files = [file for file, _, _, _ in changed]
+        sfile_events = dict(seisnn.io.read_sfile_list(files))
+        read_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        sfile_table = SFile.__table__
+        with self.engine.begin() as connection:
+            if touched:
+                connection.execute(
+                    sfile_table.update()
+                    .where(sfile_table.c.id == sqlalchemy.bindparam(
+                        'sfile_id'))
+                    .values(size=sqlalchemy.bindparam('size'),
+                            mtime=sqlalchemy.bindparam('mtime')),
+                    touched)
+
+            self._delete_sfile_rows(connection,
+                                    [row.id for row in removed])
+            if removed:
+                connection.execute(sfile_table.delete().where(
+                    sfile_table.c.id.in_([row.id for row in removed])))
+
+        event_count = 0
+        pick_count = 0
+        duplicate_count = 0
+        dedup = remove_duplicates and not self.insert_ignore_duplicates()
+        for file, path, stat, md5 in changed:
+            events = sfile_events.get(file) or []
+            with self.engine.begin() as connection:
+                values = {'size': stat.st_size,
+                          'mtime': stat.st_mtime,
+                          'md5': md5,
+                          'tag': tag}
+                if path in ledger:
+                    # Old rows are replaced in the same transaction, readers
+                    # never see the file without picks.
+                    sfile_id = ledger[path].id
+                    self._delete_sfile_rows(connection, [sfile_id])
+                    connection.execute(
+                        sfile_table.update()
+                        .where(sfile_table.c.id == sfile_id)
+                        .values(**values))
+                else:
+                    result = connection.execute(
+                        sfile_table.insert().values(path=path, **values))
+                    sfile_id = result.inserted_primary_key[0]
+
+                events_inserted = self._insert_rows(
+                    connection, 'event', get_event_rows(events, sfile_id),
+                    commit_size)
+                picks_inserted = self._insert_rows(
+                    connection, 'pick', get_pick_rows(events, tag, sfile_id),
+                    commit_size)
+                if dedup:
+                    duplicate_count += self._remove_legacy_duplicates(
+                        connection, sfile_id)
+                connection.execute(
+                    sfile_table.update()
+                    .where(sfile_table.c.id == sfile_id)
+                    .values(events=events_inserted, picks=picks_inserted))
+
+            event_count += events_inserted
+            pick_count += picks_inserted
+
+        for table in ['event', 'pick', 'sfile']:
+            self.invalidate_cache(table)
+        insert_time = time.perf_counter() - start
+
+        new = len([path for _, path, _, _ in changed if path not in ledger])
+        print(f'Sync {catalog}: {new} new, {len(changed) - new} changed, '
+              f'{len(removed)} removed, {unchanged} unchanged files')
+        print(f'Input {event_count} events, {pick_count} picks '
+              f'in {insert_time:.2f} s')
+        if dedup:
+            print(f'Remove {duplicate_count} duplicate rows without source '
+                  f'file')
+
+        return {
+            'new': new,
+            'changed': len(changed) - new,
+            'removed': len(removed),
+            'unchanged': unchanged,
+            'events': event_count,
+            'picks': pick_count,
+            'duplicates': duplicate_count,
+            'read_time': read_time,
+            'insert_time': insert_time,
+        }
 
-    def get_picks(self,
-                  from_time=None, to_time=None,
-                  station=None, phase=None,
-                  tag=None):
+    def _remove_legacy_duplicates(self, connection, sfile_id,
+                                  tables=('event', 'pick')):
         """
-        Returns query from pick table.
+        Deletes rows without source file which duplicate rows of an S-file.
 
-        :param str from_time: From time.
-        :param str to_time: To time.
-        :param str station: Station name.
-        :param str phase: Phase name.
-        :param str tag: Catalog tag.
-        :rtype: sqlalchemy.orm.query.Query
-        :return: A Query.
-        """
-        with self.session_scope() as session:
-            query = session.query(Pick)
-            if from_time is not None:
-                query = query.filter(Pick.time >= from_time)
-            if to_time is not None:
-                query = query.filter(Pick.time <= to_time)
-            if station is not None:
-                station = self.get_matched_list(station, 'pick', 'station')
-                query = query.filter(Pick.station.in_(station))
-            if phase is not None:
-                phase = self.get_matched_list(phase, 'pick', 'phase')
-                query = query.filter(Pick.phase.in_(phase))
-            if tag is not None:
-                tag = self.get_matched_list(tag, 'pick', 'tag')
-                query = query.filter(Pick.tag.in_(tag))
+        The ledger rows are kept, so a later change of the file still
+        replaces all of its rows.
 
-        return query.all()
+        :param connection: SQLAlchemy connection in a transaction.
+        :param int sfile_id: Ledger id.
+        :param tables: Table names, compact picks are unique and skipped.
+        :rtype: int
+        :return: Number of deleted rows.
+        """
+        count = 0
+        for table in tables:
+            if table == 'pick' and self.compact_picks:
+                continue
+
+            _, columns = UNIQUE_CONSTRAINTS[table]
+            match = ' AND '.join(f'old.{column} IS new.{column}'
+                                 for column in columns)
+            result = connection.execute(sqlalchemy.text(
+                f'DELETE FROM {table} WHERE id IN ('
+                f'SELECT old.id FROM {table} AS new '
+                f'JOIN {table} AS old ON {match} '
+                f'WHERE new.sfile_id = :sfile_id '
+                f'AND old.sfile_id IS NULL)'),
+                {'sfile_id': sfile_id})
+            count += result.rowcount
+        return count
+
+    def _delete_sfile_rows(self, connection, sfile_ids, chunk_size=500):
+        """
+        Deletes events and picks ingested from the given S-files.
 
-    def read_tfrecord_header(self, tfr_list):
+        :param connection: SQLAlchemy connection in a transaction.
+        :param list sfile_ids: Ledger ids.
+        :param int chunk_size: Ids per statement.
         """
-        Sync header into SQL database from tfrecord dataset.
+        pick_table = PICK_COMPACT if self.compact_picks else Pick.__table__
+        for chunk in seisnn.utils.chunks(sfile_ids, chunk_size):
+            for table in [pick_table, Event.__table__]:
+                connection.execute(
+                    table.delete().where(table.c.sfile_id.in_(chunk)))
 
-        :param tfr_list: TFRecord list.
+    def _insert_rows(self, connection, table, rows, commit_size=10000):
         """
-        try:
-            for tfrecord in tqdm(tfr_list):
-                dataset = seisnn.io.read_dataset(tfrecord)
-                with self.session_scope() as session:
-                    for index, example in enumerate(dataset):
-                        instance = seisnn.core.Instance(example)
-                        Waveform(instance, tfrecord, index).add_db(session)
-                    TFRecord(tfrecord, index + 1).add_db(session)
+        Inserts rows in the given transaction, existing rows are ignored
+        if the table has a unique constraint.
 
-        except Exception as error:
-            print(f'{type(error).__name__}: {error}')
+        :param connection: SQLAlchemy connection in a transaction.
+        :param str table: Target table name.
+        :param rows: Iterable of column dict.
+        :param int commit_size: Rows per executemany.
+        :rtype: int
+        :return: Number of inserted rows.
+        """
+        ignore = self.has_unique_constraint(table)
+        compact = table == 'pick' and self.compact_picks
+        if compact:
+            statement = PICK_COMPACT.insert()
+        else:
+            statement = self.get_table_class(table).__table__.insert()
+        if ignore:
+            statement = statement.prefix_with('OR IGNORE')
+
+        count = 0
+        for chunk in seisnn.utils.chunks(rows, commit_size):
+            if compact:
+                chunk = self.encode_picks(connection, chunk)
+            result = connection.execute(statement, chunk)
+            count += result.rowcount if ignore else len(chunk)
+
+        return count
+
+    def has_compact_picks(self):
+        """
+        Returns True if picks are stored in the compact schema.
 
-        print(f'Input {index + 1} waveforms.')
+        :rtype: bool
+        """
+        with self.engine.connect() as connection:
+            result = connection.execute(sqlalchemy.text(
+                "SELECT name FROM sqlite_master "
+                "WHERE type = 'view' AND name = 'pick'")).first()
+        return result is not None
 
-    def get_tfrecord(self, network=None, station=None, path=None,
-                     from_date=None, to_date=None, column=None):
+    def get_pick_codes(self, connection=None):
         """
-        Returns query from tfrecord table.
+        Returns pick code dictionary of the compact schema.
 
-        :param str station: Station name.
-        :rtype: sqlalchemy.orm.query.Query
-        :return: A Query.
+        :param connection: SQLAlchemy connection, opens one if None.
+        :rtype: dict
+        :return: Dict of {(field, value): code}.
         """
-        with self.session_scope() as session:
-            if column is not None:
-                query = session.query(getattr(TFRecord, column))
+        if self._pick_codes is None:
+            statement = sqlalchemy.text(
+                'SELECT field, value, id FROM pick_code')
+            if connection is None:
+                with self.engine.connect() as connection:
+                    rows = connection.execute(statement).fetchall()
             else:
-                query = session.query(TFRecord)
+                rows = connection.execute(statement).fetchall()
+            self._pick_codes = {(field, value): code
+                                for field, value, code in rows}
 
-            if network is not None:
-                network = self.get_matched_list(network, 'tfrecord', 'network')
-                query = query.filter(TFRecord.network.in_(network))
-            if station is not None:
-                station = self.get_matched_list(station, 'tfrecord', 'station')
-                query = query.filter(TFRecord.station.in_(station))
-            if path is not None:
-                path = self.get_matched_list(path, 'tfrecord', 'path')
-                query = query.filter(TFRecord.path.in_(path))
-
-            if from_date is not None:
-                from_date = UTCDateTime(from_date).datetime
-                query = query.filter(TFRecord.date >= from_date)
-            if to_date is not None:
-                to_date = UTCDateTime(to_date).datetime
-                query = query.filter(TFRecord.date <= to_date)
+        return self._pick_codes
 
-        return query.all()
+    def encode_picks(self, connection, rows):
+        """
+        Returns compact pick rows, new station, phase and tag values are
+        added to pick_code.
 
-    def get_waveform(self, from_time=None, to_time=None,
+        :param connection: SQLAlchemy connection in a transaction.
+        :param list rows: List of pick dict.
+        :rtype: list
+        """
+        codes = self.get_pick_codes(connection)
+        new_codes = {(field, row[field])
+                     for row in rows for field in PICK_CODE_FIELDS
+                     if (field, row[field]) not in codes}
+        if new_codes:
+            connection.execute(
+                PICK_CODE.insert().prefix_with('OR IGNORE'),
+                [{'field': field, 'value': value}
+                 for field, value in sorted(new_codes)])
+            self._pick_codes = None
+            codes = self.get_pick_codes(connection)
+
+        return [{
+            'id': row.get('id'),
+            'time': to_epoch_us(row['time']),
+            'station_code': codes[('station', row['station'])],
+            'phase_code': codes[('phase', row['phase'])],
+            'tag_code': codes[('tag', row['tag'])],
+            'snr': row.get('snr'),
+            'sfile_id': row.get('sfile_id'),
+        } for row in rows]
+
+    def migrate_pick_schema(self, compact=True, vacuum=True):
+        """
+        Converts the pick table between the plain and the compact schema.
+
+        The compact schema stores time as int64 epoch microseconds and
+        station, phase and tag as codes into pick_code, under a unique
+        index. A pick view keeps the plain columns, so get_picks,
+        iter_picks and the label generation work on both.
+
+        .. note::
+            Duplicated picks are dropped when converting to compact.
+
+        :param bool compact: Converts to compact if True, back to the
+            plain table if False.
+        :param bool vacuum: Reclaims free pages after the conversion.
+        :rtype: dict
+        :return: Pick count and database file size before and after.
+        """
+        if compact == self.compact_picks:
+            print(f'Picks are already in {"compact" if compact else "plain"}'
+                  f' schema')
+            return None
+
+        size = os.path.getsize(self.db_path)
+        with self.engine.begin() as connection:
+            if compact:
+                count = self._compact_picks(connection)
+            else:
+                count = self._expand_picks(connection)
+
+        self.compact_picks = compact
+        self._pick_codes = None
+        self.invalidate_cache('pick')
+        self.analyze()
+        if vacuum:
+            with self.engine.connect() as connection:
+                connection.execution_options(
+                    isolation_level='AUTOCOMMIT').execute(
+                    sqlalchemy.text('VACUUM'))
+                connection.execute(
+                    sqlalchemy.text('PRAGMA wal_checkpoint(TRUNCATE)'))
+
+        report = {
+            'picks': count,
+            'size_before': size,
+            'size_after': os.path.getsize(self.db_path),
+        }
+        print(f'Migrate {count} picks to '
+              f'{"compact" if compact else "plain"} schema, database size '
+              f'{report["size_before"] / 1024 ** 2:.1f} MB -> '
+              f'{report["size_after"] / 1024 ** 2:.1f} MB')
+        return report
+
+    @staticmethod
+    def _compact_picks(connection):
+        for statement in COMPACT_PICK_DDL:
+            connection.execute(sqlalchemy.text(statement))
+
+        for field in PICK_CODE_FIELDS:
+            connection.execute(sqlalchemy.text(
+                f"INSERT OR IGNORE INTO pick_code (field, value) "
+                f"SELECT DISTINCT '{field}', {field} FROM pick "
+                f"ORDER BY {field}"))
+
+        code_join = ' '.join(
+            f"JOIN pick_code AS {field}_code "
+            f"ON {field}_code.field = '{field}' "
+            f"AND {field}_code.value = p.{field}"
+            for field in PICK_CODE_FIELDS)
+        result = connection.execute(sqlalchemy.text(
+            f"INSERT OR IGNORE INTO pick_compact "
+            f"(id, time, station_code, phase_code, tag_code, snr, sfile_id) "
+            f"SELECT p.id, {EPOCH_US_SQL.format('p.time')}, "
+            f"station_code.id, phase_code.id, tag_code.id, "
+            f"p.snr, p.sfile_id "
+            f"FROM pick AS p {code_join} ORDER BY p.id"))
+
+        connection.execute(sqlalchemy.text('DROP TABLE pick'))
+        for statement in COMPACT_PICK_VIEW_DDL:
+            connection.execute(sqlalchemy.text(statement))
+
+        return result.rowcount
+
+    @staticmethod
+    def _expand_picks(connection):
+        connection.execute(sqlalchemy.text(
+            'CREATE TEMPORARY TABLE pick_plain AS '
+            'SELECT id, time, station, phase, tag, snr, sfile_id FROM pick'))
+        connection.execute(sqlalchemy.text('DROP VIEW pick'))
+        Pick.__table__.create(bind=connection)
+        result = connection.execute(sqlalchemy.text(
+            'INSERT INTO pick (id, time, station, phase, tag, snr, sfile_id) '
+            'SELECT id, time, station, phase, tag, snr, sfile_id '
+            'FROM pick_plain ORDER BY id'))
+
+        for table in ['temp.pick_plain', 'pick_compact', 'pick_code']:
+            connection.execute(sqlalchemy.text(f'DROP TABLE {table}'))
+
+        return result.rowcount
+
+    def bulk_insert(self, table, rows, commit_size=10000,
+                    ignore_duplicates=False):
+        """
+        Insert rows with executemany, one transaction per chunk.
+
+        :param str table: Target table name.
+        :param rows: Iterable of column dict.
+        :param int commit_size: Rows per transaction.
+        :param bool ignore_duplicates: If True and the table has a unique
+            constraint, rows already in the table are skipped.
+        :rtype: int
+        :return: Number of inserted rows.
+        """
+        ignore = ignore_duplicates and self.has_unique_constraint(table)
+        compact = table == 'pick' and self.compact_picks
+        table_class = self.get_table_class(table)
+        statement = table_class.__table__.insert()
+        if ignore:
+            statement = statement.prefix_with('OR IGNORE')
+
+        count = 0
+        for chunk in seisnn.utils.chunks(rows, commit_size):
+            with self.engine.begin() as connection:
+                if compact:
+                    count += self._insert_rows(connection, table, chunk,
+                                               commit_size)
+                    continue
+
+                result = connection.execute(statement, chunk)
+            count += result.rowcount if ignore else len(chunk)
+        self.invalidate_cache(table)
+
+        return count
+
+    def add_unique_constraints(self, tables=('event', 'pick')):
+        """
+        Removes existing duplicates and adds unique constraints, so later
+        inserts skip duplicate rows instead of a post-hoc cleanup.
+
+        Match columns are listed in UNIQUE_CONSTRAINTS.
+
+        :param tables: Table names.
+        """
+        for table in tables:
+            name, columns = UNIQUE_CONSTRAINTS[table]
+            if self.has_unique_constraint(table):
+                continue
+
+            self.remove_duplicates(table, columns)
+            with self.engine.begin() as connection:
+                connection.execute(sqlalchemy.text(
+                    f'CREATE UNIQUE INDEX IF NOT EXISTS {name} '
+                    f'ON {table} ({", ".join(columns)})'))
+            print(f'Add unique constraint {name}')
+
+    def has_unique_constraint(self, table):
+        """
+        Returns True if the table has its unique constraint.
+
+        :param str table: Table name.
+        :rtype: bool
+        """
+        if table not in UNIQUE_CONSTRAINTS:
+            return False
+        if table == 'pick' and self.compact_picks:
+            return True
+
+        name, _ = UNIQUE_CONSTRAINTS[table]
+        with self.engine.connect() as connection:
+            result = connection.execute(
+                sqlalchemy.text("SELECT name FROM sqlite_master "
+                                "WHERE type = 'index' AND name = :name"),
+                {'name': name}).first()
+        return result is not None
+
+    def insert_ignore_duplicates(self):
+        """
+        Returns True if event and pick inserts skip duplicates.
+
+        :rtype: bool
+        """
+        return all(self.has_unique_constraint(table)
+                   for table in ['event', 'pick'])
+
+    def get_events(self,
+                   from_time=None, to_time=None,
+                   west=None, east=None,
+                   south=None, north=None,
+                   from_depth=None, to_depth=None):
+        """
+        Returns query from event table.
+
+        :param str from_time: From time.
+        :param str to_time: To time.
+        :param west: From West.
+        :param east: To East.
+        :param south: From South.
+        :param north: To North.
+        :param from_depth: From depth.
+        :param to_depth: To depth.
+        :rtype: sqlalchemy.orm.query.Query
+        :return: A Query.
+        """
+        with self.session_scope() as session:
+            query = self._filter_events(session.query(Event),
+                                        from_time, to_time,
+                                        west, east, south, north,
+                                        from_depth, to_depth)
+            result = query.all()
+
+        return result
+
+    def _filter_events(self, query,
+                       from_time=None, to_time=None,
+                       west=None, east=None,
+                       south=None, north=None,
+                       from_depth=None, to_depth=None):
+        box = [west, east, south, north, from_depth, to_depth]
+        if self.rtree_index and any(item is not None for item in box):
+            ids = self._query_rtree(query.session, EVENT_RTREE, {
+                'latitude': (south, north),
+                'longitude': (west, east),
+                'depth': (from_depth, to_depth),
+                'time': (from_time, to_time),
+            })
+            query = query.filter(Event.id.in_(ids))
+
+        if from_time is not None:
+            query = query.filter(Event.time >= from_time)
+        if to_time is not None:
+            query = query.filter(Event.time <= to_time)
+
+        if west is not None:
+            query = query.filter(Event.longitude >= west)
+        if east is not None:
+            query = query.filter(Event.longitude <= east)
+
+        if south is not None:
+            query = query.filter(Event.latitude >= south)
+        if north is not None:
+            query = query.filter(Event.latitude <= north)
+
+        if from_depth is not None:
+            query = query.filter(Event.depth >= from_depth)
+        if to_depth is not None:
+            query = query.filter(Event.depth <= to_depth)
+
+        return query
+
+    def get_events_near_station(self, station, radius,
+                                from_time=None, to_time=None,
+                                from_depth=None, to_depth=None):
+        """
+        Returns events within a radius of a station, sorted by distance.
+
+        :param str station: Station name in inventory table.
+        :param float radius: Epicentral distance in km.
+        :param str from_time: From time.
+        :param str to_time: To time.
+        :param from_depth: From depth.
+        :param to_depth: To depth.
+        :rtype: list
+        :return: List of Event.
+        """
+        inventory = self.get_inventories(station=station)
+        if not inventory:
+            raise KeyError(f'Station {station} not in inventory table')
+
+        latitude = inventory[0].latitude
+        longitude = inventory[0].longitude
+        box = get_bounding_box(latitude, longitude, radius)
+        events = self.get_events(from_time=from_time, to_time=to_time,
+                                 from_depth=from_depth, to_depth=to_depth,
+                                 **box)
+        return filter_by_distance(events, latitude, longitude, radius)
+
+    def ensure_rtree_index(self):
+        """
+        Creates R*Tree index tables, kept in sync by triggers.
+
+        Event and inventory are indexed by location, waveform and tfrecord
+        by time coverage with station as auxiliary column.
+
+        :rtype: bool
+        :return: False if SQLite is built without R*Tree module.
+        """
+        if not has_rtree_module():
+            return False
+
+        try:
+            with self.engine.begin() as connection:
+                for table, statements in RTREE_INDEX_DDL.items():
+                    exists = connection.execute(
+                        sqlalchemy.text("SELECT name FROM sqlite_master "
+                                        "WHERE name = :name"),
+                        {'name': table}).first()
+                    if exists:
+                        continue
+                    if self.readonly:
+                        return False
+
+                    for statement in statements:
+                        connection.execute(sqlalchemy.text(statement))
+
+        except sqlalchemy.exc.OperationalError as error:
+            print(f'R*Tree index disabled, {error.orig}')
+            return False
+
+        return True
+
+    @staticmethod
+    def _query_rtree(session, rtree, ranges):
+        """
+        Returns query of ids inside the R*Tree ranges.
+
+        :param session: SQL session.
+        :param rtree: R*Tree table clause.
+        :param dict ranges: {dimension: (min, max)}, None for open end.
+        :rtype: sqlalchemy.orm.query.Query
+        """
+        query = session.query(rtree.c.id)
+        for dimension, (lower, upper) in ranges.items():
+            if dimension == 'time':
+                lower = None if lower is None else UTCDateTime(lower).timestamp
+                upper = None if upper is None else UTCDateTime(upper).timestamp
+
+            if lower is not None:
+                query = query.filter(rtree.c[f'max_{dimension}'] >= lower)
+            if upper is not None:
+                query = query.filter(rtree.c[f'min_{dimension}'] <= upper)
+
+        return query
+
+    def add_pick(self, time, station, phase, tag):
+        """
+        Add a pick, skipped if duplicated under unique constraint.
+
+        :param datetime.datetime time: Pick time.
+        :param str station: Station name.
+        :param str phase: Phase name.
+        :param str tag: Pick tag.
+        """
+        self.add_picks([{
+            'time': time,
+            'station': station,
+            'phase': phase,
+            'tag': tag,
+        }])
+
+    def add_picks(self, rows, commit_size=10000):
+        """
+        Add picks in bulk, skips duplicates under unique constraint.
+
+        :param rows: Iterable of pick dict with time, station, phase, tag.
+        :param int commit_size: Rows per transaction.
+        :rtype: int
+        :return: Number of inserted picks.
+        """
+        return self.bulk_insert('pick', rows, commit_size,
+                                ignore_duplicates=True)
+
+    def get_picks(self,
+                  from_time=None, to_time=None,
+                  station=None, phase=None,
+                  tag=None):
+        """
+        Returns query from pick table.
+
+        :param str from_time: From time.
+        :param str to_time: To time.
+        :param str station: Station name.
+        :param str phase: Phase name.
+        :param str tag: Catalog tag.
+        :rtype: sqlalchemy.orm.query.Query
+        :return: A Query.
+        """
+        with self.session_scope() as session:
+            query = self._filter_picks(session.query(Pick),
+                                       from_time, to_time,
+                                       station, phase, tag)
+            result = query.all()
+
+        return result
+
+    def _filter_picks(self, query,
+                      from_time=None, to_time=None,
+                      station=None, phase=None,
+                      tag=None):
+        if self.compact_picks:
+            return self._filter_compact_picks(query, from_time, to_time,
+                                              station, phase, tag)
+
+        if from_time is not None:
+            query = query.filter(Pick.time >= from_time)
+        if to_time is not None:
+            query = query.filter(Pick.time <= to_time)
+        if station is not None:
+            station = self.get_matched_list(station, 'pick', 'station')
+            query = query.filter(Pick.station.in_(station))
+        if phase is not None:
+            phase = self.get_matched_list(phase, 'pick', 'phase')
+            query = query.filter(Pick.phase.in_(phase))
+        if tag is not None:
+            tag = self.get_matched_list(tag, 'pick', 'tag')
+            query = query.filter(Pick.tag.in_(tag))
+
+        return query
+
+    def _filter_compact_picks(self, query,
+                              from_time=None, to_time=None,
+                              station=None, phase=None,
+                              tag=None):
+        # Filters on the raw view columns, so the unique index of
+        # pick_compact serves code equality and the time range.
+        if from_time is not None:
+            query = query.filter(sqlalchemy.literal_column(
+                'pick.time_us') >= to_epoch_us(from_time))
+        if to_time is not None:
+            query = query.filter(sqlalchemy.literal_column(
+                'pick.time_us') <= to_epoch_us(to_time))
+
+        codes = self.get_pick_codes()
+        for field, value in zip(PICK_CODE_FIELDS, [station, phase, tag]):
+            if value is None:
+                continue
+            matched = self.get_matched_list(value, 'pick', field)
+            matched = [codes[(field, item)] for item in matched
+                       if (field, item) in codes]
+            query = query.filter(sqlalchemy.literal_column(
+                f'pick.{field}_code').in_(matched))
+
+        return query
+
+    def read_tfrecord_header(self, tfr_list, skip_unchanged=True,
+                             processes=None, commit_files=100):
+        """
+        Sync header into SQL database from tfrecord dataset.
+
+        Headers are parsed in a process pool without decoding the trace
+        data. Re-read files replace their previous waveform and tfrecord
+        rows.
+
+        :param tfr_list: TFRecord list.
+        :param bool skip_unchanged: Skips files indexed with the same size
+            and mtime.
+        :param int processes: Number of processes, default is cpu count.
+        :param int commit_files: Files per transaction.
+        :rtype: dict
+        :return: File and waveform counts and elapsed time in seconds.
+        """
+        start = time.perf_counter()
+        with self.session_scope() as session:
+            indexed = {row.path: (row.size, row.mtime)
+                       for row in session.query(TFRecord.path,
+                                                TFRecord.size,
+                                                TFRecord.mtime).all()}
+
+        file_list = []
+        for tfrecord in tfr_list:
+            stat = os.stat(tfrecord)
+            if skip_unchanged and \
+                    indexed.get(tfrecord) == (stat.st_size, stat.st_mtime):
+                continue
+            file_list.append(tfrecord)
+
+        tfrecord_table = TFRecord.__table__
+        waveform_count = 0
+        headers = seisnn.utils.parallel_imap(
+            file_list, seisnn.io.read_tfrecord_header, processes=processes)
+        headers = tqdm(headers, total=len(file_list))
+        for chunk in seisnn.utils.chunks(headers, commit_files):
+            replaced = [tfrecord['path'] for tfrecord in chunk
+                        if tfrecord['path'] in indexed]
+            waveform_rows = [row for tfrecord in chunk
+                             for row in get_waveform_rows(tfrecord)]
+
+            with self.engine.begin() as connection:
+                self._replace_waveform_rows(connection, replaced,
+                                            waveform_rows)
+                if replaced:
+                    connection.execute(tfrecord_table.delete().where(
+                        tfrecord_table.c.path.in_(replaced)))
+
+                connection.execute(tfrecord_table.insert(),
+                                   [get_tfrecord_row(tfrecord)
+                                    for tfrecord in chunk])
+            waveform_count += len(waveform_rows)
+
+        self.invalidate_cache('waveform')
+        self.invalidate_cache('tfrecord')
+        elapsed = time.perf_counter() - start
+        print(f'Input {waveform_count} waveforms from {len(file_list)} '
+              f'tfrecords, skip {len(tfr_list) - len(file_list)} unchanged '
+              f'in {elapsed:.2f} s')
+
+        return {
+            'tfrecords': len(file_list),
+            'skipped': len(tfr_list) - len(file_list),
+            'waveforms': waveform_count,
+            'time': elapsed,
+        }
+
+    @staticmethod
+    def _replace_waveform_rows(connection, replaced, rows):
+        """
+        Deletes waveforms of re-read tfrecords and inserts the new rows.
+
+        :param connection: SQLAlchemy connection.
+        :param list replaced: Re-read tfrecord paths.
+        :param list rows: Waveform rows.
+        """
+        waveform_table = Waveform.__table__
+        if replaced:
+            connection.execute(waveform_table.delete().where(
+                waveform_table.c.tfrecord.in_(replaced)))
+        if rows:
+            connection.execute(waveform_table.insert(), rows)
+
+    def get_tfrecord(self, network=None, station=None, path=None,
+                     from_date=None, to_date=None, column=None):
+        """
+        Returns query from tfrecord table.
+
+        :param str station: Station name.
+        :rtype: sqlalchemy.orm.query.Query
+        :return: A Query.
+        """
+        with self.session_scope() as session:
+            if column is not None:
+                query = session.query(getattr(TFRecord, column))
+            else:
+                query = session.query(TFRecord)
+
+            query = self._filter_tfrecord(query, network, station, path,
+                                          from_date, to_date)
+            result = query.all()
+
+        return result
+
+    def _filter_tfrecord(self, query,
+                         network=None, station=None, path=None,
+                         from_date=None, to_date=None):
+        if network is not None:
+            network = self.get_matched_list(network, 'tfrecord', 'network')
+            query = query.filter(TFRecord.network.in_(network))
+        if station is not None:
+            station = self.get_matched_list(station, 'tfrecord', 'station')
+            query = query.filter(TFRecord.station.in_(station))
+        if path is not None:
+            path = self.get_matched_list(path, 'tfrecord', 'path')
+            query = query.filter(TFRecord.path.in_(path))
+
+        if self.rtree_index and (from_date is not None
+                                 or to_date is not None):
+            ids = self._query_rtree(query.session, TFRECORD_RTREE, {
+                'time': (from_date, to_date),
+            })
+            query = query.filter(TFRecord.id.in_(ids))
+
+        if from_date is not None:
+            from_date = UTCDateTime(from_date).date
+            query = query.filter(TFRecord.date >= from_date)
+        if to_date is not None:
+            to_date = UTCDateTime(to_date).date
+            query = query.filter(TFRecord.date <= to_date)
+
+        return query
+
+    def get_waveform(self, from_time=None, to_time=None,
                      station=None, tfrecord=None):
         """
         Returns query from waveform table.
@@ -525,21 +2419,512 @@ class Client:
         """
 
         with self.session_scope() as session:
-            query = session.query(Waveform)
-            if from_time is not None:
-                query = query.filter(Waveform.endtime >= from_time)
-            if to_time is not None:
-                query = query.filter(Waveform.starttime <= to_time)
+            query = self._filter_waveform(session.query(Waveform),
+                                          from_time, to_time,
+                                          station, tfrecord)
+            result = query.all()
+
+        return result
+
+    def _filter_waveform(self, query,
+                         from_time=None, to_time=None,
+                         station=None, tfrecord=None):
+        if station is not None:
+            station = self.get_matched_list(
+                station, 'waveform', 'station')
+
+        starttime = Waveform.starttime
+        if self.rtree_index and (from_time is not None
+                                 or to_time is not None):
+            # Station is matched inside the R*Tree, the unary plus keeps
+            # the planner from scanning the starttime indexes instead.
+            ids = self._query_rtree(query.session, WAVEFORM_RTREE, {
+                'time': (from_time, to_time),
+            })
             if station is not None:
-                station = self.get_matched_list(
-                    station, 'waveform', 'station')
-                query = query.filter(Waveform.station.in_(station))
-            if tfrecord is not None:
-                tfrecord = self.get_matched_list(
-                    tfrecord, 'waveform', 'tfrecord')
-                query = query.filter(Waveform.tfrecord.in_(tfrecord))
+                ids = ids.filter(WAVEFORM_RTREE.c.station.in_(station))
+            query = query.filter(Waveform.id.in_(ids))
+            starttime = sqlalchemy.literal_column(
+                '+waveform.starttime', type_=sqlalchemy.DateTime)
+
+        elif station is not None:
+            query = query.filter(Waveform.station.in_(station))
+
+        if from_time is not None:
+            query = query.filter(Waveform.endtime >= from_time)
+        if to_time is not None:
+            query = query.filter(starttime <= to_time)
+        if tfrecord is not None:
+            tfrecord = self.get_matched_list(
+                tfrecord, 'waveform', 'tfrecord')
+            query = query.filter(Waveform.tfrecord.in_(tfrecord))
+
+        return query
+
+    def get_waveforms_overlapping(self, windows):
+        """
+        Returns waveforms overlapping each time window in one query.
+
+        :param list windows: List of (station, from_time, to_time),
+            station can be None for all stations.
+        :rtype: list
+        :return: List of waveform list, one per window in input order.
+        """
+        rows = []
+        for index, (station, from_time, to_time) in enumerate(windows):
+            from_time = UTCDateTime(from_time)
+            to_time = UTCDateTime(to_time)
+            rows.append({
+                'window_index': index,
+                'station': station,
+                'min_time': from_time.timestamp,
+                'max_time': to_time.timestamp,
+                'from_time': from_time.datetime,
+                'to_time': to_time.datetime,
+            })
+
+        result = [[] for _ in windows]
+        if not rows:
+            return result
+
+        if self.rtree_index:
+            statement = WAVEFORM_OVERLAP_RTREE_SQL
+        else:
+            statement = WAVEFORM_OVERLAP_SQL
+
+        window = WAVEFORM_WINDOW
+        with self.session_scope() as session:
+            connection = session.connection()
+            window.create(bind=connection)
+            try:
+                connection.execute(window.insert(), rows)
+                matches = connection.execute(
+                    sqlalchemy.text(statement)).fetchall()
+            finally:
+                window.drop(bind=connection)
+
+            waveforms = {}
+            ids = sorted({waveform_id for _, waveform_id in matches})
+            for chunk in seisnn.utils.chunks(ids, 500):
+                for waveform in session.query(Waveform) \
+                        .filter(Waveform.id.in_(chunk)):
+                    waveforms[waveform.id] = waveform
+
+            for index, waveform_id in matches:
+                result[index].append(waveforms[waveform_id])
+
+        for waveform_list in result:
+            waveform_list.sort(key=lambda waveform: waveform.starttime)
+
+        return result
+
+    def iter_events(self, batch_size=10000, output='orm', order_by=None,
+                    **kwargs):
+        """
+        Yields rows from event table in batches, see get_events.
+
+        :param int batch_size: Rows fetched per batch.
+        :param str output: 'orm', 'tuple' or 'numpy', see iter_table.
+        :param list order_by: Column names to sort by.
+        :param kwargs: Filters pass into get_events.
+        """
+        yield from self.iter_table('event', self._filter_events, kwargs,
+                                   batch_size, output, order_by)
+
+    def iter_picks(self, batch_size=10000, output='orm', order_by=None,
+                   **kwargs):
+        """
+        Yields rows from pick table in batches, see get_picks.
+
+        :param int batch_size: Rows fetched per batch.
+        :param str output: 'orm', 'tuple' or 'numpy', see iter_table.
+        :param list order_by: Column names to sort by.
+        :param kwargs: Filters pass into get_picks.
+        """
+        yield from self.iter_table('pick', self._filter_picks, kwargs,
+                                   batch_size, output, order_by)
+
+    def iter_waveform(self, batch_size=10000, output='orm', order_by=None,
+                      **kwargs):
+        """
+        Yields rows from waveform table in batches, see get_waveform.
+
+        :param int batch_size: Rows fetched per batch.
+        :param str output: 'orm', 'tuple' or 'numpy', see iter_table.
+        :param list order_by: Column names to sort by.
+        :param kwargs: Filters pass into get_waveform.
+        """
+        yield from self.iter_table('waveform', self._filter_waveform, kwargs,
+                                   batch_size, output, order_by)
+
+    def iter_table(self, table, filter_func, filters,
+                   batch_size=10000, output='orm', order_by=None):
+        """
+        Yields filtered rows from a table without loading the full result.
+
+        Rows are fetched from the cursor batch_size at a time, the session
+        stays open until the generator is exhausted or closed.
+
+        :param str table: Target table name.
+        :param filter_func: Filter function, takes query and filters.
+        :param dict filters: Filters pass into filter_func.
+        :param int batch_size: Rows fetched per batch.
+        :param str output: 'orm' yields table objects, 'tuple' yields named
+            tuples of columns, 'numpy' yields a record array per batch.
+        :param list order_by: Column names to sort by.
+        """
+        if output not in ['orm', 'tuple', 'numpy']:
+            raise ValueError(f'Unknown output {output}, '
+                             f'please select: orm, tuple, numpy')
+
+        table_class = self.get_table_class(table)
+        columns = list(table_class.__table__.columns)
+        with self.session_scope() as session:
+            if output == 'orm':
+                query = session.query(table_class)
+            else:
+                query = session.query(
+                    *[getattr(table_class, column.name)
+                      for column in columns])
+
+            query = filter_func(query, **filters)
+            if order_by is not None:
+                query = query.order_by(
+                    *[getattr(table_class, column) for column in order_by])
+            query = query.yield_per(batch_size)
+
+            if output == 'numpy':
+                for rows in seisnn.utils.chunks(query, batch_size):
+                    yield rows_to_record_array(rows, columns)
+            else:
+                yield from query
+
+    def ensure_columns(self):
+        """
+        Adds columns declared on tables but missing in the database.
+
+        Tables created by an older version only get new nullable columns
+        here, create_all skips existing tables. Indexes on the new columns
+        are created as well.
+
+        :rtype: list
+        :return: Names of created columns, as table.column.
+        """
+        inspector = sqlalchemy.inspect(self.engine)
+        existing_tables = inspector.get_table_names()
+        created = []
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+
+            existing = {column['name']
+                        for column in inspector.get_columns(table.name)}
+            columns = [column for column in table.columns
+                       if column.name not in existing and column.nullable]
+            if not columns:
+                continue
+
+            with self.engine.begin() as connection:
+                for column in columns:
+                    column_type = column.type.compile(self.engine.dialect)
+                    connection.execute(sqlalchemy.text(
+                        f'ALTER TABLE {table.name} '
+                        f'ADD COLUMN {column.name} {column_type}'))
+                    created.append(f'{table.name}.{column.name}')
+                    print(f'Add column {table.name}.{column.name}')
+
+            names = {column.name for column in columns}
+            for index in table.indexes:
+                if names.intersection(column.name
+                                      for column in index.columns):
+                    index.create(bind=self.engine, checkfirst=True)
+
+        return created
+
+    def ensure_indexes(self):
+        """
+        Creates indexes declared on tables but missing in the database.
+
+        Tables created by an older version only get new indexes here,
+        create_all skips existing tables.
+
+        :rtype: list
+        :return: Names of created indexes.
+        """
+        inspector = sqlalchemy.inspect(self.engine)
+        existing_tables = inspector.get_table_names()
+        created = []
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+
+            existing = {index['name']
+                        for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name in existing:
+                    continue
+
+                index.create(bind=self.engine)
+                created.append(index.name)
+                print(f'Create index {index.name}')
+
+        return created
+
+    def analyze(self):
+        """
+        Updates table statistics for the query planner.
+        """
+        with self.engine.begin() as connection:
+            connection.execute(sqlalchemy.text('ANALYZE'))
 
-        return query.all()
+    def create_snapshot(self, snapshot=None, analyze=True):
+        """
+        Writes an immutable copy of the database for read-only workers.
+
+        The copy is written by VACUUM INTO, analyzed, switched to the
+        rollback journal and made read-only on disk. It replaces the old
+        snapshot in one rename. Open it with get_snapshot, workers share
+        the file without locks and map the same pages.
+
+        :param str snapshot: Snapshot file name, default is
+            get_snapshot_name(database).
+        :param bool analyze: Collects query planner statistics.
+        :rtype: str
+        :return: Snapshot file name.
+        """
+        if snapshot is None:
+            snapshot = get_snapshot_name(self.database)
+        snapshot_path = os.path.join(os.path.dirname(self.db_path),
+                                     snapshot)
+        temp_path = f'{snapshot_path}.{os.getpid()}.tmp'
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+        start = time.perf_counter()
+        with self.engine.connect() as connection:
+            connection.execution_options(
+                isolation_level='AUTOCOMMIT').execute(
+                sqlalchemy.text('VACUUM INTO :path'), {'path': temp_path})
+
+        connection = sqlite3.connect(temp_path)
+        try:
+            connection.execute('PRAGMA journal_mode = DELETE')
+            if analyze:
+                connection.execute('ANALYZE')
+        finally:
+            connection.close()
+
+        os.chmod(temp_path, 0o444)
+        os.replace(temp_path, snapshot_path)
+        print(f'Snapshot {self.database} to {snapshot}, '
+              f'{os.path.getsize(snapshot_path) / 1024 ** 2:.1f} MB in '
+              f'{time.perf_counter() - start:.2f} s')
+        return snapshot
+
+    def explain_query_plan(self, query):
+        """
+        Returns SQLite query plan of a query.
+
+        :param query: sqlalchemy.orm.query.Query or select statement.
+        :rtype: list
+        :return: List of plan detail strings.
+        """
+        statement = getattr(query, 'statement', query)
+        compiled = statement.compile(
+            dialect=self.engine.dialect,
+            compile_kwargs={'render_postcompile': True})
+        params = compiled.construct_params()
+        params = [params[key] for key in compiled.positiontup]
+
+        connection = self.engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            cursor.execute(f'EXPLAIN QUERY PLAN {compiled}', params)
+            plan = [row[-1] for row in cursor.fetchall()]
+        finally:
+            connection.close()
+
+        return plan
+
+    def explain(self, table, **kwargs):
+        """
+        Returns query plan of the get_* query for a table.
+
+        Example: db.explain('pick', station='H*', phase='P', tag='manual',
+        from_time=t0, to_time=t1)
+
+        :param str table: Keywords: inventory, event, pick, waveform,
+            tfrecord.
+        :param kwargs: Filters pass into the get_* method of the table.
+        :rtype: list
+        :return: List of plan detail strings.
+        """
+        table_class = self.get_table_class(table)
+        with self.session_scope() as session:
+            query = self.get_filter_function(table)(
+                session.query(table_class), **kwargs)
+
+        return self.explain_query_plan(query)
+
+    def get_filter_function(self, table):
+        """
+        Returns the filter function shared by get_* and iter_* methods.
+
+        :param str table: Keywords: inventory, event, pick, waveform,
+            tfrecord.
+        :return: Function takes a query and filter keywords.
+        """
+        filter_dict = {
+            'inventory': self._filter_inventories,
+            'event': self._filter_events,
+            'pick': self._filter_picks,
+            'waveform': self._filter_waveform,
+            'tfrecord': self._filter_tfrecord,
+        }
+        return filter_dict[table]
+
+    def to_arrays(self, table, categorical=True, batch_size=100000,
+                  **kwargs):
+        """
+        Returns filtered table as column-oriented NumPy arrays.
+
+        DateTime and Date columns become int64 epoch microseconds. With
+        categorical, string columns become int32 codes into the sorted
+        array stored under "<column>_categories".
+
+        :param str table: Keywords: inventory, event, pick, waveform,
+            tfrecord.
+        :param bool categorical: Encode string columns, default is True.
+        :param int batch_size: Rows fetched per batch.
+        :param kwargs: Filters pass into the get_* method of the table.
+        :rtype: dict
+        :return: Dict of column arrays.
+        """
+        table_class = self.get_table_class(table)
+        columns = list(table_class.__table__.columns)
+        batches = list(self.iter_table(table,
+                                       self.get_filter_function(table),
+                                       kwargs,
+                                       batch_size=batch_size,
+                                       output='numpy'))
+        if batches:
+            records = np.concatenate(batches)
+        else:
+            records = np.empty(0, dtype=get_numpy_dtype(columns))
+
+        arrays = {}
+        for name in records.dtype.names:
+            column = records[name]
+            if column.dtype.kind == 'M':
+                arrays[name] = column.astype('datetime64[us]').view('int64')
+
+            elif column.dtype.kind == 'O' and categorical:
+                values = np.array(['' if value is None else value
+                                   for value in column], dtype=str)
+                categories, codes = np.unique(values, return_inverse=True)
+                arrays[name] = codes.astype('int32')
+                arrays[f'{name}_categories'] = categories
+
+            else:
+                arrays[name] = np.asarray(column)
+
+        return arrays
+
+    def export_table(self, table, path, file_format=None, **kwargs):
+        """
+        Writes filtered table into a Parquet or Feather file.
+
+        Requires pyarrow.
+
+        :param str table: Keywords: inventory, event, pick, waveform,
+            tfrecord.
+        :param str path: Output file path.
+        :param str file_format: 'parquet' or 'feather', default is taken
+            from the file extension.
+        :param kwargs: Filters pass into the get_* method of the table.
+        :rtype: int
+        :return: Number of exported rows.
+        """
+        file_format = self._get_file_format(path, file_format)
+        table_class = self.get_table_class(table)
+        columns = list(table_class.__table__.columns)
+        batches = list(self.iter_table(table,
+                                       self.get_filter_function(table),
+                                       kwargs,
+                                       output='numpy'))
+        if batches:
+            records = np.concatenate(batches)
+        else:
+            records = np.empty(0, dtype=get_numpy_dtype(columns))
+
+        data_frame = pd.DataFrame.from_records(records)
+        if file_format == 'parquet':
+            data_frame.to_parquet(path, index=False)
+        else:
+            data_frame.to_feather(path)
+
+        print(f'Export {len(data_frame)} {table}s to {path}')
+        return len(data_frame)
+
+    def import_table(self, table, path, file_format=None, keep_id=False,
+                     commit_size=10000):
+        """
+        Inserts rows from a Parquet or Feather file made by export_table.
+
+        Requires pyarrow.
+
+        :param str table: Keywords: inventory, event, pick, waveform,
+            tfrecord.
+        :param str path: Input file path.
+        :param str file_format: 'parquet' or 'feather', default is taken
+            from the file extension.
+        :param bool keep_id: Keep id column from the file, default is False
+            so rows get new ids in this database.
+        :param int commit_size: Rows per transaction.
+        :rtype: int
+        :return: Number of inserted rows.
+        """
+        file_format = self._get_file_format(path, file_format)
+        if file_format == 'parquet':
+            data_frame = pd.read_parquet(path)
+        else:
+            data_frame = pd.read_feather(path)
+
+        table_class = self.get_table_class(table)
+        if not keep_id and 'id' in data_frame.columns \
+                and 'id' in table_class.__table__.columns:
+            data_frame = data_frame.drop(columns='id')
+
+        data = {}
+        for column in data_frame.columns:
+            python_type = table_class.__table__.columns[column] \
+                .type.python_type
+            values = data_frame[column]
+            if python_type is datetime.datetime:
+                values = values.dt.to_pydatetime()
+            elif python_type is datetime.date:
+                values = values.dt.date
+            values = [None if pd.isna(value) else value
+                      for value in values]
+            if python_type in [int, float, str]:
+                values = [value if value is None else python_type(value)
+                          for value in values]
+            data[column] = values
+
+        rows = (dict(zip(data, row)) for row in zip(*data.values()))
+        count = self.bulk_insert(table, rows, commit_size,
+                                 ignore_duplicates=True)
+        print(f'Import {count} {table}s from {path}')
+        return count
+
+    @staticmethod
+    def _get_file_format(path, file_format=None):
+        if file_format is None:
+            file_format = os.path.splitext(path)[1].lstrip('.')
+        if file_format not in ['parquet', 'feather']:
+            raise ValueError(f'Unknown file format {file_format}, '
+                             f'please select: parquet, feather')
+        return file_format
 
     def remove_duplicates(self, table, match_columns):
         """
@@ -549,6 +2934,10 @@ class Client:
         :param list match_columns: List of column names.
             If all columns matches, then marks it as a duplicate data.
         """
+        if table == 'pick' and self.compact_picks:
+            print('Compact picks are unique, skip removing duplicates')
+            return
+
         table = self.get_table_class(table)
         with self.session_scope() as session:
             attrs = operator.attrgetter(*match_columns)
@@ -561,6 +2950,7 @@ class Client:
                 .filter(table.id.notin_(distinct.with_entities(table.id))) \
                 .delete(synchronize_session='fetch')
             print(f'Remove {duplicate} duplicate {table.__tablename__}s')
+        self.invalidate_cache(table.__tablename__)
 
     def get_distinct_items(self, table, column):
         """
@@ -608,22 +2998,32 @@ class Client:
 
         :param table: Target table name.
         """
+        if table == 'pick' and self.compact_picks:
+            with self.engine.begin() as connection:
+                connection.execute(PICK_COMPACT.delete())
+            self.invalidate_cache('pick')
+            return
+
         table = self.get_table_class(table)
         with self.session_scope() as session:
             session.query(table).delete()
+        self.invalidate_cache(table.__tablename__)
 
     @contextlib.contextmanager
     def session_scope(self):
         """
         Provide a transactional scope around a series of operations.
+
+        Rolls back and re-raises on error.
         """
         session = self.session()
         try:
             yield session
             session.commit()
         except Exception as exception:
-            print(f'{exception.__class__.__name__}: {exception.__cause__}')
+            print(f'{exception.__class__.__name__}: {exception}')
             session.rollback()
+            raise
         finally:
             session.close()
 
@@ -640,141 +3040,1487 @@ class Client:
         string = string.replace('*', '%')
         return string
 
-    def get_matched_list(self, wildcard_list, table, column):
+    @staticmethod
+    def has_wildcard(string):
         """
-        Gets wildcard match list in column.
+        Returns True if the string contains wildcard characters.
 
-        :param str/list wildcard_list:
-        :param str table: Table name.
-        :param str column: Column name.
-        :return:
+        :param str string: Target string.
+        :rtype: bool
         """
-        if isinstance(wildcard_list, str):
-            wildcard_list = [wildcard_list]
+        return any(char in string for char in WILDCARD_CHARACTERS)
 
-        table = self.get_table_class(table)
+    @staticmethod
+    def wildcard_to_regex(string):
+        """
+        Returns a regex pattern matching like SQL LIKE on the wildcard.
 
-        matched_list = []
-        for wildcard in wildcard_list:
-            wildcard = self.replace_sql_wildcard(wildcard)
-            with self.session_scope() as session:
-                query = session.query(getattr(table, column)) \
-                    .filter(getattr(table, column).like(wildcard)) \
-                    .distinct() \
-                    .order_by(getattr(table, column)) \
-                    .all()
-                query = seisnn.utils.flatten_list(query)
-                matched_list.extend(query)
+        :param str string: Posix or SQL wildcard string.
+        :rtype: str
+        :return: Regex pattern.
+        """
+        string = Client.replace_sql_wildcard(string)
+        pattern = ''
+        for char in string:
+            if char == '%':
+                pattern += '.*'
+            elif char == '_':
+                pattern += '.'
+            else:
+                pattern += re.escape(char)
+        return pattern
+
+    def get_data_version(self):
+        """
+        Returns a value which changes when any connection or process
+        commits into the database, from PRAGMA data_version on a
+        connection kept for this check.
+
+        :rtype: int
+        """
+        if self._version_connection is None:
+            self._version_connection = self.engine.raw_connection()
+        cursor = self._version_connection.cursor()
+        try:
+            cursor.execute('PRAGMA data_version')
+            return cursor.fetchone()[0]
+        finally:
+            cursor.close()
+
+    def check_cache(self):
+        """
+        Clears cached items if the database changed since they were read.
+        """
+        version = self.get_data_version()
+        if version != self._cache_version:
+            self.invalidate_cache()
+            self._cache_version = version
+
+    def get_cached_distinct_items(self, table, column):
+        """
+        Returns distinct items of a column, cached until the database
+        changes, see check_cache.
+
+        :param str table: Target table name.
+        :param str column: Target column name.
+        :rtype: list
+        :return: A list of query.
+        """
+        self.check_cache()
+        key = (table, column)
+        if key in self._distinct_cache:
+            return self._distinct_cache[key]
+
+        if table == 'pick' and self.compact_picks \
+                and column in PICK_CODE_FIELDS:
+            # Code dictionary instead of a scan over the pick view.
+            self._distinct_cache[key] = sorted(
+                value for field, value in self.get_pick_codes()
+                if field == column)
+        else:
+            self._distinct_cache[key] = self.get_distinct_items(table, column)
+
+        return self._distinct_cache[key]
+
+    def invalidate_cache(self, table=None):
+        """
+        Clears cached distinct items.
+
+        :param str table: Target table name, clears all tables if None.
+        """
+        if table in [None, 'pick']:
+            self._pick_codes = None
+
+        if table is None:
+            self._distinct_cache.clear()
+            return
+
+        for key in list(self._distinct_cache):
+            if key[0] == table:
+                del self._distinct_cache[key]
+
+    def get_matched_list(self, wildcard_list, table, column):
+        """
+        Gets wildcard match list in column.
+
+        Items are matched case-insensitively against the cached distinct
+        items of the column, like the former LIKE lookup, wildcards in a
+        single pass. Items without wildcard characters which are not in
+        the column are returned as they are.
+
+        :param str/list wildcard_list:
+        :param str table: Table name.
+        :param str column: Column name.
+        :return:
+        """
+        if isinstance(wildcard_list, str):
+            wildcard_list = [wildcard_list]
+
+        self.check_cache()
+        matched_list = []
+        patterns = []
+        names = []
+        for wildcard in wildcard_list:
+            if self.has_wildcard(wildcard):
+                patterns.append(self.wildcard_to_regex(wildcard))
+            else:
+                names.append(wildcard)
+
+        if names:
+            key = (table, column, 'lower')
+            if key not in self._distinct_cache:
+                items = collections.defaultdict(list)
+                for item in self.get_cached_distinct_items(table, column):
+                    if item is not None:
+                        items[str(item).lower()].append(item)
+                self._distinct_cache[key] = items
+            items = self._distinct_cache[key]
+            for name in names:
+                matched_list.extend(items.get(str(name).lower(), [name]))
+
+        if patterns:
+            regex = re.compile('|'.join(f'(?:{pattern})'
+                                        for pattern in patterns),
+                               re.IGNORECASE | re.DOTALL)
+            for item in self.get_cached_distinct_items(table, column):
+                if item is not None and regex.fullmatch(str(item)):
+                    matched_list.append(item)
 
         matched_list = sorted(list(set(matched_list)))
         return matched_list
 
 
+# Shard file period formats, {partition: (strftime format, file regex)}.
+PARTITION_FORMATS = {
+    'month': ('%Y-%m', r'\d{4}-\d{2}'),
+    'year': ('%Y', r'\d{4}'),
+}
+
+
+class ShardedClient(Client):
+    """
+    Federated client over time-partitioned databases.
+
+    Rows of the sharded tables are written into one database file per
+    month or year next to the main database, e.g. ``Hualien.2020-05.db``,
+    picks by time and waveforms by starttime. Queries read the main
+    database and only the shards the time range touches. Other tables
+    stay in the main database.
+
+    Every write path routes sharded rows into their shard. Shards are
+    separate files, so sharded rows are committed per shard and not in
+    the transaction of the main database, e.g. the picks of a synced
+    S-file.
+
+    Old shards are archived by moving the file, archived shards are
+    still read but no longer written::
+
+        db = ShardedClient('Hualien.db', partition='month')
+        db.add_picks(rows)
+        db.archive(before='2020-01-01')
+    """
+
+    def __init__(self, database, partition='month',
+                 tables=('pick', 'waveform'), archive_dir=None,
+                 include_archive=True, **kwargs):
+        """
+        :param str database: Main database file name in config.sql_database.
+        :param str partition: 'month' or 'year'.
+        :param tables: Sharded table names, 'pick' and/or 'waveform'.
+        :param str archive_dir: Archived shard directory, default is
+            archive under config.sql_database.
+        :param bool include_archive: Read archived shards in queries.
+        :param kwargs: Keywords pass into Client for every database.
+        """
+        if partition not in PARTITION_FORMATS:
+            raise ValueError(f'Unknown partition {partition}, '
+                             f'please select: month, year')
+        for table in tables:
+            if table not in ['pick', 'waveform']:
+                raise ValueError(f'Table {table} can not be sharded, '
+                                 f'please select: pick, waveform')
+
+        super().__init__(database, **kwargs)
+        config = seisnn.utils.Config()
+        self.partition = partition
+        self.tables = tuple(tables)
+        self.sql_database = config.sql_database
+        self.archive_dir = archive_dir or os.path.join(config.sql_database,
+                                                       'archive')
+        self.include_archive = include_archive
+        self.shard_kwargs = kwargs
+        self._shards = {}
+
+    def __repr__(self):
+        return f"ShardedClient(" \
+               f"Database={self.database}, " \
+               f"Partition={self.partition}, " \
+               f"Shards={len(self.list_shards())})"
+
+    def get_period(self, value):
+        """
+        Returns the shard period of a time.
+
+        :param value: datetime.datetime, UTCDateTime or time string.
+        :rtype: str
+        """
+        time_format, _ = PARTITION_FORMATS[self.partition]
+        if not isinstance(value, datetime.datetime):
+            value = UTCDateTime(value).datetime
+        return value.strftime(time_format)
+
+    def get_shard_name(self, period):
+        """
+        Returns the shard file name of a period.
+
+        :param str period: Shard period.
+        :rtype: str
+        """
+        stem, ext = os.path.splitext(os.path.basename(self.database))
+        return f'{stem}.{period}{ext}'
+
+    def list_shards(self, archived=None):
+        """
+        Returns existing shards.
+
+        :param bool archived: True for archived shards only, False for
+            active shards only, None for both.
+        :rtype: dict
+        :return: Dict of {period: shard path}, sorted by period.
+        """
+        stem, ext = os.path.splitext(os.path.basename(self.database))
+        _, period_regex = PARTITION_FORMATS[self.partition]
+        regex = re.compile(
+            f'{re.escape(stem)}\\.({period_regex}){re.escape(ext)}')
+
+        directories = []
+        if archived is not True:
+            directories.append(self.sql_database)
+        if archived is not False:
+            directories.append(self.archive_dir)
+
+        shards = {}
+        for directory in directories:
+            if not os.path.isdir(directory):
+                continue
+            for file in os.listdir(directory):
+                match = regex.fullmatch(file)
+                if match:
+                    shards.setdefault(match.group(1),
+                                      os.path.join(directory, file))
+
+        return dict(sorted(shards.items()))
+
+    def is_archived(self, period):
+        """
+        Returns True if the shard of the period is archived.
+
+        :param str period: Shard period.
+        :rtype: bool
+        """
+        return os.path.exists(
+            os.path.join(self.archive_dir, self.get_shard_name(period)))
+
+    def get_shard(self, period, create=False):
+        """
+        Returns the client of a shard, archived shards are read-only.
+
+        :param str period: Shard period.
+        :param bool create: Creates the shard if missing.
+        :rtype: Client
+        :return: Shard client, None if missing and not created.
+        """
+        client = self._shards.get(period)
+        if client is not None:
+            return client
+
+        name = self.get_shard_name(period)
+        if self.is_archived(period):
+            client = Client(os.path.join(self.archive_dir, name),
+                            profile=self.profile, readonly=True,
+                            monitor=self.monitor)
+        elif create or os.path.exists(os.path.join(self.sql_database, name)):
+            client = Client(name, **self.shard_kwargs)
+        else:
+            return None
+
+        self._shards[period] = client
+        return client
+
+    def get_shards(self, from_time=None, to_time=None):
+        """
+        Returns clients of the existing shards touched by a time range.
+
+        :param from_time: From time, None for unbounded.
+        :param to_time: To time, None for unbounded.
+        :rtype: list
+        """
+        from_period = None if from_time is None \
+            else self.get_period(from_time)
+        to_period = None if to_time is None else self.get_period(to_time)
+
+        shards = []
+        for period in self.list_shards(
+                archived=None if self.include_archive else False):
+            if from_period is not None and period < from_period:
+                continue
+            if to_period is not None and period > to_period:
+                continue
+            shards.append(self.get_shard(period))
+
+        return shards
+
+    def split_rows(self, table, rows):
+        """
+        Returns rows grouped by the shard they are written to.
+
+        :param str table: 'pick' or 'waveform'.
+        :param rows: Iterable of column dict.
+        :rtype: list
+        :return: List of (shard client, rows).
+        """
+        time_column = 'time' if table == 'pick' else 'starttime'
+        groups = {}
+        for row in rows:
+            groups.setdefault(self.get_period(row[time_column]),
+                              []).append(row)
+
+        result = []
+        for period, period_rows in sorted(groups.items()):
+            if self.is_archived(period):
+                raise ValueError(f'Shard {period} is archived, '
+                                 f'move it back before writing')
+            result.append((self.get_shard(period, create=True),
+                           period_rows))
+        return result
+
+    def _get_query_shards(self, table, from_time=None, to_time=None):
+        # Waveforms are routed by starttime, one overlapping from_time may
+        # start up to a day earlier, in the period before.
+        if table == 'waveform' and from_time is not None:
+            from_time = UTCDateTime(from_time) - 86400
+        return [self] + self.get_shards(from_time, to_time)
+
+    def bulk_insert(self, table, rows, commit_size=10000,
+                    ignore_duplicates=False):
+        if table not in self.tables:
+            return super().bulk_insert(table, rows, commit_size,
+                                       ignore_duplicates)
+
+        count = 0
+        for chunk in seisnn.utils.chunks(rows, commit_size):
+            for client, shard_rows in self.split_rows(table, chunk):
+                count += client.bulk_insert(table, shard_rows, commit_size,
+                                            ignore_duplicates)
+        self.invalidate_cache(table)
+        return count
+
+    def _replace_waveform_rows(self, connection, replaced, rows):
+        if 'waveform' not in self.tables:
+            return super()._replace_waveform_rows(connection, replaced,
+                                                  rows)
+
+        if replaced:
+            for client in [self] + self.get_shards():
+                if client.readonly:
+                    continue
+                with client.engine.begin() as shard_connection:
+                    Client._replace_waveform_rows(shard_connection,
+                                                  replaced, [])
+        for client, shard_rows in self.split_rows('waveform', rows):
+            with client.engine.begin() as shard_connection:
+                Client._replace_waveform_rows(shard_connection, [],
+                                              shard_rows)
+
+    def get_writable_shards(self):
+        """
+        Returns clients of the existing active shards.
+
+        :rtype: list
+        """
+        return [self.get_shard(period)
+                for period in self.list_shards(archived=False)]
+
+    def insert_events(self, events, tag, bulk=False, commit_size=10000):
+        """
+        Insert obspy events and their picks, see Client.insert_events.
+        Sharded picks are always inserted in bulk mode.
+        """
+        return super().insert_events(events, tag,
+                                     bulk=bulk or 'pick' in self.tables,
+                                     commit_size=commit_size)
+
+    def _insert_rows(self, connection, table, rows, commit_size=10000):
+        # Sharded rows are committed per shard, not in the given
+        # transaction of the main database.
+        if table not in self.tables:
+            return super()._insert_rows(connection, table, rows,
+                                        commit_size)
+
+        count = 0
+        for chunk in seisnn.utils.chunks(rows, commit_size):
+            for client, shard_rows in self.split_rows(table, chunk):
+                with client.engine.begin() as shard_connection:
+                    count += client._insert_rows(shard_connection, table,
+                                                 shard_rows, commit_size)
+        self.invalidate_cache(table)
+        return count
+
+    def _get_sfile_shards(self, connection, sfile_ids, chunk_size=500):
+        # Picks of an S-file are within a day of its events, which stay in
+        # the main database.
+        shards = {}
+        for chunk in seisnn.utils.chunks(sfile_ids, chunk_size):
+            from_time, to_time = connection.execute(
+                sqlalchemy.select(sqlalchemy.func.min(Event.time),
+                                  sqlalchemy.func.max(Event.time))
+                .where(Event.sfile_id.in_(chunk))).first()
+            if from_time is None:
+                continue
+            for client in self.get_shards(UTCDateTime(from_time) - 86400,
+                                          UTCDateTime(to_time) + 86400):
+                if not client.readonly:
+                    shards[client.database] = client
+        return list(shards.values())
+
+    def _delete_sfile_rows(self, connection, sfile_ids, chunk_size=500):
+        if 'pick' not in self.tables or not sfile_ids:
+            return super()._delete_sfile_rows(connection, sfile_ids,
+                                              chunk_size)
+
+        shards = self._get_sfile_shards(connection, sfile_ids, chunk_size)
+        super()._delete_sfile_rows(connection, sfile_ids, chunk_size)
+        for client in shards:
+            with client.engine.begin() as shard_connection:
+                client._delete_sfile_rows(shard_connection, sfile_ids,
+                                          chunk_size)
+
+    def _remove_legacy_duplicates(self, connection, sfile_id,
+                                  tables=('event', 'pick')):
+        if 'pick' not in self.tables or 'pick' not in tables:
+            return super()._remove_legacy_duplicates(connection, sfile_id,
+                                                     tables)
+
+        count = super()._remove_legacy_duplicates(
+            connection, sfile_id,
+            [table for table in tables if table != 'pick'])
+        _, columns = UNIQUE_CONSTRAINTS['pick']
+        match = ' AND '.join(f'{column} IS :{column}' for column in columns)
+        for client in self._get_sfile_shards(connection, [sfile_id]):
+            with client.engine.begin() as shard_connection:
+                count += client._remove_legacy_duplicates(
+                    shard_connection, sfile_id, ['pick'])
+                rows = shard_connection.execute(sqlalchemy.text(
+                    f'SELECT {", ".join(columns)} FROM pick '
+                    f'WHERE sfile_id = :sfile_id'),
+                    {'sfile_id': sfile_id}).mappings().all()
+
+            # Picks written before sharding stay in the main database.
+            if rows and not self.compact_picks:
+                result = connection.execute(sqlalchemy.text(
+                    f'DELETE FROM pick WHERE sfile_id IS NULL AND {match}'),
+                    [dict(row) for row in rows])
+                count += result.rowcount
+        return count
+
+    def remove_duplicates(self, table, match_columns):
+        """
+        Removes duplicates in the main database and in each active shard,
+        see Client.remove_duplicates. Duplicates across databases are
+        kept.
+        """
+        super().remove_duplicates(table, match_columns)
+        if table not in self.tables:
+            return
+
+        for client in self.get_writable_shards():
+            client.remove_duplicates(table, match_columns)
+        self.invalidate_cache(table)
+
+    def clear_table(self, table):
+        """
+        Deletes the table in the main database and in each active shard,
+        archived shards are kept.
+        """
+        super().clear_table(table)
+        if table not in self.tables:
+            return
+
+        for client in self.get_writable_shards():
+            client.clear_table(table)
+        self.invalidate_cache(table)
+
+    def get_picks(self,
+                  from_time=None, to_time=None,
+                  station=None, phase=None,
+                  tag=None):
+        """
+        Returns picks from the main database and touched shards, sorted
+        by time, see Client.get_picks.
+        """
+        if 'pick' not in self.tables:
+            return super().get_picks(from_time, to_time, station, phase, tag)
+
+        result = []
+        for client in self._get_query_shards('pick', from_time, to_time):
+            result.extend(Client.get_picks(client, from_time, to_time,
+                                           station, phase, tag))
+        return sorted(result, key=lambda pick: pick.time)
+
+    def get_waveform(self, from_time=None, to_time=None,
+                     station=None, tfrecord=None):
+        """
+        Returns waveforms from the main database and touched shards,
+        sorted by starttime, see Client.get_waveform.
+        """
+        if 'waveform' not in self.tables:
+            return super().get_waveform(from_time, to_time, station,
+                                        tfrecord)
+
+        result = []
+        for client in self._get_query_shards('waveform', from_time, to_time):
+            result.extend(Client.get_waveform(client, from_time, to_time,
+                                              station, tfrecord))
+        return sorted(result, key=lambda waveform: waveform.starttime)
+
+    def get_waveforms_overlapping(self, windows):
+        if 'waveform' not in self.tables:
+            return super().get_waveforms_overlapping(windows)
+
+        result = [[] for _ in windows]
+        if not windows:
+            return result
+
+        from_time = min(UTCDateTime(window[1]) for window in windows)
+        to_time = max(UTCDateTime(window[2]) for window in windows)
+        for client in self._get_query_shards('waveform', from_time, to_time):
+            shard_result = Client.get_waveforms_overlapping(client, windows)
+            for waveform_list, shard_list in zip(result, shard_result):
+                waveform_list.extend(shard_list)
+
+        for waveform_list in result:
+            waveform_list.sort(key=lambda waveform: waveform.starttime)
+        return result
+
+    def iter_table(self, table, filter_func, filters,
+                   batch_size=10000, output='orm', order_by=None):
+        """
+        Yields rows of the main database, then of each touched shard in
+        time order, see Client.iter_table. order_by sorts within each
+        database.
+        """
+        if table not in self.tables:
+            yield from super().iter_table(table, filter_func, filters,
+                                          batch_size, output, order_by)
+            return
+
+        for client in self._get_query_shards(table,
+                                             filters.get('from_time'),
+                                             filters.get('to_time')):
+            shard_filter = getattr(client, filter_func.__name__)
+            yield from Client.iter_table(client, table, shard_filter,
+                                         filters, batch_size, output,
+                                         order_by)
+
+    def get_data_version(self):
+        """
+        Returns data versions of the main database and the read shards,
+        see Client.get_data_version.
+
+        :rtype: tuple
+        """
+        versions = [super().get_data_version()]
+        for period in self.list_shards(
+                archived=None if self.include_archive else False):
+            versions.append((period,
+                             self.get_shard(period).get_data_version()))
+        return tuple(versions)
+
+    def get_distinct_items(self, table, column):
+        if table not in self.tables:
+            return super().get_distinct_items(table, column)
+
+        items = set()
+        for client in self._get_query_shards(table):
+            items.update(Client.get_distinct_items(client, table, column))
+        return sorted(items, key=lambda item: (item is None, item))
+
+    def archive(self, before):
+        """
+        Moves active shards before a time into the archive directory.
+
+        Files are moved as they are, after a WAL checkpoint.
+
+        :param before: Shards of periods before this time are archived.
+        :rtype: list
+        :return: Archived shard paths.
+        """
+        before_period = self.get_period(before)
+        seisnn.utils.make_dirs(self.archive_dir)
+
+        archived = []
+        for period, path in self.list_shards(archived=False).items():
+            if period >= before_period:
+                continue
+
+            client = self._shards.pop(period, None) \
+                or Client(self.get_shard_name(period), **self.shard_kwargs)
+            with client.engine.connect() as connection:
+                connection.execute(sqlalchemy.text(
+                    'PRAGMA wal_checkpoint(TRUNCATE)'))
+            client.close()
+
+            target = os.path.join(self.archive_dir, os.path.basename(path))
+            os.replace(path, target)
+            for suffix in ['-wal', '-shm']:
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+            archived.append(target)
+            print(f'Archive {os.path.basename(path)}')
+
+        return archived
+
+
+PICK_INSERT_NOT_EXISTS_SQL = """
+INSERT INTO pick (time, station, phase, tag)
+SELECT :time, :station, :phase, :tag
+WHERE NOT EXISTS (
+    SELECT 1 FROM pick
+    WHERE station = :station AND phase = :phase AND tag = :tag
+    AND time = :time)
+"""
+
+
+class PickWriter:
+    """
+    Buffered pick writer, flushes picks in bulk transactions.
+
+    Use as a context manager, remaining picks are flushed on exit::
+
+        with PickWriter('Hualien.db', dedup=True) as writer:
+            for instance in instances:
+                writer.add_picks(instance.predict.picks, tag='predict')
+        print(writer.stats)
+    """
+
+    def __init__(self, database, buffer_size=10000, dedup=False):
+        """
+        :param database: Database name or Client.
+        :param int buffer_size: Picks kept in memory before a flush.
+        :param bool dedup: Skips picks already in the buffer or in the
+            table, done by the unique constraint if the table has one.
+        """
+        if isinstance(database, str):
+            database = get_client(database)
+        self.database = database
+        self.buffer_size = buffer_size
+        self.dedup = dedup
+
+        self.buffer = []
+        self._seen = set()
+        self._start = None
+        self.stats = {
+            'picks': 0,
+            'written': 0,
+            'duplicates': 0,
+            'flushes': 0,
+            'flush_time': 0.0,
+            'elapsed': 0.0,
+        }
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __repr__(self):
+        return f"PickWriter(" \
+               f"Picks={self.stats['picks']}, " \
+               f"Written={self.stats['written']}, " \
+               f"Buffered={len(self.buffer)})"
+
+    def add(self, pick_time, station, phase, tag):
+        """
+        Adds a pick to the buffer.
+
+        :param pick_time: Pick time, datetime or UTCDateTime.
+        :param str station: Station name.
+        :param str phase: Phase name.
+        :param str tag: Pick tag.
+        """
+        if isinstance(pick_time, UTCDateTime):
+            pick_time = pick_time.datetime
+        self.stats['picks'] += 1
+
+        if self.dedup:
+            key = (pick_time, station, phase, tag)
+            if key in self._seen:
+                self.stats['duplicates'] += 1
+                return
+            self._seen.add(key)
+
+        self.buffer.append({
+            'time': pick_time,
+            'station': station,
+            'phase': phase,
+            'tag': tag,
+        })
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def add_picks(self, picks, tag=None):
+        """
+        Adds picks to the buffer.
+
+        :param picks: Iterable of core.Pick.
+        :param str tag: Pick tag, default is the tag of each pick.
+        """
+        for pick in picks:
+            self.add(pick.time, pick.station, pick.phase,
+                     tag if tag is not None else pick.tag)
+
+    def add_pick_array(self, picks, stations, tag):
+        """
+        Adds pick records from core.find_picks to the buffer.
+
+        :param numpy.array picks: Picks in core.PICK_DTYPE, time in epoch
+            microseconds.
+        :param stations: Station name of each instance.
+        :param str tag: Pick tag.
+        """
+        times = picks['time'].astype('datetime64[us]').tolist()
+        for pick_time, instance, phase in zip(times,
+                                              picks['instance'].tolist(),
+                                              picks['phase'].tolist()):
+            self.add(pick_time, stations[instance], phase, tag)
+
+    def flush(self):
+        """
+        Writes buffered picks in one transaction.
+
+        :rtype: int
+        :return: Number of inserted picks.
+        """
+        if not self.buffer:
+            return 0
+
+        start = time.perf_counter()
+        rows, self.buffer = self.buffer, []
+        if isinstance(self.database, ShardedClient) \
+                and 'pick' in self.database.tables:
+            groups = self.database.split_rows('pick', rows)
+        else:
+            groups = [(self.database, rows)]
+
+        written = 0
+        for client, client_rows in groups:
+            written += self._write_rows(client, client_rows)
+        self.database.invalidate_cache('pick')
+        # Written picks are skipped by the table from now on.
+        self._seen = set()
+
+        self.stats['written'] += written
+        self.stats['duplicates'] += len(rows) - written
+        self.stats['flushes'] += 1
+        self.stats['flush_time'] += time.perf_counter() - start
+        return written
+
+    def _write_rows(self, client, rows):
+        if self.dedup and not client.has_unique_constraint('pick'):
+            statement = sqlalchemy.text(PICK_INSERT_NOT_EXISTS_SQL) \
+                .bindparams(sqlalchemy.bindparam('time',
+                                                 type_=sqlalchemy.DateTime))
+            with client.engine.begin() as connection:
+                written = connection.execute(statement, rows).rowcount
+        else:
+            written = client.bulk_insert('pick', rows,
+                                         commit_size=len(rows),
+                                         ignore_duplicates=True)
+        client.invalidate_cache('pick')
+        return written
+
+    def close(self):
+        """
+        Flushes remaining picks and updates elapsed time.
+        """
+        self.flush()
+        if self._start is not None:
+            self.stats['elapsed'] = time.perf_counter() - self._start
+
+    def report(self):
+        """
+        Prints writer statistics.
+        """
+        elapsed = self.stats['elapsed'] or self.stats['flush_time']
+        rate = self.stats['written'] / elapsed if elapsed else 0
+        print(f'Write {self.stats["written"]} picks, skip '
+              f'{self.stats["duplicates"]} duplicates in '
+              f'{self.stats["flushes"]} flushes, '
+              f'{self.stats["flush_time"]:.2f} s in database, '
+              f'{rate:.0f} picks/s')
+
+
+class PickIndex:
+    """
+    In-memory pick times for label generation.
+
+    Pick times are kept as sorted int64 epoch microseconds per station
+    and phase, a window lookup is a binary search instead of a query::
+
+        index = PickIndex.from_database('Hualien.db', tag='manual',
+                                        station='H*')
+        times = index.get_times('H001', 'P', from_time, to_time)
+    """
+    __slots__ = [
+        'times',
+        'tag',
+        'stations',
+        'from_us',
+        'to_us',
+    ]
+
+    def __init__(self, tag=None, stations=None, from_time=None,
+                 to_time=None):
+        """
+        :param str tag: Pick tag of the loaded picks.
+        :param stations: Loaded station names, None for all stations.
+        :param from_time: Loaded from time, None for unbounded.
+        :param to_time: Loaded to time, None for unbounded.
+        """
+        self.times = {}
+        self.tag = tag
+        self.stations = None if stations is None else set(stations)
+        self.from_us = None if from_time is None else to_epoch_us(from_time)
+        self.to_us = None if to_time is None else to_epoch_us(to_time)
+
+    def __repr__(self):
+        return f"PickIndex(" \
+               f"Tag={self.tag}, " \
+               f"Keys={len(self.times)}, " \
+               f"Picks={len(self)})"
+
+    def __len__(self):
+        return sum(times.size for times in self.times.values())
+
+    @classmethod
+    def from_database(cls, database,
+                      from_time=None, to_time=None,
+                      station=None, phase=None,
+                      tag=None, batch_size=100000):
+        """
+        Returns pick index loaded from the pick table, see get_picks.
+
+        :param database: Database name or Client.
+        :param from_time: From time.
+        :param to_time: To time.
+        :param str station: Station name.
+        :param str phase: Phase name.
+        :param str tag: Catalog tag.
+        :param int batch_size: Rows fetched per batch.
+        :rtype: PickIndex
+        """
+        if isinstance(database, str):
+            database = get_client(database)
+
+        stations = None
+        if station is not None:
+            stations = database.get_matched_list(station, 'pick', 'station')
+        index = cls(tag=tag, stations=stations,
+                    from_time=from_time, to_time=to_time)
+
+        clients = [database]
+        if isinstance(database, ShardedClient) and 'pick' in database.tables:
+            clients = database._get_query_shards('pick', from_time, to_time)
+
+        for client in clients:
+            index.load(client, from_time, to_time, station, phase, tag,
+                       batch_size)
+        return index
+
+    def load(self, client,
+             from_time=None, to_time=None,
+             station=None, phase=None,
+             tag=None, batch_size=100000):
+        """
+        Adds picks of one database into the index, see get_picks.
+
+        :param Client client: Database client.
+        :param from_time: From time.
+        :param to_time: To time.
+        :param str station: Station name.
+        :param str phase: Phase name.
+        :param str tag: Catalog tag.
+        :param int batch_size: Rows fetched per batch.
+        """
+        if client.compact_picks:
+            time_column = sqlalchemy.literal_column('pick.time_us')
+        else:
+            time_column = Pick.time
+
+        with client.session_scope() as session:
+            query = session.query(Pick.station, Pick.phase, time_column)
+            query = client._filter_picks(query, from_time, to_time,
+                                         station, phase, tag)
+            for rows in seisnn.utils.chunks(query.yield_per(batch_size),
+                                            batch_size):
+                station_list, phase_list, time_list = zip(*rows)
+                if client.compact_picks:
+                    times = np.array(time_list, dtype=np.int64)
+                else:
+                    times = np.array(time_list, dtype='datetime64[us]') \
+                        .astype(np.int64)
+                self.add(station_list, phase_list, times)
+
+    def add(self, stations, phases, times):
+        """
+        Adds picks into the index.
+
+        :param stations: Sequence of station names.
+        :param phases: Sequence of phase names.
+        :param times: Sequence of epoch microseconds.
+        """
+        keys = np.array([f'{station}\0{phase}'
+                         for station, phase in zip(stations, phases)],
+                        dtype=object)
+        times = np.asarray(times, dtype=np.int64)
+        if not times.size:
+            return
+
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+        order = np.argsort(inverse, kind='stable')
+        bounds = np.searchsorted(inverse[order],
+                                 np.arange(len(unique_keys) + 1))
+        for i, key in enumerate(unique_keys):
+            new_times = times[order[bounds[i]:bounds[i + 1]]]
+            key = tuple(key.split('\0'))
+            if key in self.times:
+                new_times = np.concatenate([self.times[key], new_times])
+            self.times[key] = np.sort(new_times)
+
+    def covers(self, station, from_time, to_time):
+        """
+        Returns True if the window is inside the loaded picks.
+
+        :param str station: Station name.
+        :param from_time: From time.
+        :param to_time: To time.
+        :rtype: bool
+        """
+        if self.stations is not None and station not in self.stations:
+            return False
+        if self.from_us is not None and to_epoch_us(from_time) < self.from_us:
+            return False
+        if self.to_us is not None and to_epoch_us(to_time) > self.to_us:
+            return False
+        return True
+
+    def get_times(self, station, phase, from_time=None, to_time=None):
+        """
+        Returns sorted pick times within the window, both ends included.
+
+        :param str station: Station name.
+        :param str phase: Phase name.
+        :param from_time: From time.
+        :param to_time: To time.
+        :rtype: numpy.ndarray
+        :return: Epoch microseconds in int64.
+        """
+        times = self.times.get((station, phase))
+        if times is None:
+            return np.empty(0, dtype=np.int64)
+
+        start, end = 0, times.size
+        if from_time is not None:
+            start = np.searchsorted(times, to_epoch_us(from_time), 'left')
+        if to_time is not None:
+            end = np.searchsorted(times, to_epoch_us(to_time), 'right')
+        return times[start:end]
+
+    def get_samples(self, metadata_list, phase):
+        """
+        Returns picks inside a stack of windows as sample indexes.
+
+        Windows include both ends, samples are counted from the window
+        starttime with its delta.
+
+        :param list metadata_list: core.Metadata of each window.
+        :param phase: Phase names in label column order.
+        :rtype: tuple
+        :return: Window, phase and sample index arrays.
+        """
+        stations = np.array([metadata.station for metadata in metadata_list],
+                            dtype=object)
+        start_ns = np.array([metadata.starttime.ns
+                             for metadata in metadata_list], dtype=np.int64)
+        from_us = np.array([to_epoch_us(metadata.starttime.datetime)
+                            for metadata in metadata_list], dtype=np.int64)
+        to_us = np.array([to_epoch_us(metadata.endtime.datetime)
+                          for metadata in metadata_list], dtype=np.int64)
+        delta = np.array([metadata.delta for metadata in metadata_list],
+                         dtype=np.float64)
+
+        result = [[], [], []]
+        for station in sorted(set(stations)):
+            windows = np.flatnonzero(stations == station)
+            for phase_index, phase_name in enumerate(phase):
+                times = self.times.get((station, phase_name))
+                if times is None:
+                    continue
+
+                first = np.searchsorted(times, from_us[windows], 'left')
+                last = np.searchsorted(times, to_us[windows], 'right')
+                counts = last - first
+                total = counts.sum()
+                if not total:
+                    continue
+
+                # Flattened ranges times[first:last] of every window.
+                window_index = np.repeat(windows, counts)
+                position = np.repeat(first - np.cumsum(counts) + counts,
+                                     counts) + np.arange(total)
+                pick_ns = times[position] * 1000 - start_ns[window_index]
+                sample_index = (pick_ns / 1e9 / delta[window_index]) \
+                    .astype(np.int64)
+
+                result[0].append(window_index)
+                result[1].append(np.full(total, phase_index, dtype=np.int64))
+                result[2].append(sample_index)
+
+        return tuple(np.concatenate(items) if items
+                     else np.empty(0, dtype=np.int64)
+                     for items in result)
+
+
+_CLIENT_REGISTRY = {
+    'pid': None,
+    'sql_database': None,
+    'clients': {},
+}
+
+
+def get_client(database, **kwargs):
+    """
+    Returns a shared Client of the database for this process.
+
+    The engine, schema check and R*Tree probe are done once per database
+    path and options. A forked child starts with an empty registry, the
+    connections of the parent are never reused.
+
+    :param str database: Database file name in config.sql_database.
+    :param kwargs: Keywords pass into Client.
+    :rtype: Client
+    :return: Shared client.
+    """
+    registry = _CLIENT_REGISTRY
+    if registry['pid'] != os.getpid():
+        registry['pid'] = os.getpid()
+        registry['sql_database'] = seisnn.utils.Config().sql_database
+        registry['clients'] = {}
+
+    db_path = os.path.abspath(
+        os.path.join(registry['sql_database'], database))
+    key = (db_path,) + tuple(sorted((name, repr(value))
+                                    for name, value in kwargs.items()))
+    client = registry['clients'].get(key)
+    if client is None:
+        client = Client(database, **kwargs)
+        registry['clients'][key] = client
+
+    return client
+
+
+def get_snapshot_name(database):
+    """
+    Returns the snapshot file name of a database.
+
+    :param str database: Database file name.
+    :rtype: str
+    """
+    stem, ext = os.path.splitext(database)
+    return f'{stem}.snapshot{ext}'
+
+
+def get_snapshot(database, **kwargs):
+    """
+    Returns a shared read-only client for worker processes.
+
+    Opens the immutable snapshot of the database if it is newer than
+    the database, see Client.create_snapshot, otherwise the database
+    itself in read-only mode.
+
+    :param str database: Database file name in config.sql_database.
+    :param kwargs: Keywords pass into Client.
+    :rtype: Client
+    :return: Shared client.
+    """
+    sql_database = seisnn.utils.Config().sql_database
+    snapshot = get_snapshot_name(database)
+    snapshot_path = os.path.join(sql_database, snapshot)
+    if os.path.exists(snapshot_path):
+        db_path = os.path.join(sql_database, database)
+        modified = max(os.path.getmtime(path)
+                       for path in [db_path, db_path + '-wal']
+                       if os.path.exists(path))
+        if os.path.getmtime(snapshot_path) >= modified:
+            return get_client(snapshot, immutable=True, **kwargs)
+
+    return get_client(database, readonly=True, **kwargs)
+
+
+def clear_clients():
+    """
+    Disposes all shared clients of this process.
+    """
+    for client in _CLIENT_REGISTRY['clients'].values():
+        client.close()
+    _CLIENT_REGISTRY['clients'] = {}
+    _CLIENT_REGISTRY['sql_database'] = None
+    _CLIENT_REGISTRY['pid'] = None
+
+
+class Summary:
+    """
+    Aggregated summary of a table.
+
+    groups holds {value: count} dicts per column, e.g. groups['phase'],
+    stations the counts per station.
+    """
+    __slots__ = [
+        'table',
+        'count',
+        'from_time',
+        'to_time',
+        'boundary',
+        'groups',
+        'stations',
+        'tfrecord_count',
+        'no_pick_station',
+        'no_inventory_station',
+    ]
+
+    def __init__(self, table, count=0):
+        self.table = table
+        self.count = count
+        self.from_time = None
+        self.to_time = None
+        self.boundary = None
+        self.groups = {}
+        self.stations = {}
+        self.tfrecord_count = None
+        self.no_pick_station = []
+        self.no_inventory_station = []
+
+    def __repr__(self):
+        return f"Summary(" \
+               f"Table={self.table}, " \
+               f"Count={self.count}, " \
+               f"From={self.from_time}, " \
+               f"To={self.to_time})"
+
+    def to_dict(self):
+        """
+        Returns summary as dict.
+
+        :rtype: dict
+        """
+        return {key: getattr(self, key) for key in self.__slots__}
+
+
 class DatabaseInspector:
     """
     Main class for Database Inspector.
+
+    Summaries are computed with aggregate queries, only counts and
+    ranges are loaded.
     """
 
     def __init__(self, database):
         if isinstance(database, str):
             try:
-                database = seisnn.sql.Client(database)
+                database = get_client(database)
             except Exception as exception:
                 print(f'{exception.__class__.__name__}: {exception.__cause__}')
 
         self.database = database
 
-    def inventory_summery(self):
+    def get_boundary(self, table):
         """
-        Prints summery from geometry table.
+        Returns latitude and longitude boundary of a table.
+
+        :param str table: Table name, inventory or event.
+        :rtype: dict
+        :return: Dict of west, east, south, north.
         """
-        stations = self.database.get_distinct_items('inventory', 'station')
+        table = self.database.get_table_class(table)
+        with self.database.session_scope() as session:
+            west, east, south, north = session.query(
+                sqlalchemy.func.min(table.longitude),
+                sqlalchemy.func.max(table.longitude),
+                sqlalchemy.func.min(table.latitude),
+                sqlalchemy.func.max(table.latitude)).one()
 
-        print('Station name:')
-        print([station for station in stations], '\n')
-        print(f'Total {len(stations)} stations\n')
+        return {'west': west, 'east': east, 'south': south, 'north': north}
 
-        latitudes = self.database.get_distinct_items('inventory', 'latitude')
-        longitudes = self.database.get_distinct_items('inventory', 'longitude')
+    def get_group_count(self, table, *columns):
+        """
+        Returns row count of every group.
 
-        print('Station boundary:')
-        print(f'West: {min(longitudes):>8.4f}')
-        print(f'East: {max(longitudes):>8.4f}')
-        print(f'South: {min(latitudes):>7.4f}')
-        print(f'North: {max(latitudes):>7.4f}\n')
+        :param str table: Table name.
+        :param str columns: Group by column names.
+        :rtype: dict
+        :return: Dict of {value: count}, value is a tuple for multiple
+            columns.
+        """
+        table = self.database.get_table_class(table)
+        group = [getattr(table, column) for column in columns]
+        with self.database.session_scope() as session:
+            rows = session.query(*group, sqlalchemy.func.count()) \
+                .group_by(*group) \
+                .order_by(*group) \
+                .all()
 
-    def event_summery(self):
+        if len(columns) == 1:
+            return {row[0]: row[1] for row in rows}
+        return {tuple(row[:-1]): row[-1] for row in rows}
+
+    def get_inventory_summary(self):
         """
-        Prints summery from event table.
+        Returns summary of inventory table.
+
+        :rtype: Summary
+        """
+        summary = Summary('inventory')
+        summary.stations = self.get_group_count('inventory', 'station')
+        summary.count = sum(summary.stations.values())
+        summary.groups['network'] = self.get_group_count('inventory',
+                                                         'network')
+        summary.boundary = self.get_boundary('inventory')
+        return summary
+
+    def get_event_summary(self):
         """
-        times = self.database.get_distinct_items('event', 'time')
-        print('Event time duration:')
-        print(f'From: {min(times).isoformat()}')
-        print(f'To:   {max(times).isoformat()}\n')
+        Returns summary of event table.
 
-        events = self.database.get_events()
-        print(f'Total {len(events)} events\n')
+        :rtype: Summary
+        """
+        with self.database.session_scope() as session:
+            count, from_time, to_time = session.query(
+                sqlalchemy.func.count(Event.id),
+                sqlalchemy.func.min(Event.time),
+                sqlalchemy.func.max(Event.time)).one()
+
+        summary = Summary('event', count)
+        summary.from_time = from_time
+        summary.to_time = to_time
+        summary.boundary = self.get_boundary('event')
+        return summary
+
+    def get_pick_summary(self):
+        """
+        Returns summary of pick table, with counts per tag and phase and
+        per station.
 
-        latitudes = self.database.get_distinct_items('event', 'latitude')
-        longitudes = self.database.get_distinct_items('event', 'longitude')
+        :rtype: Summary
+        """
+        if self.database.compact_picks:
+            return self._get_compact_pick_summary()
+
+        # Grouped in index order of ix_pick_station_phase_tag_time.
+        counts = self.get_group_count('pick', 'station', 'phase', 'tag')
+        return self._get_pick_summary(counts)
+
+    def _get_compact_pick_summary(self):
+        # Same queries on the code columns of pick_compact, decoded after.
+        codes = {code: value for (_, value), code
+                 in self.database.get_pick_codes().items()}
+        with self.database.engine.connect() as connection:
+            rows = connection.execute(sqlalchemy.text(
+                'SELECT station_code, phase_code, tag_code, COUNT(*) '
+                'FROM pick_compact '
+                'GROUP BY station_code, phase_code, tag_code')).fetchall()
+
+            times = {}
+            for tag_code in {row[2] for row in rows}:
+                times[codes[tag_code]] = [
+                    connection.execute(sqlalchemy.text(
+                        f'SELECT {function}(time) FROM pick_compact '
+                        f'WHERE tag_code = :tag_code'),
+                        {'tag_code': tag_code}).scalar()
+                    for function in ['MIN', 'MAX']]
+
+        counts = {(codes[station], codes[phase], codes[tag]): count
+                  for station, phase, tag, count in rows}
+        return self._get_pick_summary(counts, {
+            tag: [from_epoch_us(value) for value in values]
+            for tag, values in times.items()})
+
+    def _get_pick_summary(self, counts, times=None):
+        summary = Summary('pick', sum(counts.values()))
+        phases = {}
+        tags = {}
+        tag_phases = {}
+        for (station, phase, tag), count in counts.items():
+            summary.stations[station] = \
+                summary.stations.get(station, 0) + count
+            phases[phase] = phases.get(phase, 0) + count
+            tags[tag] = tags.get(tag, 0) + count
+            key = (tag, phase)
+            tag_phases[key] = tag_phases.get(key, 0) + count
+        summary.groups['phase'] = dict(sorted(phases.items()))
+        summary.groups['tag'] = dict(sorted(tags.items()))
+        summary.groups['tag_phase'] = dict(sorted(tag_phases.items()))
+
+        # Separate MIN and MAX per tag are single ix_pick_tag_time seeks.
+        if times is None:
+            times = {}
+            with self.database.session_scope() as session:
+                for tag in tags:
+                    query = session.query(Pick).filter(Pick.tag == tag)
+                    times[tag] = [query.with_entities(
+                        function(Pick.time)).scalar()
+                        for function in [sqlalchemy.func.min,
+                                         sqlalchemy.func.max]]
+        if times:
+            summary.from_time = min(value[0] for value in times.values())
+            summary.to_time = max(value[1] for value in times.values())
+
+        inventory = self.get_group_count('inventory', 'station')
+        summary.no_pick_station = sorted(
+            set(inventory) - set(summary.stations))
+        summary.no_inventory_station = sorted(
+            set(summary.stations) - set(inventory))
+        return summary
+
+    def get_waveform_summary(self):
+        """
+        Returns summary of waveform table, with counts per station.
 
-        print('Station boundary:')
-        print(f'West: {min(longitudes):>8.4f}')
-        print(f'East: {max(longitudes):>8.4f}')
-        print(f'South: {min(latitudes):>7.4f}')
-        print(f'North: {max(latitudes):>7.4f}\n')
+        :rtype: Summary
+        """
+        stations = self.get_group_count('waveform', 'station')
+        with self.database.session_scope() as session:
+            from_time = session.query(
+                sqlalchemy.func.min(Waveform.starttime)).scalar()
+            to_time = session.query(
+                sqlalchemy.func.max(Waveform.endtime)).scalar()
+            tfrecord_count = session.query(
+                sqlalchemy.func.count(TFRecord.id)).scalar()
+
+        summary = Summary('waveform', sum(stations.values()))
+        summary.from_time = from_time
+        summary.to_time = to_time
+        summary.stations = stations
+        summary.tfrecord_count = tfrecord_count
+        return summary
+
+    def inventory_summery(self, verbose=True):
+        """
+        Prints summery from geometry table.
 
-    def pick_summery(self):
+        :param bool verbose: Prints the summary.
+        :rtype: Summary
+        """
+        summary = self.get_inventory_summary()
+        if not verbose:
+            return summary
+
+        print('Station name:')
+        print(list(summary.stations), '\n')
+        print(f'Total {summary.count} stations\n')
+        if summary.count:
+            self._print_boundary('Station boundary:', summary.boundary)
+        return summary
+
+    def event_summery(self, verbose=True):
+        """
+        Prints summery from event table.
+
+        :param bool verbose: Prints the summary.
+        :rtype: Summary
+        """
+        summary = self.get_event_summary()
+        if not verbose:
+            return summary
+
+        self._print_duration('Event time duration:', summary)
+        print(f'Total {summary.count} events\n')
+        if summary.count:
+            self._print_boundary('Event boundary:', summary.boundary)
+        return summary
+
+    def pick_summery(self, verbose=True):
         """
         Prints summery from pick table.
+
+        :param bool verbose: Prints the summary.
+        :rtype: Summary
         """
-        times = self.database.get_distinct_items('pick', 'time')
-        print('Event time duration:')
-        print(f'From: {min(times).isoformat()}')
-        print(f'To:   {max(times).isoformat()}\n')
+        summary = self.get_pick_summary()
+        if not verbose:
+            return summary
+
+        self._print_duration('Pick time duration:', summary)
 
         print('Phase count:')
-        phases = self.database.get_distinct_items('pick', 'phase')
-        for phase in phases:
-            picks = self.database.get_picks(phase=phase)
-            print(f'{len(picks)} "{phase}" picks')
+        for phase, count in summary.groups['phase'].items():
+            print(f'{count} "{phase}" picks')
         print()
 
-        pick_stations = self.database.get_distinct_items('pick', 'station')
-        print(f'Picks cover {len(pick_stations)} stations:')
-        print([station for station in pick_stations], '\n')
+        print('Tag count:')
+        for tag, count in summary.groups['tag'].items():
+            print(f'{count} "{tag}" picks')
+        print()
+
+        print(f'Picks cover {len(summary.stations)} stations:')
+        print(list(summary.stations), '\n')
 
-        no_pick_station = self.database.get_exclude_items(
-            'inventory', 'station', pick_stations)
+        no_pick_station = summary.no_pick_station
         if no_pick_station:
             print(f'{len(no_pick_station)} stations without picks:')
-            print([station for station in no_pick_station], '\n')
-
-        inventory_station = self.database \
-            .get_distinct_items('inventory', 'station')
-        no_inventory_station = self.database \
-            .get_exclude_items('pick', 'station', inventory_station)
+            print(no_pick_station, '\n')
 
+        no_inventory_station = summary.no_inventory_station
         if no_inventory_station:
             print(f'{len(no_inventory_station)} stations without geometry:')
-            print([station for station in no_inventory_station], '\n')
+            print(no_inventory_station, '\n')
+        return summary
 
-    def waveform_summery(self):
+    def waveform_summery(self, verbose=True):
         """
         Prints summery from waveform table.
+
+        :param bool verbose: Prints the summary.
+        :rtype: Summary
         """
-        starttimes = self.database.get_distinct_items('waveform', 'starttime')
-        endtimes = self.database.get_distinct_items('waveform', 'endtime')
-        print('Waveform time duration:')
-        print(f'From: {min(starttimes).isoformat()}')
-        print(f'To:   {max(endtimes).isoformat()}\n')
+        summary = self.get_waveform_summary()
+        if not verbose:
+            return summary
 
-        waveforms = self.database.get_events()
-        print(f'Total {len(waveforms)} events\n')
+        self._print_duration('Waveform time duration:', summary)
+        print(f'Total {summary.count} waveforms in '
+              f'{summary.tfrecord_count} tfrecords\n')
 
-        stations = self.database.get_distinct_items('waveform', 'station')
-        print(f'Picks cover {len(stations)} stations:')
-        print([station for station in stations], '\n')
+        print(f'Waveforms cover {len(summary.stations)} stations:')
+        print(list(summary.stations), '\n')
+        return summary
+
+    @staticmethod
+    def _print_duration(title, summary):
+        if summary.from_time is None:
+            return
+        print(title)
+        print(f'From: {summary.from_time.isoformat()}')
+        print(f'To:   {summary.to_time.isoformat()}\n')
+
+    @staticmethod
+    def _print_boundary(title, boundary):
+        print(title)
+        print(f'West: {boundary["west"]:>8.4f}')
+        print(f'East: {boundary["east"]:>8.4f}')
+        print(f'South: {boundary["south"]:>7.4f}')
+        print(f'North: {boundary["north"]:>7.4f}\n')
 
     def plot_map(self):
         """
@@ -4,6 +4,8 @@ Utilities
 
 import functools
 import glob
+import hashlib
+import itertools
 import multiprocessing as mp
 import os
 
@@ -122,6 +124,21 @@ def batch(iterable, size=1):
         yield iterable[ndx:min(ndx + size, iter_len)]
 
 
+def chunks(iterable, size=1):
+    """
+    Yields lists of a given size from any iterable, including generators.
+
+    :param iterable: Data iterable.
+    :param int size: Chunk size.
+    """
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
 def batch_operation(data_list, func, **kwargs):
     """
     Unpacks and repacks a batch.
@@ -176,6 +193,24 @@ def parallel(data_list, func, batch_size=None, **kwargs):
     return result_list
 
 
+def parallel_imap(data_list, func, processes=None, **kwargs):
+    """
+    Yields results of a function over a process pool, in completion order.
+
+    :param list data_list: List of data.
+    :param func: Paralleled function.
+    :param int processes: Number of processes, default is cpu count.
+    :param kwargs: Fixed function parameters.
+    """
+    if not data_list:
+        return
+
+    par = functools.partial(func, **kwargs)
+    with mp.Pool(processes=processes or mp.cpu_count()) as pool:
+        for output in pool.imap_unordered(par, data_list):
+            yield output
+
+
 def _parallel_iter(par, iterator):
     """
     Parallelize a partial function and return results in a list.
@@ -213,6 +248,22 @@ def get_dir_list(file_dir, suffix="", recursive=True):
     return file_list
 
 
+def get_file_hash(file_path, block_size=1024 ** 2):
+    """
+    Returns MD5 hex digest of a file.
+
+    :param str file_path: File path.
+    :param int block_size: Read size in bytes.
+    :rtype: str
+    """
+    md5 = hashlib.md5()
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(block_size), b''):
+            md5.update(block)
+
+    return md5.hexdigest()
+
+
 def flatten_list(nested_list):
     return [item for sublist in nested_list for item in sublist]
 
@@ -0,0 +1,123 @@
+import os
+import shutil
+import tempfile
+import warnings
+
+import numpy as np
+import obspy
+import pytest
+from obspy import UTCDateTime
+from obspy.core.event import Catalog, Event, Origin, Pick, WaveformStreamID
+
+# Config reads ~/config.yml, point HOME at a scratch workspace before seisnn
+# is imported.
+WORKSPACE = tempfile.mkdtemp(prefix='seisnn-test-')
+os.environ['HOME'] = WORKSPACE
+
+import seisnn  # noqa: E402
+
+seisnn.utils.Config(initialize=True)
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(WORKSPACE, ignore_errors=True)
+
+
+@pytest.fixture
+def database(tmp_path):
+    """
+    Returns an absolute database path, so each test has its own file.
+    """
+    return str(tmp_path / 'test.db')
+
+
+def make_event(time, picks, latitude=24.0, longitude=121.5, depth=5.0):
+    """
+    Returns an obspy event with picks of (station, phase, offset).
+    """
+    time = UTCDateTime(time)
+    event = Event(origins=[Origin(time=time,
+                                  latitude=latitude,
+                                  longitude=longitude,
+                                  depth=depth * 1000)])
+    for station, phase, offset in picks:
+        event.picks.append(Pick(
+            time=time + offset,
+            phase_hint=phase,
+            waveform_id=WaveformStreamID(network_code='HL',
+                                         station_code=station,
+                                         channel_code='EHZ')))
+    return event
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    """
+    Returns a catalog name under config.catalog and a function writing
+    one event into an S-file of it.
+    """
+    config = seisnn.utils.Config()
+    name = tmp_path.name
+    directory = os.path.join(config.catalog, name)
+    os.makedirs(directory)
+
+    def write_sfile(file_name, event):
+        path = os.path.join(directory, file_name)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            Catalog([event]).write(path, format='NORDIC')
+        return path
+
+    yield name, write_sfile
+    shutil.rmtree(directory, ignore_errors=True)
+
+
+def make_stream(station, starttime, component='ZNE', npts=3008,
+                sampling_rate=100, seed=0):
+    """
+    Returns a stream of random traces, one per component.
+    """
+    rng = np.random.default_rng(seed)
+    stream = obspy.Stream()
+    for comp in component:
+        trace = obspy.Trace(rng.normal(size=npts).astype(np.float32))
+        trace.stats.network = 'HL'
+        trace.stats.station = station
+        trace.stats.channel = f'EH{comp}'
+        trace.stats.sampling_rate = sampling_rate
+        trace.stats.starttime = UTCDateTime(starttime)
+        stream.append(trace)
+    return stream
+
+
+def make_instance(station, starttime, component='ZNE', seed=0):
+    """
+    Returns an instance with random trace, label and predict.
+    """
+    rng = np.random.default_rng(seed)
+    instance = seisnn.core.Instance(
+        make_stream(station, starttime, component, seed=seed))
+    for key in ['label', 'predict']:
+        label = seisnn.core.Label(instance.metadata, ['P', 'S', 'N'],
+                                  tag=key)
+        label.data = rng.uniform(size=label.data.shape).astype(np.float32)
+        setattr(instance, key, label)
+    return instance
+
+
+@pytest.fixture
+def tfrecord(tmp_path):
+    """
+    Returns a TFRecord path and its instances, the third has only the Z
+    component and starttimes have sub-second parts.
+    """
+    instances = [
+        make_instance('H000', '2019-01-01T00:00:00', seed=0),
+        make_instance('H001', '2019-01-01T00:00:30.5', seed=1),
+        make_instance('H000', '2019-01-01T00:01:00.25', 'Z', seed=2),
+        make_instance('H001', '2019-01-02T00:00:00', seed=3),
+    ]
+    path = str(tmp_path / 'HL.H000..EH.2019.001.tfrecord')
+    seisnn.io.write_tfrecord([instance.to_example()
+                              for instance in instances], path)
+    return path, instances
@@ -0,0 +1,311 @@
+import numpy as np
+import obspy
+import pytest
+import scipy.signal
+import tensorflow as tf
+
+import seisnn.core
+import seisnn.example_proto
+import seisnn.io
+from conftest import make_stream
+
+
+def convolve_labels(window_index, phase_index, sample_index,
+                    n_window, npts, phase, shape, half_width):
+    """
+    Reference labeller, convolves pick impulses with the wavelet.
+    """
+    wavelet = scipy.signal.windows.get_window(shape, 2 * half_width)[1:]
+    impulse = np.zeros([n_window, npts, len(phase)])
+    inside = (sample_index >= 0) & (sample_index < npts)
+    impulse[window_index[inside], sample_index[inside],
+            phase_index[inside]] = 1
+
+    label = np.zeros_like(impulse)
+    for i, name in enumerate(phase):
+        if name in ['P', 'S']:
+            for window in range(n_window):
+                label[window, :, i] = scipy.signal.convolve(
+                    impulse[window, :, i], wavelet, mode='same')
+    if 'N' in phase:
+        label[:, :, phase.index('N')] = \
+            1 - label[:, :, phase.index('P')] - label[:, :, phase.index('S')]
+    return label
+
+
+@pytest.mark.parametrize('shape', ['triang', 'hann'])
+@pytest.mark.parametrize('half_width', [10, 20])
+def test_make_label_stack_equals_convolution(shape, half_width):
+    rng = np.random.default_rng(0)
+    phase = ['P', 'S', 'N']
+    n_window, npts, n_pick = 20, 500, 60
+    window_index = rng.integers(0, n_window, n_pick)
+    phase_index = rng.integers(0, 2, n_pick)
+    # Picks near and beyond both edges are included.
+    sample_index = rng.integers(-30, npts + 30, n_pick)
+
+    label = seisnn.core.make_label_stack(window_index, phase_index,
+                                         sample_index, n_window, npts,
+                                         phase, shape, half_width)
+    expected = convolve_labels(window_index, phase_index, sample_index,
+                               n_window, npts, phase, shape, half_width)
+
+    assert label.dtype == np.float32
+    assert label.shape == (n_window, npts, len(phase))
+    np.testing.assert_allclose(label, expected, atol=1e-6)
+
+
+def test_make_label_stack_eq_window():
+    phase = ['P', 'S', 'EQ']
+    label = seisnn.core.make_label_stack(np.array([0, 0, 1]),
+                                         np.array([0, 1, 1]),
+                                         np.array([100, 300, 200]),
+                                         2, 500, phase, 'triang')
+
+    eq = label[:, :, 2]
+    assert np.all(eq[0, 100:300] == 1)
+    assert np.all(eq[0, :100] == 0) and np.all(eq[0, 300:] == 0)
+    # S without P starts the window at the trace start.
+    assert np.all(eq[1, :200] == 1) and np.all(eq[1, 200:] == 0)
+
+
+def test_get_label_kernel_is_cached_and_read_only():
+    kernel = seisnn.core.get_label_kernel('triang', 20)
+
+    assert kernel is seisnn.core.get_label_kernel('triang', 20)
+    assert not kernel.flags.writeable
+    assert kernel.size == 39
+
+
+def test_find_picks_matches_find_peaks():
+    rng = np.random.default_rng(1)
+    phase = ['P', 'S', 'N']
+    batch, npts = 16, 1000
+    label = seisnn.core.make_label_stack(
+        rng.integers(0, batch, 80), rng.integers(0, 2, 80),
+        rng.integers(0, npts, 80), batch, npts, phase, 'triang')
+    # Noise makes peaks of different height, ties may be suppressed in
+    # another order.
+    data = label * rng.uniform(0.3, 1.0, label.shape[:1] + (1, 3)) \
+        + rng.normal(0, 0.02, label.shape)
+    data = data.astype(np.float32)
+
+    picks = seisnn.core.find_picks(data, phase, height=0.5, distance=100)
+
+    expected = []
+    for instance in range(batch):
+        for column, name in enumerate(phase):
+            peaks, _ = scipy.signal.find_peaks(data[instance, :, column],
+                                               height=0.5, distance=100)
+            expected.extend((instance, name, sample) for sample in peaks)
+    result = [(pick['instance'], pick['phase'], pick['sample'])
+              for pick in picks]
+
+    assert len(expected) > batch
+    assert result == expected
+    np.testing.assert_array_equal(
+        picks['value'], data[picks['instance'], picks['sample'],
+                             [phase.index(name) for name in picks['phase']]])
+
+
+def test_find_picks_flat_top_and_time():
+    data = np.zeros([2, 100, 1], dtype=np.float32)
+    data[0, 40:45, 0] = 0.8
+    data[1, 10, 0] = 0.6
+    data[1, 60, 0] = 0.4
+
+    picks = seisnn.core.find_picks(data, ['P'],
+                                   starttime=np.array([0, 1_000_000]),
+                                   delta=0.01, height=0.5, distance=10)
+
+    assert picks['instance'].tolist() == [0, 1]
+    assert picks['sample'].tolist() == [
+        scipy.signal.find_peaks(data[0, :, 0], height=0.5)[0][0], 10]
+    assert picks['sample'][0] == 42
+    assert picks['time'].tolist() == [420_000, 1_100_000]
+
+
+def read_batch(file_path, batch_size=4):
+    dataset = seisnn.io.read_dataset([file_path]).batch(batch_size)
+    return next(iter(dataset))
+
+
+def test_instance_batch_round_trip(tfrecord, tmp_path):
+    path, instances = tfrecord
+    batch = seisnn.core.InstanceBatch(read_batch(path))
+
+    assert len(batch) == 4
+    assert batch.phase == ['P', 'S', 'N']
+    assert batch.station.to_array().tolist() == [
+        'H000', 'H001', 'H000', 'H001']
+    assert batch.get_feature(2).channel == ['EHZ']
+    assert batch.get_feature(0).channel == ['EHZ', 'EHN', 'EHE']
+    for index, instance in enumerate(instances):
+        np.testing.assert_array_equal(batch.trace[index],
+                                      instance.trace.data)
+        np.testing.assert_array_equal(batch.predict[index],
+                                      instance.predict.data)
+        assert batch.get_tfrecord_name(index) == \
+            instance.get_tfrecord_name()
+
+    output = str(tmp_path / 'output.tfrecord')
+    batch.to_tfrecord(output)
+
+    # Same examples as written by the instances, byte for byte.
+    assert [record for _, _, record in seisnn.io.iter_tfrecord(output)] \
+        == [record for _, _, record in seisnn.io.iter_tfrecord(path)]
+
+
+def test_instance_batch_to_batch(tfrecord, monkeypatch):
+    path, _ = tfrecord
+    source = read_batch(path)
+    batch = seisnn.core.InstanceBatch(source)
+
+    # Arrays are views of the source tensors.
+    assert np.shares_memory(batch.trace, np.asarray(source['trace']))
+    assert not batch.trace.flags.writeable
+
+    converted = []
+    convert = seisnn.core._to_tensor
+
+    def to_tensor(array):
+        converted.append(array)
+        return convert(array)
+
+    monkeypatch.setattr(seisnn.core, '_to_tensor', to_tensor)
+    batch.predict = np.flip(batch.predict, axis=1).copy()
+    result = batch.to_batch()
+
+    assert result['trace'] is source['trace']
+    assert result['label'] is source['label']
+    assert len(converted) == 1
+    np.testing.assert_array_equal(
+        np.asarray(result['predict']).reshape(batch.predict.shape),
+        batch.predict)
+    for key in ['id', 'station', 'starttime', 'endtime', 'npts', 'delta']:
+        np.testing.assert_array_equal(result[key].numpy(),
+                                      source[key].numpy())
+    for key in ['channel', 'phase']:
+        assert result[key].to_list() == source[key].to_list()
+
+    again = seisnn.core.InstanceBatch(result)
+    np.testing.assert_array_equal(again.predict, batch.predict)
+    assert again.channel.to_array().tolist() == \
+        batch.channel.to_array().tolist()
+
+
+def test_instance_batch_rejects_mixed_phase(tfrecord, tmp_path):
+    path, instances = tfrecord
+    instances[1].label.phase = ['P', 'S', 'EQ']
+    mixed = str(tmp_path / 'mixed.tfrecord')
+    seisnn.io.write_tfrecord([instance.to_example()
+                              for instance in instances], mixed)
+
+    with pytest.raises(ValueError):
+        seisnn.core.InstanceBatch(read_batch(mixed))
+
+
+def test_lazy_instance_decodes_arrays_on_access(tfrecord, monkeypatch):
+    path, instances = tfrecord
+    headers = []
+    decoded = []
+    parse_header = seisnn.example_proto.parse_header
+    decode_array = seisnn.example_proto.decode_array
+
+    def spy_header(record):
+        headers.append(record)
+        return parse_header(record)
+
+    def spy_array(example, key, npts):
+        decoded.append(key)
+        return decode_array(example, key, npts)
+
+    monkeypatch.setattr(seisnn.example_proto, 'parse_header', spy_header)
+    monkeypatch.setattr(seisnn.example_proto, 'decode_array', spy_array)
+
+    eager = [seisnn.core.Instance(example)
+             for example in seisnn.io.read_dataset([path])]
+    lazy = [seisnn.core.Instance(record)
+            for _, _, record in seisnn.io.iter_tfrecord(path)]
+
+    assert len(lazy) == len(instances)
+    # The record is parsed once, the header reads the parsed example.
+    assert all(isinstance(header, tf.train.SequenceExample)
+               for header in headers)
+    for lazy_instance, eager_instance in zip(lazy, eager):
+        for key in ['id', 'station', 'starttime', 'endtime', 'npts',
+                    'delta']:
+            assert getattr(lazy_instance.metadata, key) == \
+                getattr(eager_instance.metadata, key)
+    assert decoded == []
+
+    instance = lazy[2]
+    assert instance.trace.channel == ['EHZ']
+    assert decoded == ['trace']
+    np.testing.assert_array_equal(instance.trace.data,
+                                  eager[2].trace.data)
+    assert instance.label.phase == ['P', 'S', 'N']
+    np.testing.assert_array_equal(instance.predict.data,
+                                  eager[2].predict.data)
+    assert decoded == ['trace', 'label', 'predict']
+    assert instance.trace is lazy[2].trace
+    assert len(decoded) == 3
+
+
+def test_trace_from_stream_windows_matches_sliced_streams():
+    # A day stream in 50 Hz, N has a gap and E ends early.
+    stream = make_stream('H000', '2019-01-01', npts=6000, sampling_rate=50)
+    starttime = stream[0].stats.starttime
+    gap = stream.select(component='N')[0]
+    stream.remove(gap)
+    stream += gap.slice(starttime, starttime + 40) \
+        + gap.slice(starttime + 50, None)
+    stream.select(component='E')[0].trim(None, starttime + 80)
+    windows = [starttime + offset for offset in [0, 30, 45, 70, 75.5]]
+
+    traces = seisnn.core.Trace.from_stream_windows(stream, windows)
+
+    # Reference, resample the whole stream, then cut each window.
+    resampled = stream.copy()
+    for trace in resampled:
+        trace.resample(100)
+    npts = seisnn.core.get_trace_npts()
+    for trace, window in zip(traces, windows):
+        expected = seisnn.core.Trace(
+            resampled.slice(window, window + (npts - 1) / 100))
+        assert trace.data.shape == (npts, 3)
+        assert trace.channel == ['EHZ', 'EHN', 'EHE']
+        assert trace.metadata.starttime == window
+        assert trace.metadata.npts == npts
+        np.testing.assert_array_equal(trace.data, expected.data)
+
+
+def test_trace_from_stream_windows_zero_pads():
+    starttime = obspy.UTCDateTime('2019-01-01')
+    samples = np.arange(1000, dtype=np.float32)
+    stream = obspy.Stream()
+    for component, start, end in [('Z', 0, 1000), ('N', 0, 300),
+                                  ('N', 600, 1000), ('E', 0, 500)]:
+        trace = obspy.Trace(samples[start:end].copy())
+        trace.stats.station = 'H000'
+        trace.stats.channel = f'EH{component}'
+        trace.stats.sampling_rate = 100
+        trace.stats.starttime = starttime + start / 100
+        stream.append(trace)
+
+    # Timeline from 1 s before the stream, 0 where there is no data.
+    expected = np.zeros([3000, 3], dtype=np.float32)
+    expected[100:1100, 0] = samples
+    expected[100:400, 1] = samples[:300]
+    expected[700:1100, 1] = samples[600:]
+    expected[100:600, 2] = samples[:500]
+
+    npts = seisnn.core.get_trace_npts(trace_length=3)
+    offsets = [-1, 2, 8.5]
+    traces = seisnn.core.Trace.from_stream_windows(
+        stream, [starttime + offset for offset in offsets], trace_length=3)
+
+    for trace, offset in zip(traces, offsets):
+        begin = 100 + int(round(offset * 100))
+        np.testing.assert_array_equal(trace.data,
+                                      expected[begin:begin + npts])
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+import sqlalchemy
+import tensorflow as tf
+
+import seisnn.core
+import seisnn.io
+import seisnn.sql
+
+
+def read_raw_records(file_path):
+    return [record.numpy() for record in tf.data.TFRecordDataset(file_path)]
+
+
+def test_record_offsets_match_tf_data(tfrecord):
+    path, _ = tfrecord
+    expected = read_raw_records(path)
+
+    frames = list(seisnn.io.iter_tfrecord(path))
+    offsets = seisnn.io.get_record_offsets(path)
+
+    assert [record for _, _, record in frames] == expected
+    assert offsets == [(offset, length) for offset, length, _ in frames]
+    for (offset, length), record in zip(offsets, expected):
+        assert seisnn.io.read_record(path, offset, length) == record
+        assert seisnn.io.read_record(path, offset) == record
+
+    # Input order is kept, each file is read in offset order.
+    locations = [(path, offset, length)
+                 for offset, length in reversed(offsets)]
+    assert seisnn.io.read_records(locations) == expected[::-1]
+
+
+def test_truncated_tfrecord_raises(tfrecord, tmp_path):
+    path, _ = tfrecord
+    truncated = str(tmp_path / 'truncated.tfrecord')
+    with open(path, 'rb') as file, open(truncated, 'wb') as output:
+        output.write(file.read()[:-100])
+
+    with pytest.raises(IOError):
+        list(seisnn.io.iter_tfrecord(truncated))
+    offset, _ = seisnn.io.get_record_offsets(truncated)[-1]
+    with pytest.raises(IOError):
+        seisnn.io.read_record(truncated, offset)
+
+
+def test_read_waveforms_by_offset_and_index(tfrecord, database):
+    path, instances = tfrecord
+    db = seisnn.sql.Client(database)
+    db.read_tfrecord_header([path], processes=1)
+    # Rows indexed before offsets were stored.
+    with db.engine.begin() as connection:
+        connection.execute(sqlalchemy.text(
+            'UPDATE waveform SET offset = NULL, length = NULL '
+            'WHERE data_index = 1'))
+
+    waveforms = sorted(db.get_waveform(tfrecord=path),
+                       key=lambda waveform: -waveform.data_index)
+    parsed = seisnn.io.read_waveforms(waveforms)
+
+    assert [waveform.offset is None for waveform in waveforms] == [
+        False, False, True, False]
+    for waveform, example in zip(waveforms, parsed):
+        instance = instances[waveform.data_index]
+        np.testing.assert_array_equal(
+            example['trace'].numpy().reshape(instance.trace.data.shape),
+            instance.trace.data)
+        assert example['station'].numpy().decode() == \
+            instance.metadata.station
+
+    lazy = seisnn.core.Instance(waveforms[2])
+    assert lazy.metadata.starttime == instances[1].metadata.starttime
+    np.testing.assert_array_equal(lazy.predict.data.reshape(-1),
+                                  instances[1].predict.data.reshape(-1))
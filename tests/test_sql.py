@@ -0,0 +1,415 @@
+import datetime
+import os
+import sqlite3
+
+import pytest
+import sqlalchemy
+import sqlalchemy.exc
+
+import seisnn.io
+import seisnn.sql
+from conftest import make_event, make_instance
+
+
+def count_rows(client, table):
+    with client.engine.connect() as connection:
+        return connection.execute(
+            sqlalchemy.text(f'SELECT count(*) FROM {table}')).scalar()
+
+
+def pick_rows(time, stations=('H000', 'H001'), phases=('P', 'S'),
+              tag='manual'):
+    return [{'time': time + datetime.timedelta(seconds=i),
+             'station': station,
+             'phase': phase,
+             'tag': tag}
+            for i, (station, phase) in enumerate(
+                (station, phase) for station in stations for phase in phases)]
+
+
+def test_unique_constraints_skip_duplicates(database):
+    db = seisnn.sql.Client(database, unique_constraints=True)
+    rows = pick_rows(datetime.datetime(2019, 1, 1))
+
+    assert db.insert_ignore_duplicates()
+    assert db.add_picks(rows) == 4
+    assert db.add_picks(rows) == 0
+    db.add_pick(rows[0]['time'], 'H000', 'P', 'manual')
+    assert count_rows(db, 'pick') == 4
+
+    events = [make_event('2019-01-01T00:00:00', [('H000', 'P', 2)]),
+              make_event('2019-01-01T01:00:00', [('H000', 'P', 2)])]
+    assert db.insert_events(events, 'catalog')['events'] == 2
+    report = db.insert_events(events, 'catalog')
+    assert report['events'] == 0 and report['picks'] == 0
+    assert count_rows(db, 'event') == 2
+    assert count_rows(db, 'pick') == 6
+
+
+def test_add_unique_constraints_removes_existing_duplicates(database):
+    db = seisnn.sql.Client(database)
+    rows = pick_rows(datetime.datetime(2019, 1, 1))
+    db.add_picks(rows)
+    db.add_picks(rows)
+    assert not db.has_unique_constraint('pick')
+    assert count_rows(db, 'pick') == 8
+
+    db.add_unique_constraints(['pick'])
+
+    assert db.has_unique_constraint('pick')
+    assert count_rows(db, 'pick') == 4
+    assert db.add_picks(rows) == 0
+
+
+def sfile_counts(client):
+    with client.engine.connect() as connection:
+        return connection.execute(sqlalchemy.text(
+            'SELECT sfile.path, count(pick.id) FROM sfile '
+            'LEFT JOIN pick ON pick.sfile_id = sfile.id '
+            'GROUP BY sfile.path ORDER BY sfile.path')).fetchall()
+
+
+def test_sync_events_ledger(database, catalog):
+    name, write_sfile = catalog
+    db = seisnn.sql.Client(database)
+    first = write_sfile('a.S201901', make_event(
+        '2019-01-01T00:00:00', [('H000', 'P', 2), ('H000', 'S', 4)]))
+    second = write_sfile('b.S201901', make_event(
+        '2019-01-02T00:00:00', [('H001', 'P', 3)]))
+
+    report = db.sync_events(name, 'manual')
+    assert (report['new'], report['events'], report['picks']) == (2, 2, 3)
+
+    report = db.sync_events(name, 'manual')
+    assert (report['unchanged'], report['events']) == (2, 0)
+
+    # Edited file, its picks are replaced.
+    write_sfile('a.S201901', make_event(
+        '2019-01-01T00:00:00', [('H000', 'P', 2)]))
+    os.utime(first, (0, 0))
+    report = db.sync_events(name, 'manual')
+    assert (report['changed'], report['unchanged']) == (1, 1)
+    assert [pick.phase for pick in db.get_picks(station='H000')] == ['P']
+
+    # Deleted file, its rows are removed.
+    os.remove(second)
+    report = db.sync_events(name, 'manual')
+    assert report['removed'] == 1
+    assert count_rows(db, 'event') == 1
+    assert db.get_picks(station='H001') == []
+    assert sfile_counts(db) == [(os.path.join(name, 'a.S201901'), 1)]
+
+
+def test_sync_events_keeps_ledger_rows_over_legacy_rows(database, catalog):
+    name, write_sfile = catalog
+    db = seisnn.sql.Client(database)
+    event = make_event('2019-01-01T00:00:00',
+                       [('H000', 'P', 2), ('H000', 'S', 4)])
+    path = write_sfile('a.S201901', event)
+    # Rows ingested before the ledger existed, without source file.
+    db.add_events(name, 'manual')
+    assert count_rows(db, 'pick') == 2
+
+    report = db.add_events(name, 'manual', incremental=True)
+
+    assert report['duplicates'] == 3
+    assert count_rows(db, 'event') == 1
+    assert sfile_counts(db) == [(os.path.join(name, 'a.S201901'), 2)]
+
+    # A later edit still replaces every pick of the file.
+    write_sfile('a.S201901', make_event('2019-01-01T00:00:00',
+                                        [('H000', 'P', 2)]))
+    os.utime(path, (0, 0))
+    db.add_events(name, 'manual', incremental=True)
+    assert [pick.phase for pick in db.get_picks()] == ['P']
+
+
+def pick_tuples(picks):
+    return sorted((pick.time, pick.station, pick.phase, pick.tag)
+                  for pick in picks)
+
+
+def test_migrate_pick_schema_round_trip(database):
+    db = seisnn.sql.Client(database)
+    start = datetime.datetime(2019, 1, 1, 0, 0, 0, 123456)
+    rows = pick_rows(start) + pick_rows(start, tag='predict')
+    db.add_picks(rows)
+    expected = pick_tuples(db.get_picks(tag='manual'))
+    window = pick_tuples(db.get_picks(from_time=start,
+                                      to_time=rows[1]['time'],
+                                      station='H000'))
+    # Duplicates are dropped by the migration.
+    db.add_picks(rows[:2])
+
+    report = db.migrate_pick_schema(compact=True)
+
+    assert report['picks'] == 8
+    assert seisnn.sql.Client(database).compact_picks
+    assert pick_tuples(db.get_picks(tag='manual')) == expected
+    assert pick_tuples(db.get_picks(from_time=start,
+                                    to_time=rows[1]['time'],
+                                    station='H000')) == window
+    assert db.get_distinct_items('pick', 'tag') == ['manual', 'predict']
+
+    # Inserts are encoded and deduplicated.
+    assert db.add_picks(rows[:2] + pick_rows(start, tag='new')) == 4
+    assert count_rows(db, 'pick') == 12
+
+    db.migrate_pick_schema(compact=False)
+
+    assert not seisnn.sql.Client(database).compact_picks
+    assert count_rows(db, 'pick') == 12
+    assert pick_tuples(db.get_picks(tag='manual')) == expected
+    with db.engine.connect() as connection:
+        tables = connection.execute(sqlalchemy.text(
+            "SELECT name FROM sqlite_master WHERE name LIKE 'pick%' "
+            "AND type IN ('table', 'view')")).scalars().all()
+    assert tables == ['pick']
+
+
+def test_sharded_client_routes_and_archives(tmp_path):
+    # Shards are created next to the main database in config.sql_database.
+    database = f'{tmp_path.name}.db'
+    archive_dir = str(tmp_path / 'archive')
+    db = seisnn.sql.ShardedClient(database, partition='month',
+                                  archive_dir=archive_dir)
+    rows = [row
+            for month in [1, 2, 3]
+            for row in pick_rows(datetime.datetime(2019, month, 10))]
+
+    assert db.add_picks(rows) == 12
+    assert list(db.list_shards()) == ['2019-01', '2019-02', '2019-03']
+    assert count_rows(db, 'pick') == 0
+    assert len(db.get_shards('2019-02-01', '2019-02-28')) == 1
+    february = db.get_picks(from_time='2019-02-01', to_time='2019-02-28')
+    assert pick_tuples(february) == pick_tuples(
+        seisnn.sql.Client(db.get_shard_name('2019-02')).get_picks())
+    assert len(february) == 4
+
+    archived = db.archive(before='2019-03-01')
+
+    assert sorted(os.path.basename(path) for path in archived) == [
+        db.get_shard_name('2019-01'), db.get_shard_name('2019-02')]
+    assert list(db.list_shards(archived=True)) == ['2019-01', '2019-02']
+    assert list(db.list_shards(archived=False)) == ['2019-03']
+    assert len(db.get_picks()) == 12
+    assert db.get_distinct_items('pick', 'station') == ['H000', 'H001']
+    assert db.get_shard('2019-01').readonly
+    with pytest.raises(ValueError):
+        db.add_picks(pick_rows(datetime.datetime(2019, 1, 20)))
+    assert db.add_picks(pick_rows(datetime.datetime(2019, 4, 1))) == 4
+
+    active = seisnn.sql.ShardedClient(database, partition='month',
+                                      archive_dir=archive_dir,
+                                      include_archive=False)
+    assert len(active.get_picks()) == 8
+
+
+def test_sync_events_replaces_file_in_one_transaction(database, catalog,
+                                                      monkeypatch):
+    name, write_sfile = catalog
+    db = seisnn.sql.Client(database)
+    path = write_sfile('a.S201901', make_event(
+        '2019-01-01T00:00:00', [('H000', 'P', 2), ('H000', 'S', 4)]))
+    db.sync_events(name, 'manual')
+
+    write_sfile('a.S201901', make_event('2019-01-01T00:00:00',
+                                        [('H000', 'P', 2)]))
+    os.utime(path, (0, 0))
+
+    def fail(*args, **kwargs):
+        raise RuntimeError('insert failed')
+
+    monkeypatch.setattr(db, '_insert_rows', fail)
+    with pytest.raises(RuntimeError):
+        db.sync_events(name, 'manual')
+
+    # The failed file keeps its old rows and is parsed again next time.
+    assert sorted(pick.phase for pick in db.get_picks()) == ['P', 'S']
+    monkeypatch.undo()
+    assert db.sync_events(name, 'manual')['changed'] == 1
+    assert [pick.phase for pick in db.get_picks()] == ['P']
+
+
+def test_sharded_client_routes_event_picks(tmp_path, catalog):
+    name, write_sfile = catalog
+    database = f'{tmp_path.name}.db'
+    events = [make_event('2019-01-01T00:00:00',
+                         [('H000', 'P', 2), ('H000', 'S', 4)]),
+              make_event('2019-02-01T00:00:00', [('H001', 'P', 3)])]
+
+    # Picks written before sharding stay in the main database.
+    seisnn.sql.Client(database).insert_events(events[:1], 'manual')
+    db = seisnn.sql.ShardedClient(database, partition='month')
+    db.insert_events(events, 'manual', bulk=False)
+    assert list(db.list_shards()) == ['2019-01', '2019-02']
+    assert count_rows(db, 'pick') == 2
+    assert len(db.get_picks()) == 5
+
+    db.remove_duplicates('pick', ['time', 'phase', 'station', 'tag'])
+    db.insert_events(events[:1], 'manual')
+    db.remove_duplicates('pick', ['time', 'phase', 'station', 'tag'])
+    assert count_rows(db.get_shard('2019-01'), 'pick') == 2
+
+    db.clear_table('pick')
+    db.clear_table('event')
+    assert db.get_picks() == []
+
+    # Incremental sync, legacy rows in the main database and the shards
+    # are replaced by the ledger rows.
+    seisnn.sql.Client(database).insert_events(events[:1], 'manual')
+    db.insert_events(events[:1], 'manual')
+    first = write_sfile('a.S201901', events[0])
+    second = write_sfile('b.S201902', events[1])
+    report = db.add_events(name, 'manual', incremental=True)
+    assert report['duplicates'] == 6
+    assert count_rows(db, 'pick') == 0
+    picks = db.get_picks()
+    assert len(picks) == 3
+    assert all(pick.sfile_id is not None for pick in picks)
+
+    write_sfile('a.S201901', make_event('2019-01-01T00:00:00',
+                                        [('H000', 'P', 2)]))
+    os.utime(first, (0, 0))
+    os.remove(second)
+    report = db.add_events(name, 'manual', incremental=True)
+    assert (report['changed'], report['removed']) == (1, 1)
+    assert [(pick.station, pick.phase) for pick in db.get_picks()] == [
+        ('H000', 'P')]
+    assert count_rows(db.get_shard('2019-02'), 'pick') == 0
+
+
+def test_matched_list_sees_writes_of_other_clients(database):
+    db = seisnn.sql.Client(database)
+    other = seisnn.sql.Client(database)
+    db.add_picks(pick_rows(datetime.datetime(2019, 1, 1)))
+    assert db.get_matched_list('h%', 'pick', 'station') == ['H000', 'H001']
+    assert db.get_matched_list('h002', 'pick', 'station') == ['h002']
+
+    other.add_picks(pick_rows(datetime.datetime(2019, 1, 1),
+                              stations=['H002']))
+
+    assert db.get_matched_list('h%', 'pick', 'station') == [
+        'H000', 'H001', 'H002']
+    assert db.get_matched_list('h002', 'pick', 'station') == ['H002']
+    assert len(db.get_picks(station='H%')) == 6
+
+
+def test_sharded_matched_list_sees_new_shards(tmp_path):
+    database = f'{tmp_path.name}.db'
+    db = seisnn.sql.ShardedClient(database)
+    other = seisnn.sql.ShardedClient(database)
+    db.add_picks(pick_rows(datetime.datetime(2019, 1, 1)))
+    assert db.get_matched_list('H%', 'pick', 'station') == ['H000', 'H001']
+
+    other.add_picks(pick_rows(datetime.datetime(2019, 2, 1),
+                              stations=['H002']))
+
+    assert db.get_matched_list('H%', 'pick', 'station') == [
+        'H000', 'H001', 'H002']
+
+
+def test_read_tfrecord_header_skips_unchanged_files(database, tmp_path):
+    paths = []
+    for day, station in enumerate(['H000', 'H001'], start=1):
+        path = str(tmp_path / f'HL.{station}..EH.2019.00{day}.tfrecord')
+        seisnn.io.write_tfrecord(
+            [make_instance(station, f'2019-01-0{day}T00:00:{second:02d}',
+                           seed=second).to_example()
+             for second in [0, 30]], path)
+        paths.append(path)
+    db = seisnn.sql.Client(database)
+
+    report = db.read_tfrecord_header(paths, processes=2)
+
+    assert (report['tfrecords'], report['waveforms']) == (2, 4)
+    header = seisnn.io.read_tfrecord_header(paths[0])
+    assert [(item['station'], item['starttime'], item['data_index'])
+            for item in header['headers']] == [
+        ('H000', '2019-01-01T00:00:00', 0),
+        ('H000', '2019-01-01T00:00:30', 1)]
+    assert [(row.data_index, row.offset, row.length)
+            for row in db.get_waveform(tfrecord=paths[0])] == [
+        (item['data_index'], item['offset'], item['length'])
+        for item in header['headers']]
+
+    report = db.read_tfrecord_header(paths, processes=2)
+    assert (report['tfrecords'], report['skipped']) == (0, 2)
+
+    # A rewritten file replaces its rows.
+    seisnn.io.write_tfrecord(
+        [make_instance('H001', '2019-01-02T00:01:00').to_example()],
+        paths[1])
+    os.utime(paths[1], (0, 0))
+    report = db.read_tfrecord_header(paths, processes=2)
+    assert (report['tfrecords'], report['skipped']) == (1, 1)
+    assert count_rows(db, 'waveform') == 3
+    assert count_rows(db, 'tfrecord') == 2
+    assert [row.starttime for row in db.get_waveform(station='H001')] == [
+        datetime.datetime(2019, 1, 2, 0, 1)]
+
+
+def test_create_snapshot_and_get_snapshot(tmp_path):
+    database = f'{tmp_path.name}.db'
+    db = seisnn.sql.Client(database)
+    db.add_picks(pick_rows(datetime.datetime(2019, 1, 1)))
+
+    snapshot = db.create_snapshot()
+
+    path = os.path.join(os.path.dirname(db.db_path), snapshot)
+    assert snapshot == seisnn.sql.get_snapshot_name(database)
+    assert not os.stat(path).st_mode & 0o222
+    connection = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        assert connection.execute(
+            'PRAGMA journal_mode').fetchone()[0] == 'delete'
+        assert connection.execute(
+            "SELECT count(*) FROM sqlite_master "
+            "WHERE name = 'sqlite_stat1'").fetchone()[0] == 1
+    finally:
+        connection.close()
+
+    try:
+        client = seisnn.sql.get_snapshot(database)
+        assert client.immutable and client.database == snapshot
+        assert client is seisnn.sql.get_snapshot(database)
+        assert len(client.get_picks()) == 4
+        with pytest.raises(sqlalchemy.exc.OperationalError):
+            client.add_picks(pick_rows(datetime.datetime(2019, 1, 2)))
+
+        # A database changed after the snapshot is read directly.
+        db.add_picks(pick_rows(datetime.datetime(2019, 1, 2)))
+        modified = os.path.getmtime(path) + 10
+        os.utime(db.db_path, (modified, modified))
+        client = seisnn.sql.get_snapshot(database)
+        assert client.readonly and not client.immutable
+        assert client.database == database
+        assert len(client.get_picks()) == 8
+    finally:
+        seisnn.sql.clear_clients()
+
+
+def test_summary_groups_hold_count_dicts(database, tfrecord):
+    path, _ = tfrecord
+    db = seisnn.sql.Client(database)
+    db.add_picks(pick_rows(datetime.datetime(2019, 1, 1)))
+    db.bulk_insert('inventory', [
+        {'network': 'HL', 'station': station, 'latitude': 24.0,
+         'longitude': 121.5, 'elevation': 0.0}
+        for station in ['H001', 'H002']])
+    db.read_tfrecord_header([path], processes=1)
+    inspector = seisnn.sql.DatabaseInspector(db)
+
+    pick = inspector.pick_summery(verbose=False)
+    waveform = inspector.waveform_summery(verbose=False)
+
+    assert pick.count == 4
+    assert pick.groups['phase'] == {'P': 2, 'S': 2}
+    assert pick.groups['tag'] == {'manual': 4}
+    assert pick.stations == {'H000': 2, 'H001': 2}
+    assert pick.no_pick_station == ['H002']
+    assert pick.no_inventory_station == ['H000']
+    assert (waveform.count, waveform.tfrecord_count) == (4, 1)
+    for summary in [pick, waveform, inspector.get_inventory_summary()]:
+        assert all(isinstance(counts, dict)
+                   for counts in summary.groups.values())